@@ -1,15 +1,32 @@
+import hmac
 import os
+import time
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, session
+from functools import wraps
+import click
+from flask import Flask, Response, g, request, jsonify, session
 from flask_cors import CORS
 from flask_jwt_extended import (
-    create_access_token, get_jwt_identity,
+    create_access_token, current_user, get_jwt_identity,
     jwt_required, set_access_cookies, unset_jwt_cookies
 )
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Import extensions from the centralized location
 from extensions import db, bcrypt, migrate, jwt
+import catalog_cache
+import db_engine
+import hashing
+import identity
+import compression
+import instrumentation
+import json_provider
+import payments.inbox as payment_inbox
+import query_counter
+import replicas
+import tenancy
+from identity import identity_cache
+from hashing import PasswordHasherBusy, set_user_password, verify_user_password
 
 # REMOVE these lines:
 # bcrypt = Bcrypt()
@@ -24,11 +41,32 @@ def create_app():
     # ==============================
     # Config
     # ==============================
+    # Defaults (including DB engine profile settings) come from config.Config;
+    # the explicit values below take precedence.
+    app.config.from_object('config.Config')
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or 'dev-key-change-in-production'
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'salon.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Branches: requests pick one with X-Branch or ?branch= (DEFAULT_BRANCH otherwise).
+    # BRANCH_DATABASES="code=url,..." gives branches a database of their own;
+    # DATABASE_BRANCH=<code> pins a worker/CLI process to one of them.
+    app.config['DEFAULT_BRANCH'] = os.environ.get('DEFAULT_BRANCH', 'main')
+    app.config['BRANCH_DATABASES'] = tenancy.parse_branch_databases(os.environ.get('BRANCH_DATABASES'))
+    app.config['DATABASE_BRANCH'] = os.environ.get('DATABASE_BRANCH')
+    tenancy.configure_binds(app)
+
+    # Read replica: GET requests read DATABASE_REPLICA_URL while it trails the primary by
+    # at most REPLICA_MAX_LAG_SECONDS; a client that just wrote reads the primary for
+    # READ_YOUR_WRITES_SECONDS. Writes always go to the primary.
+    app.config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL')
+    app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    app.config['REPLICA_LAG_CHECK_SECONDS'] = float(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 1))
+    app.config['READ_YOUR_WRITES_SECONDS'] = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 10))
+    replicas.configure_binds(app)
+    db_engine.configure_engine_options(app)
+
     # JWT Config
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-change-in-production'
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
@@ -40,34 +78,106 @@ def create_app():
     app.config['JWT_REFRESH_COOKIE_PATH'] = '/api/auth/refresh'
     app.config['JWT_COOKIE_SAMESITE'] = 'Lax'
 
+    # Password hashing Config
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or None
+    app.config['PASSWORD_HASH_QUEUE_LIMIT'] = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', 32))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+    # Identity cache for @jwt_required() requests
+    app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 30))
+    app.config['IDENTITY_CACHE_SIZE'] = int(os.environ.get('IDENTITY_CACHE_SIZE', 10000))
+
+    # Instrumentation Config (/api/metrics is open unless METRICS_TOKEN is set)
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 100))
+    app.config['SERVER_TIMING_HEADER'] = os.environ.get('SERVER_TIMING_HEADER', 'true').lower() == 'true'
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+    # N+1 detection: off, warn (log) or raise
+    app.config['N_PLUS_ONE_DETECTION'] = os.environ.get('N_PLUS_ONE_DETECTION', 'off')
+    app.config['N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+
+    # Response Encoding (JSON_ENCODER: auto uses orjson when installed, stdlib forces the json module)
+    app.config['JSON_ENCODER'] = os.environ.get('JSON_ENCODER', 'auto')
+    app.config['COMPRESS_RESPONSES'] = os.environ.get('COMPRESS_RESPONSES', 'true').lower() == 'true'
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+    # Dashboard summaries: each counter row is split over this many shards (see stats.py)
+    app.config['STATS_COUNTER_SHARDS'] = int(os.environ.get('STATS_COUNTER_SHARDS', 8))
+
+    # Catalog cache: entries live at most CATALOG_CACHE_TTL_SECONDS; workers look for
+    # catalog changes made by other processes every CATALOG_CACHE_CHECK_SECONDS
+    app.config['CATALOG_CACHE_TTL_SECONDS'] = int(os.environ.get('CATALOG_CACHE_TTL_SECONDS', 300))
+    app.config['CATALOG_CACHE_CHECK_SECONDS'] = float(os.environ.get('CATALOG_CACHE_CHECK_SECONDS', 2))
+
+    # M-Pesa Config (callbacks are written to an inbox and applied by the payments consumer)
+    for key in ('MPESA_GATEWAY_URL', 'MPESA_SHORTCODE', 'MPESA_PASSKEY', 'MPESA_API_KEY', 'MPESA_CALLBACK_URL'):
+        if os.environ.get(key):
+            app.config[key] = os.environ[key]
+    app.config['MPESA_CALLBACK_TOKEN'] = os.environ.get('MPESA_CALLBACK_TOKEN')
+    app.config['PAYMENT_CALLBACK_CONCURRENCY'] = int(os.environ.get('PAYMENT_CALLBACK_CONCURRENCY', 8))
+    app.config['PAYMENT_CALLBACK_BATCH_SIZE'] = int(os.environ.get('PAYMENT_CALLBACK_BATCH_SIZE', 200))
+    app.config['PAYMENT_CALLBACK_ORPHAN_SECONDS'] = int(os.environ.get('PAYMENT_CALLBACK_ORPHAN_SECONDS', 600))
+    app.config['PAYMENTS_IN_PROCESS'] = os.environ.get('PAYMENTS_IN_PROCESS', 'false').lower() == 'true'
+
+    # Booking Config
+    app.config['SLOT_INTERVAL_MINUTES'] = int(os.environ.get('SLOT_INTERVAL_MINUTES', 15))
+
+    # Notifications Config (transports: file, loopback, smtp for email, http for sms/push)
+    app.config['NOTIFICATION_TRANSPORT'] = os.environ.get('NOTIFICATION_TRANSPORT', 'file')
+    app.config['NOTIFICATION_FILE'] = os.environ.get('NOTIFICATION_FILE') or \
+        os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'notifications.jsonl')
+    app.config['NOTIFICATION_WORKERS_PER_CHANNEL'] = int(os.environ.get('NOTIFICATION_WORKERS_PER_CHANNEL', 1))
+    app.config['NOTIFICATION_BATCH_SIZE'] = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 50))
+    app.config['NOTIFICATION_MAX_ATTEMPTS'] = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 5))
+    app.config['NOTIFICATION_RETRY_BASE_SECONDS'] = int(os.environ.get('NOTIFICATION_RETRY_BASE_SECONDS', 30))
+    app.config['NOTIFICATIONS_IN_PROCESS'] = os.environ.get('NOTIFICATIONS_IN_PROCESS', 'false').lower() == 'true'
+    for key in ('NOTIFICATION_TRANSPORT_EMAIL', 'NOTIFICATION_TRANSPORT_SMS', 'NOTIFICATION_TRANSPORT_PUSH',
+                'SMTP_HOST', 'SMTP_PORT', 'SMTP_USERNAME', 'SMTP_PASSWORD', 'MAIL_DEFAULT_SENDER',
+                'SMS_GATEWAY_URL', 'SMS_API_KEY', 'SMS_SENDER_ID', 'PUSH_GATEWAY_URL', 'PUSH_API_KEY'):
+        if os.environ.get(key):
+            app.config[key] = os.environ[key]
+
     # CORS Config
-    # In your app.py file, find the CORS configuration (around line 40-50)
-CORS(app,
-     resources={
-         r"/api/*": {
-             "origins": os.environ.get('FRONTEND_URL', 'http://localhost:5173'),
-             "supports_credentials": True,
-             "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
-             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-             "expose_headers": ["Content-Type", "Authorization"],
-             "max_age": 600
-         }
-     })
-    
-# Handle preflight requests
-@app.before_request
-def handle_preflight():
-    if request.method == "OPTIONS":
-        response = jsonify({"status": "preflight"})
-        response.headers.add("Access-Control-Allow-Origin", os.environ.get('FRONTEND_URL', 'http://localhost:5173'))
-        response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization,X-Requested-With")
-        response.headers.add("Access-Control-Allow-Methods", "GET,PUT,POST,DELETE,OPTIONS")
-        response.headers.add("Access-Control-Allow-Credentials", "true")
-        return response, 200
+    CORS(app,
+         resources={
+             r"/api/*": {
+                 "origins": os.environ.get('FRONTEND_URL', 'http://localhost:5173'),
+                 "supports_credentials": True,
+                 "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "X-Branch", "X-Read-From"],
+                 "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
+                 "expose_headers": ["Content-Type", "Authorization"],
+                 "max_age": 600
+             }
+         })
+
+    # Handle preflight requests
+    @app.before_request
+    def handle_preflight():
+        if request.method == "OPTIONS":
+            response = jsonify({"status": "preflight"})
+            response.headers.add("Access-Control-Allow-Origin", os.environ.get('FRONTEND_URL', 'http://localhost:5173'))
+            response.headers.add("Access-Control-Allow-Headers",
+                                 "Content-Type,Authorization,X-Requested-With,X-Branch,X-Read-From")
+            response.headers.add("Access-Control-Allow-Methods", "GET,PUT,POST,DELETE,OPTIONS")
+            response.headers.add("Access-Control-Allow-Credentials", "true")
+            return response, 200
 
     # Initialize extensions
+    json_provider.init_app(app)
     bcrypt.init_app(app)
+    hashing.init_app(app)
+    identity.init_app(app, jwt)
     db.init_app(app)
+    db_engine.init_app(app, db)
+    replicas.init_app(app)
+    catalog_cache.init_app(app)
+    instrumentation.init_app(app, db)
+    query_counter.init_app(app)
+    payment_inbox.init_app(app)
+    compression.init_app(app)  # after instrumentation, so its size histogram sees wire bytes
     migrate.init_app(app, db)
     jwt.init_app(app)
 
@@ -83,7 +193,31 @@ def handle_preflight():
 app = create_app()
 
 # Import models after app creation
-from models import User, Service, Staff, Appointment, Booking, Payment, StaffAvailability
+from models import (
+    User, Branch, Service, Staff, Appointment, Booking, Payment, PaymentCallback, StaffAvailability,
+    ReconciliationRun, ReconciliationItem, LoyaltyEntry, parse_projection, with_counts, expand_options
+)
+from appointments.slots import find_free_slots
+from appointments.outbox import enqueue_appointment_confirmation
+from appointments.reservations import (
+    SlotUnavailable, nearest_free_slots, release_slot, reserve_appointment, sync_slot_claims
+)
+from appointments.worker import NotificationWorkerPool
+from appointments.reminders import ReminderScheduler
+from payments.consumer import PaymentCallbackConsumer
+from payments.inbox import CallbackIngestBusy, record_callback
+from payments.mpesa import InvalidCallback, build_stk_client, normalize_phone, parse_stk_callback
+from appointments.transports import TransportError
+from catalog_cache import cached_json
+from json_provider import stream_json_array
+from search import InvalidSearch, rebuild_search_index, search_catalog
+from stats import dashboard_stats, rebuild_summaries
+from reconciliation import PaymentReconciler, StatementError, write_report
+from loyalty import adjust_points, rebuild_loyalty, recalculate_tiers
+from pagination import InvalidPageRequest, apply_filters, keyset_page
+from tenancy import (
+    branch_registry, create_branch_database, current_branch_id, ensure_default_branch, select_request_branch
+)
 
 
 # ==============================
@@ -94,6 +228,7 @@ def initialize_database():
     with app.app_context():
         try:
             db.create_all()
+            ensure_default_branch()
             print("✅ Database tables created successfully!")
 
             # Admin user
@@ -166,6 +301,15 @@ def api_health_check():
     return jsonify({'status': 'healthy', 'message': 'Salon Booking API is running!'})
 
 
+# ===== METRICS =====
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'message': 'Metrics token required'}), 401
+    return Response(instrumentation.request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 # ===== AUTHENTICATION =====
 @app.route('/api/auth/signup', methods=['POST'])
 def auth_signup():
@@ -189,13 +333,18 @@ def auth_signup():
             phone=data.get('phone', ''),
             role='user'
         )
-        user.set_password(data.get('password'))
+        set_user_password(user, data.get('password'))
         db.session.add(user)
         db.session.commit()
 
         access_token = create_access_token(identity=user.id)
         return jsonify({'message': 'User created', 'user': user.to_dict(), 'access_token': access_token}), 201
 
+    except PasswordHasherBusy:
+        db.session.rollback()
+        response = jsonify({'message': 'Server is busy, please retry shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': 'Error creating user', 'error': str(e)}), 500
@@ -213,12 +362,15 @@ def auth_login():
             }), 400
 
         user = User.query.filter_by(email=data['email']).first()
-        if not user or not user.check_password(data['password']):
+        if not user or not verify_user_password(user, data['password']):
             return jsonify({
                 'success': False,
                 'message': 'Invalid email or password',
                 'status': 401
             }), 401
+        # verify_user_password() may have upgraded the hash to the current cost
+        if db.session.is_modified(user):
+            db.session.commit()
 
         access_token = create_access_token(identity=user.id)
         
@@ -230,6 +382,11 @@ def auth_login():
             'status': 200
         }), 200
 
+    except PasswordHasherBusy:
+        db.session.rollback()
+        response = jsonify({'message': 'Server is busy, please retry shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as e:
         return jsonify({'message': 'Error during login', 'error': str(e)}), 500
 
@@ -239,18 +396,9 @@ def auth_login():
 @jwt_required()
 def get_current_user():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({
-                'success': False,
-                'message': 'User not found',
-                'status': 404
-            }), 404
-            
         return jsonify({
             'success': True,
-            'data': user.to_dict(),
+            'data': current_user.to_dict(),
             'status': 200
         }), 200
         
@@ -266,19 +414,14 @@ def get_current_user():
 @app.route('/api/users/profile', methods=['GET'])
 @jwt_required()
 def user_profile():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    return jsonify({'user': user.to_dict()})
+    return jsonify({'user': current_user.to_dict()})
 
 
 @app.route('/api/users/profile', methods=['PUT'])
 @jwt_required()
 def user_update_profile():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    data = request.get_json()
+    user = current_user.load()
+    data = request.get_json() or {}
 
     if 'firstName' in data:
         user.first_name = data['firstName']
@@ -293,9 +436,490 @@ def user_update_profile():
         user.email = data['email']
 
     db.session.commit()
+    identity_cache.invalidate(user.id)
     return jsonify({'message': 'Profile updated', 'user': user.to_dict()})
 
 
+APPOINTMENT_STATUSES = ('pending', 'confirmed', 'completed', 'cancelled', 'no-show')
+
+
+def admin_required(fn):
+    """Require a JWT belonging to a user with the admin role."""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if current_user.role != 'admin':
+            return jsonify({'message': 'Admin access required'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+# ===== SERVICES =====
+@app.route('/api/services', methods=['GET'])
+def list_services():
+    def build():
+        projection = parse_projection(request.args)
+        services = Service.query \
+            .options(with_counts(), *expand_options(Service, projection.get('expand'))) \
+            .filter_by(is_active=True).order_by(Service.id).all()
+        return {'services': [service.to_dict(**projection) for service in services]}
+    return cached_json(build)
+
+
+@app.route('/api/services/<int:service_id>', methods=['GET'])
+def get_service(service_id):
+    def build():
+        service = Service.query.get(service_id)
+        if not service:
+            return jsonify({'message': 'Service not found'}), 404
+        return {'service': service.to_dict(**parse_projection(request.args))}
+    return cached_json(build)
+
+
+# ===== SEARCH =====
+@app.route('/api/search', methods=['GET'])
+def catalog_search():
+    # ?q=bra col&type=service|staff&limit=20; every term is a prefix match.
+    # Not cached: free-text queries would evict the catalog listings from catalog_cache.
+    projection = parse_projection(request.args)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    try:
+        hits = search_catalog(request.args.get('q', ''), kind=request.args.get('type'), limit=limit,
+                              branch_id=current_branch_id())
+    except InvalidSearch as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'results': [
+        {'type': kind, 'id': obj.id, 'score': score, 'item': obj.to_dict(profile='shallow', **projection)}
+        for kind, obj, score in hits
+    ]})
+
+
+# ===== BRANCHES =====
+@app.route('/api/branches', methods=['GET'])
+def list_branches():
+    branches = Branch.query.filter_by(is_active=True).order_by(Branch.id).all()
+    return jsonify({'branches': [branch.to_dict() for branch in branches], 'current': g.branch_code})
+
+
+# ===== STAFF =====
+@app.route('/api/staff', methods=['GET'])
+def list_staff():
+    def build():
+        projection = parse_projection(request.args)
+        staff_members = Staff.query \
+            .options(with_counts(), *expand_options(Staff, projection.get('expand'))) \
+            .filter_by(is_active=True).order_by(Staff.id).all()
+        return {'staff': [member.to_dict(**projection) for member in staff_members]}
+    return cached_json(build)
+
+
+# ===== APPOINTMENTS =====
+@app.route('/api/appointments', methods=['GET'])
+@jwt_required()
+def list_my_appointments():
+    projection = parse_projection(request.args)
+    query = Appointment.query \
+        .options(with_counts(), *expand_options(Appointment, projection.get('expand'))) \
+        .filter_by(user_id=get_jwt_identity())
+    try:
+        query = apply_filters(query, request.args, status=Appointment.status,
+                              date_column=Appointment.date, staff=Appointment.staff_id)
+        appointments, next_cursor = keyset_page(query, [Appointment.date, Appointment.id],
+                                                request.args, descending=True)
+    except InvalidPageRequest as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'appointments': [appointment.to_dict(**projection) for appointment in appointments],
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/appointments', methods=['POST'])
+@jwt_required()
+def create_appointment():
+    data = request.get_json() or {}
+    for field in ('serviceId', 'staffId', 'date', 'time'):
+        if not data.get(field):
+            return jsonify({'message': f'{field} is required'}), 400
+
+    try:
+        day = datetime.strptime(data['date'], '%Y-%m-%d').date()
+        datetime.strptime(data['time'], '%H:%M')
+    except (TypeError, ValueError):
+        return jsonify({'message': 'date must be YYYY-MM-DD and time HH:MM'}), 400
+
+    user = User.query.get(get_jwt_identity())
+    service = Service.query.get(data['serviceId'])
+    staff = Staff.query.get(data['staffId'])
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+    if not service or not service.is_active:
+        return jsonify({'message': 'Service not found'}), 404
+    if not staff or not staff.is_active:
+        return jsonify({'message': 'Staff member not found'}), 404
+
+    interval = app.config['SLOT_INTERVAL_MINUTES']
+    try:
+        # The slot claim and the confirmations commit with the appointment
+        appointment = reserve_appointment(
+            lambda: Appointment(
+                user=user,
+                service=service,
+                staff=staff,
+                date=day,
+                time=data['time'],
+                price=service.price,
+                status='pending',
+                notes=data.get('notes')
+            ),
+            interval,
+            on_reserved=enqueue_appointment_confirmation,
+        )
+    except SlotUnavailable:
+        return jsonify({
+            'message': 'This time slot is no longer available',
+            'alternatives': nearest_free_slots(staff, service, day, data['time'], interval)
+        }), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Error creating appointment', 'error': str(e)}), 500
+
+    return jsonify({'message': 'Appointment created', 'appointment': appointment.to_dict()}), 201
+
+
+@app.route('/api/appointments/<int:appointment_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_appointment(appointment_id):
+    appointment = Appointment.query.get(appointment_id)
+    if not appointment or str(appointment.user_id) != str(get_jwt_identity()):
+        return jsonify({'message': 'Appointment not found'}), 404
+    if appointment.status in ('completed', 'cancelled'):
+        return jsonify({'message': f'Appointment is already {appointment.status}'}), 400
+
+    appointment.status = 'cancelled'
+    release_slot(appointment)
+    db.session.commit()
+    return jsonify({'message': 'Appointment cancelled', 'appointment': appointment.to_dict()})
+
+
+# ===== PAYMENTS =====
+@app.route('/api/user/payments', methods=['GET'])
+@jwt_required()
+def list_my_payments():
+    projection = parse_projection(request.args)
+    query = Payment.query \
+        .options(*expand_options(Payment, projection.get('expand'))) \
+        .filter_by(user_id=get_jwt_identity())
+    try:
+        query = apply_filters(query, request.args, status=Payment.status, date_column=Payment.created_at)
+        payments, next_cursor = keyset_page(query, [Payment.created_at, Payment.id],
+                                            request.args, descending=True)
+    except InvalidPageRequest as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'payments': [payment.to_dict(**projection) for payment in payments],
+        'next_cursor': next_cursor
+    })
+
+
+# ===== LOYALTY =====
+@app.route('/api/users/loyalty', methods=['GET'])
+@jwt_required()
+def my_loyalty():
+    user = current_user.load()
+    try:
+        entries, next_cursor = keyset_page(user.loyalty_entries, [LoyaltyEntry.id], request.args, descending=True)
+    except InvalidPageRequest as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'loyaltyPoints': user.loyalty_points or 0,
+        'membershipTier': user.membership_tier,
+        'entries': [entry.to_dict() for entry in entries],
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/payments/initiate', methods=['POST'])
+@jwt_required()
+def initiate_payment():
+    data = request.get_json() or {}
+    appointment = Appointment.query.get(data.get('appointmentId') or 0)
+    if not appointment or str(appointment.user_id) != str(get_jwt_identity()):
+        return jsonify({'message': 'Appointment not found'}), 404
+    phone = normalize_phone(data.get('phoneNumber') or appointment.user.phone)
+    if not phone:
+        return jsonify({'message': 'A valid M-Pesa phone number is required'}), 400
+    if Payment.query.filter(Payment.appointment_id == appointment.id,
+                            Payment.status.in_(('processing', 'completed'))).first():
+        return jsonify({'message': 'This appointment is already paid or has a payment in progress'}), 409
+    client = build_stk_client(app.config)
+    if client is None:
+        return jsonify({'message': 'M-Pesa payments are not configured'}), 503
+
+    # The gateway call happens outside any transaction; a callback that
+    # arrives before the commit below is retried by the consumer.
+    db.session.rollback()
+    try:
+        response = client.initiate(phone, appointment.price, reference=f'APT{appointment.id}',
+                                   description='Salon booking')
+    except TransportError as e:
+        return jsonify({'message': f'M-Pesa request failed: {e}'}), 502
+    payment = Payment(
+        user_id=appointment.user_id,
+        appointment_id=appointment.id,
+        amount=appointment.price,
+        payment_method='mpesa',
+        status='processing',
+        transaction_id=response['CheckoutRequestID'],
+        phone_number=phone,
+        description=f'Payment for {appointment.service.name}',
+    )
+    db.session.add(payment)
+    db.session.commit()
+    return jsonify({
+        'message': response.get('CustomerMessage') or 'Check your phone to complete the payment',
+        'payment': payment.to_dict(profile='shallow'),
+    }), 201
+
+
+@app.route('/api/payments/mpesa/callback', methods=['POST'])
+def mpesa_callback():
+    # Acknowledge as soon as the callback is stored; the consumer settles the payment
+    # Without a shared token anyone could post results, so callbacks stay closed until one is set
+    token = app.config['MPESA_CALLBACK_TOKEN']
+    if not token or not hmac.compare_digest(request.args.get('token', ''), token):
+        return jsonify({'ResultCode': 1, 'ResultDesc': 'Forbidden'}), 403
+    try:
+        record_callback(parse_stk_callback(request.get_json(silent=True)))
+    except InvalidCallback as e:
+        return jsonify({'ResultCode': 1, 'ResultDesc': str(e)}), 400
+    except CallbackIngestBusy:
+        response = jsonify({'ResultCode': 1, 'ResultDesc': 'Busy, retry later'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return jsonify({'ResultCode': 0, 'ResultDesc': 'Accepted'})
+
+
+# ===== ADMIN =====
+@app.route('/api/admin/users', methods=['GET'])
+@admin_required
+def admin_list_users():
+    projection = parse_projection(request.args)
+    query = User.query.options(with_counts(), *expand_options(User, projection.get('expand')))
+    if request.args.get('role'):
+        query = query.filter(User.role == request.args['role'])
+    try:
+        query = apply_filters(query, request.args, date_column=User.created_at)
+        users, next_cursor = keyset_page(query, [User.id], request.args)
+    except InvalidPageRequest as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'users': [user.to_dict(**projection) for user in users],
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/admin/users/<int:user_id>/loyalty', methods=['POST'])
+@admin_required
+def admin_adjust_loyalty(user_id):
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+    data = request.get_json() or {}
+    points = data.get('points')
+    if not isinstance(points, int) or isinstance(points, bool) or points == 0:
+        return jsonify({'message': 'points must be a non-zero integer'}), 400
+    note = data.get('note')
+    if note is not None and not isinstance(note, str):
+        return jsonify({'message': 'note must be a string'}), 400
+    adjust_points(user.id, points, note=note[:255] if note else None)
+    return jsonify({'message': 'Points adjusted', 'loyaltyPoints': user.loyalty_points or 0})
+
+
+@app.route('/api/admin/dashboard/stats', methods=['GET'])
+@admin_required
+def admin_dashboard_stats():
+    days = min(request.args.get('days', 30, type=int), 366)
+    return jsonify({'stats': dashboard_stats(days=max(days, 1))})
+
+
+@app.route('/api/admin/db/pool', methods=['GET'])
+@admin_required
+def admin_db_pool():
+    status = db_engine.pool_status(db)
+    if replicas.replica_configured():
+        status['replica'] = replicas.replica_monitor.status()
+    return jsonify(status)
+
+
+@app.route('/api/admin/metrics/slow-queries', methods=['GET'])
+@admin_required
+def admin_slow_queries():
+    return jsonify({'slowQueries': instrumentation.request_metrics.slow_query_snapshot()})
+
+
+@app.route('/api/admin/payments/callbacks', methods=['GET'])
+@admin_required
+def admin_list_payment_callbacks():
+    query = PaymentCallback.query
+    try:
+        query = apply_filters(query, request.args, status=PaymentCallback.status,
+                              date_column=PaymentCallback.received_at)
+        callbacks, next_cursor = keyset_page(query, [PaymentCallback.id], request.args, descending=True)
+    except InvalidPageRequest as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'callbacks': [callback.to_dict(fields=parse_projection(request.args).get('fields')) for callback in callbacks],
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/admin/reconciliations', methods=['GET'])
+@admin_required
+def admin_list_reconciliations():
+    try:
+        runs, next_cursor = keyset_page(ReconciliationRun.query, [ReconciliationRun.id], request.args,
+                                        descending=True)
+    except InvalidPageRequest as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'runs': [run.to_dict() for run in runs], 'next_cursor': next_cursor})
+
+
+@app.route('/api/admin/reconciliations/<int:run_id>/items', methods=['GET'])
+@admin_required
+def admin_list_reconciliation_items(run_id):
+    # ?outcome=amount_mismatch narrows to one kind of problem
+    query = ReconciliationItem.query.filter_by(run_id=run_id)
+    if request.args.get('outcome'):
+        query = query.filter(ReconciliationItem.outcome == request.args['outcome'])
+    try:
+        items, next_cursor = keyset_page(query, [ReconciliationItem.id], request.args)
+    except InvalidPageRequest as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'items': [item.to_dict() for item in items], 'next_cursor': next_cursor})
+
+
+@app.route('/api/admin/appointments', methods=['GET'])
+@admin_required
+def admin_list_appointments():
+    projection = parse_projection(request.args)
+    query = Appointment.query \
+        .options(with_counts(), *expand_options(Appointment, projection.get('expand')))
+    try:
+        query = apply_filters(query, request.args, status=Appointment.status, date_column=Appointment.date,
+                              staff=Appointment.staff_id, user=Appointment.user_id)
+        appointments, next_cursor = keyset_page(query, [Appointment.date, Appointment.id],
+                                                request.args, descending=True)
+    except InvalidPageRequest as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'appointments': [appointment.to_dict(**projection) for appointment in appointments],
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/admin/appointments/export', methods=['GET'])
+@admin_required
+def admin_export_appointments():
+    # Every matching row, streamed; same filters and projection as the paged list
+    projection = parse_projection(request.args)
+    query = Appointment.query.options(*expand_options(Appointment, projection.get('expand', ())))
+    try:
+        query = apply_filters(query, request.args, status=Appointment.status, date_column=Appointment.date,
+                              staff=Appointment.staff_id, user=Appointment.user_id)
+    except InvalidPageRequest as e:
+        return jsonify({'message': str(e)}), 400
+    rows = query.order_by(Appointment.date, Appointment.id).yield_per(app.config['EXPORT_BATCH_SIZE'])
+    return stream_json_array((appointment.to_dict(profile='shallow', **projection) for appointment in rows),
+                             key='appointments')
+
+
+@app.route('/api/admin/payments/export', methods=['GET'])
+@admin_required
+def admin_export_payments():
+    projection = parse_projection(request.args)
+    query = Payment.query.options(*expand_options(Payment, projection.get('expand', ())))
+    try:
+        query = apply_filters(query, request.args, status=Payment.status, date_column=Payment.created_at,
+                              user=Payment.user_id)
+    except InvalidPageRequest as e:
+        return jsonify({'message': str(e)}), 400
+    rows = query.order_by(Payment.created_at, Payment.id).yield_per(app.config['EXPORT_BATCH_SIZE'])
+    return stream_json_array((payment.to_dict(profile='shallow', **projection) for payment in rows),
+                             key='payments')
+
+
+@app.route('/api/admin/appointments/<int:appointment_id>', methods=['PUT'])
+@admin_required
+def admin_update_appointment(appointment_id):
+    appointment = Appointment.query.get(appointment_id)
+    if not appointment:
+        return jsonify({'message': 'Appointment not found'}), 404
+
+    data = request.get_json() or {}
+    if 'status' in data:
+        if data['status'] not in APPOINTMENT_STATUSES:
+            return jsonify({'message': f"status must be one of {', '.join(APPOINTMENT_STATUSES)}"}), 400
+        appointment.status = data['status']
+    try:
+        if 'date' in data:
+            appointment.date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+        if 'time' in data:
+            datetime.strptime(data['time'], '%H:%M')
+            appointment.time = data['time']
+    except (TypeError, ValueError):
+        return jsonify({'message': 'date must be YYYY-MM-DD and time HH:MM'}), 400
+    if 'notes' in data:
+        appointment.notes = data['notes']
+
+    if {'status', 'date', 'time'} & data.keys():
+        try:
+            sync_slot_claims(appointment, app.config['SLOT_INTERVAL_MINUTES'])
+        except SlotUnavailable:
+            requested_day, requested_time = appointment.date, appointment.time
+            db.session.rollback()
+            return jsonify({
+                'message': 'The new time overlaps another appointment',
+                'alternatives': nearest_free_slots(appointment.staff, appointment.service, requested_day,
+                                                   requested_time, app.config['SLOT_INTERVAL_MINUTES'])
+            }), 409
+    db.session.commit()
+    return jsonify({'message': 'Appointment updated', 'appointment': appointment.to_dict()})
+
+
+# ===== STAFF AVAILABILITY =====
+@app.route('/api/staff/<int:staff_id>/slots', methods=['GET'])
+def staff_free_slots(staff_id):
+    staff = Staff.query.get(staff_id)
+    if not staff:
+        return jsonify({'message': 'Staff member not found'}), 404
+
+    try:
+        day = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'message': 'date is required in YYYY-MM-DD format'}), 400
+
+    service_id = request.args.get('service_id', type=int)
+    if not service_id:
+        return jsonify({'message': 'service_id is required'}), 400
+    service = Service.query.get(service_id)
+    if not service:
+        return jsonify({'message': 'Service not found'}), 404
+
+    slots = find_free_slots(staff, service, day, interval=app.config['SLOT_INTERVAL_MINUTES'])
+    return jsonify({
+        'success': True,
+        'data': {
+            'staffId': staff.id,
+            'serviceId': service.id,
+            'date': day.isoformat(),
+            'duration': service.duration,
+            'slots': slots
+        },
+        'status': 200
+    }), 200
+
+
 # ==============================
 # ADDITIONAL ROUTES (Services, Staff, Appointments, Bookings, Payments, Admin)
 # ==============================
@@ -310,6 +934,156 @@ def initialize_db_once():
             initialize_database()
         app.db_initialized = True
 
+
+# After the first-request setup, which creates the default branch
+app.before_request(select_request_branch)
+
+# ==============================
+# CLI COMMANDS
+# ==============================
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the dashboard summary tables from scratch."""
+    db.create_all()
+    rebuild_summaries()
+    print("✅ Dashboard summaries rebuilt")
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Re-index all active services and staff for /api/search."""
+    db.create_all()
+    with db.engine.begin() as connection:
+        rebuild_search_index(connection)
+    print("✅ Search index rebuilt")
+
+
+@app.cli.command('notifications-worker')
+def notifications_worker_command():
+    """Deliver queued email/SMS/push notifications until interrupted."""
+    db.create_all()
+    pool = NotificationWorkerPool(app).start()
+    scheduler = ReminderScheduler(app).start()
+    print(f"📨 Notification workers running for: {', '.join(pool.channels)} (+ reminders)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop(timeout=10)
+        pool.stop(timeout=10)
+
+
+@app.cli.command('payments-consumer')
+def payments_consumer_command():
+    """Apply stored M-Pesa callbacks to payments until interrupted."""
+    db.create_all()
+    consumer = PaymentCallbackConsumer(app).start()
+    print("💳 Payment callback consumer running")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        consumer.stop(timeout=10)
+
+
+@app.cli.command('reconcile-payments')
+@click.argument('statement', type=click.Path(exists=True, dir_okay=False))
+@click.option('--apply', is_flag=True, help='Settle pending/processing payments to the statement status.')
+@click.option('--chunk-size', default=20000, show_default=True, help='Statement lines per chunk.')
+@click.option('--window-minutes', default=15, show_default=True, help='Time window for fallback matching.')
+@click.option('--method', help='Only consider payments with this payment_method (e.g. mpesa).')
+@click.option('--report', type=click.Path(dir_okay=False), help='Write the lines needing attention to a CSV.')
+def reconcile_payments_command(statement, apply, chunk_size, window_minutes, method, report):
+    """Match a gateway statement CSV against payments."""
+    db.create_all()
+    reconciler = PaymentReconciler(chunk_size=chunk_size, window=timedelta(minutes=window_minutes),
+                                   apply=apply, payment_method=method)
+    started = time.perf_counter()
+    try:
+        run = reconciler.run(statement)
+    except StatementError as e:
+        raise click.ClickException(str(e))
+    print(f"✅ Reconciliation run {run['id']} finished in {time.perf_counter() - started:.1f}s")
+    for outcome, count in sorted(run['counts'].items()):
+        print(f"   {outcome}: {count}")
+    if report:
+        print(f"📝 {write_report(run['id'], report)} lines written to {report}")
+
+
+@app.cli.command('loyalty-tiers')
+@click.option('--batch-size', default=1000, show_default=True, help='Users per UPDATE/commit.')
+def loyalty_tiers_command(batch_size):
+    """Re-evaluate membership tiers of users whose points changed (run daily)."""
+    db.create_all()
+    started = time.perf_counter()
+    result = recalculate_tiers(batch_size=batch_size)
+    print(f"✅ {result['evaluated']} users evaluated, {result['changed']} tier changes "
+          f"in {time.perf_counter() - started:.1f}s")
+    for tier, count in sorted(result['tiers'].items()):
+        print(f"   → {tier}: {count}")
+
+
+@app.cli.command('rebuild-loyalty')
+def rebuild_loyalty_command():
+    """Credit completed history missing from the points ledger and re-derive balances."""
+    db.create_all()
+    result = rebuild_loyalty()
+    print(f"✅ {result['credited']} ledger entries added, {result['rebalanced']} balances corrected "
+          f"(run `flask loyalty-tiers` to update their tiers)")
+
+
+@app.cli.command('create-branch')
+@click.argument('code')
+@click.argument('name')
+def create_branch_command(code, name):
+    """Register a branch (and create its database if BRANCH_DATABASES lists it)."""
+    db.create_all()
+    ensure_default_branch()
+    if Branch.query.filter_by(code=code).first():
+        raise click.ClickException(f'Branch {code} already exists')
+    db.session.add(Branch(code=code, name=name))
+    db.session.commit()
+    branch_registry.clear()
+    if code in app.config['BRANCH_DATABASES']:
+        create_branch_database(code)
+        print(f"🗄️ Created the {code} database")
+    print(f"✅ Branch {code} created; select it with the X-Branch: {code} header")
+
+
+@app.cli.command('sync-replica')
+@click.option('--interval', default=0.0, help='Keep syncing every N seconds (0 = once).')
+def sync_replica_command(interval):
+    """Refresh the SQLite stand-in replica (DATABASE_REPLICA_URL) from the primary."""
+    if not replicas.replica_configured():
+        raise click.ClickException('DATABASE_REPLICA_URL is not set')
+    try:
+        while True:
+            try:
+                seconds = replicas.sync_replica()
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            print(f"🔁 Replica synced in {seconds:.2f}s")
+            if not interval:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if a hot query's SQLite plan regresses to a full table scan."""
+    from query_plans import HOT_QUERIES, check_query_plans
+    db.create_all()
+    failures = check_query_plans()
+    for name in HOT_QUERIES:
+        print(f"{'❌' if name in failures else '✅'} {name}")
+        for problem in failures.get(name, ()):
+            print(f"     {problem}")
+    if failures:
+        raise SystemExit(1)
+
+
 # ==============================
 # MAIN ENTRY
 # ==============================
@@ -327,5 +1101,11 @@ if __name__ == "__main__":
     # Initialize database ONCE with proper app context
     with app.app_context():
         initialize_database()
+
+    if app.config['NOTIFICATIONS_IN_PROCESS']:
+        NotificationWorkerPool(app).start()
+        ReminderScheduler(app).start()
+    if app.config['PAYMENTS_IN_PROCESS']:
+        PaymentCallbackConsumer(app).start()
     
     app.run(port=5001, debug=True)
\ No newline at end of file
@@ -0,0 +1,77 @@
+# Email transport (SMTP) and appointment email templates
+import smtplib
+from email.message import EmailMessage
+
+from appointments.transports import Transport, TransportError
+
+
+class SMTPTransport(Transport):
+    """Send a batch of emails over a single SMTP connection."""
+
+    def __init__(self, host, port=587, username=None, password=None, use_tls=True, sender=None, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.sender = sender
+        self.timeout = timeout
+
+    def send_batch(self, messages):
+        try:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        except OSError as e:
+            raise TransportError(str(e))
+
+        failures = {}
+        try:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for message in messages:
+                email = EmailMessage()
+                email['From'] = self.sender
+                email['To'] = message['recipient']
+                email['Subject'] = message['subject'] or ''
+                email.set_content(message['body'])
+                try:
+                    smtp.send_message(email)
+                except smtplib.SMTPRecipientsRefused as e:
+                    failures[message['id']] = str(e)
+        except smtplib.SMTPException as e:
+            raise TransportError(str(e))
+        finally:
+            try:
+                smtp.quit()
+            except smtplib.SMTPException:
+                pass
+        return failures
+
+
+def confirmation_email(appointment):
+    """Subject and body for a booking confirmation."""
+    service = appointment.service.name if appointment.service else 'your appointment'
+    staff = f" with {appointment.staff.first_name}" if appointment.staff else ''
+    subject = f"Booking received: {service} on {appointment.date.isoformat()}"
+    body = (
+        f"Hi {appointment.user.first_name},\n\n"
+        f"We have received your booking for {service}{staff} "
+        f"on {appointment.date.isoformat()} at {appointment.time}.\n\n"
+        "Desire Salon"
+    )
+    return subject, body
+
+
+def reminder_email(appointment, lead):
+    """Subject and body for a reminder sent `lead` (e.g. '24h') before the visit."""
+    service = appointment.service.name if appointment.service else 'your appointment'
+    when = 'tomorrow' if lead == '24h' else 'soon'
+    subject = f"Reminder: {service} {when} at {appointment.time}"
+    body = (
+        f"Hi {appointment.user.first_name},\n\n"
+        f"This is a reminder of your {service} appointment on "
+        f"{appointment.date.isoformat()} at {appointment.time}.\n\n"
+        "Desire Salon"
+    )
+    return subject, body
@@ -0,0 +1,107 @@
+# Notification outbox (enqueue inside the caller's transaction)
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import NotificationOutbox
+from appointments.email import confirmation_email, reminder_email
+from appointments.sms import confirmation_sms, reminder_sms
+from appointments.push import confirmation_push, reminder_push
+
+CHANNELS = ('email', 'sms', 'push')
+
+# Set after a commit that queued messages, so idle workers wake immediately
+outbox_ready = threading.Event()
+
+
+def enqueue_notification(channel, recipient, body, subject=None, payload=None,
+                         appointment_id=None, dedupe_key=None, send_at=None):
+    """Add a message to the outbox in the current session.
+
+    Nothing is sent here: the row commits (or rolls back) together with the
+    caller's transaction and a worker delivers it afterwards.
+    """
+    if channel not in CHANNELS:
+        raise ValueError(f"Unknown notification channel: {channel}")
+    message = NotificationOutbox(
+        channel=channel,
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        payload=payload,
+        appointment_id=appointment_id,
+        dedupe_key=dedupe_key,
+    )
+    if send_at is not None:
+        message.next_attempt_at = send_at
+    db.session.add(message)
+    return message
+
+
+def enqueue_appointment_confirmation(appointment):
+    """Queue email, SMS and push confirmations for a new appointment."""
+    user = appointment.user
+    key = f'confirm:{{}}:{appointment.id}'
+    payload = {'appointmentId': appointment.id, 'type': 'confirmation'}
+
+    subject, body = confirmation_email(appointment)
+    enqueue_notification('email', user.email, body, subject=subject, payload=payload,
+                         appointment_id=appointment.id, dedupe_key=key.format('email'))
+    if user.phone:
+        enqueue_notification('sms', user.phone, confirmation_sms(appointment), payload=payload,
+                             appointment_id=appointment.id, dedupe_key=key.format('sms'))
+    title, text = confirmation_push(appointment)
+    enqueue_notification('push', f'user:{user.id}', text, subject=title, payload=payload,
+                         appointment_id=appointment.id, dedupe_key=key.format('push'))
+
+
+def reminder_dedupe_keys(appointment_id, lead, starts_at):
+    """Outbox dedupe keys for one reminder; a reschedule yields new keys."""
+    stamp = starts_at.strftime('%Y%m%d%H%M')
+    return {channel: f'remind:{lead}:{channel}:{appointment_id}:{stamp}' for channel in CHANNELS}
+
+
+def enqueue_appointment_reminder(appointment, lead, starts_at, skip_keys=()):
+    """Queue the `lead` reminder on every channel, except keys already queued.
+
+    Returns the number of messages added.
+    """
+    user = appointment.user
+    keys = reminder_dedupe_keys(appointment.id, lead, starts_at)
+    payload = {'appointmentId': appointment.id, 'type': 'reminder', 'lead': lead}
+    added = 0
+
+    if keys['email'] not in skip_keys:
+        subject, body = reminder_email(appointment, lead)
+        enqueue_notification('email', user.email, body, subject=subject, payload=payload,
+                             appointment_id=appointment.id, dedupe_key=keys['email'])
+        added += 1
+    if user.phone and keys['sms'] not in skip_keys:
+        enqueue_notification('sms', user.phone, reminder_sms(appointment, lead), payload=payload,
+                             appointment_id=appointment.id, dedupe_key=keys['sms'])
+        added += 1
+    if keys['push'] not in skip_keys:
+        title, text = reminder_push(appointment, lead)
+        enqueue_notification('push', f'user:{user.id}', text, subject=title, payload=payload,
+                             appointment_id=appointment.id, dedupe_key=keys['push'])
+        added += 1
+    return added
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_queued_messages(session, flush_context):
+    if any(isinstance(obj, NotificationOutbox) for obj in session.new):
+        session.info['outbox_queued'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop('outbox_queued', False):
+        outbox_ready.set()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_queued_messages(session, previous_transaction):
+    session.info.pop('outbox_queued', None)
@@ -0,0 +1,41 @@
+# Push transport (HTTP push gateway) and appointment push templates
+from appointments.transports import Transport, post_json
+
+
+class HTTPPushTransport(Transport):
+    """Post a batch of push notifications to a push gateway.
+
+    Recipients are 'user:<id>'; the gateway resolves them to devices and
+    may answer {"failed": {"<id>": "<reason>"}}.
+    """
+
+    def __init__(self, url, api_key=None, timeout=10):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def send_batch(self, messages):
+        response = post_json(self.url, {
+            'notifications': [
+                {
+                    'id': message['id'],
+                    'to': message['recipient'],
+                    'title': message['subject'],
+                    'body': message['body'],
+                    'data': message['payload'],
+                }
+                for message in messages
+            ]
+        }, api_key=self.api_key, timeout=self.timeout)
+        failed = response.get('failed') or {}
+        return {int(message_id): reason for message_id, reason in failed.items()}
+
+
+def confirmation_push(appointment):
+    service = appointment.service.name if appointment.service else 'Appointment'
+    return 'Booking received', f"{service} on {appointment.date.isoformat()} at {appointment.time}"
+
+
+def reminder_push(appointment, lead):
+    service = appointment.service.name if appointment.service else 'Appointment'
+    return 'Appointment reminder', f"{service} on {appointment.date.isoformat()} at {appointment.time}"
@@ -0,0 +1,77 @@
+# Range queries over the typed appointment / availability time columns
+from sqlalchemy import exists, select
+
+from extensions import db
+from models import Appointment, StaffAvailability
+
+# Statuses that no longer hold a slot
+RELEASED_STATUSES = ('cancelled', 'no-show')
+
+
+def appointments_between(start, end, staff_id=None, include_released=False):
+    """Query for appointments starting in [start, end), ordered by start time.
+
+    Served by ix_appointments_staff_starts when `staff_id` is given and by
+    ix_appointments_starts_at otherwise.
+    """
+    query = Appointment.query.filter(Appointment.starts_at >= start, Appointment.starts_at < end)
+    if staff_id is not None:
+        query = query.filter(Appointment.staff_id == staff_id)
+    if not include_released:
+        query = query.filter(Appointment.status.notin_(RELEASED_STATUSES))
+    return query.order_by(Appointment.starts_at, Appointment.id)
+
+
+def _overlap_filter(staff_id, start, end, exclude_id=None):
+    conditions = [
+        Appointment.staff_id == staff_id,
+        Appointment.starts_at < end,
+        Appointment.ends_at > start,
+        Appointment.status.notin_(RELEASED_STATUSES),
+    ]
+    if exclude_id is not None:
+        conditions.append(Appointment.id != exclude_id)
+    return conditions
+
+
+def overlapping_appointments(staff_id, start, end, exclude_id=None):
+    """Query for `staff_id`'s appointments that hold any part of [start, end)."""
+    return Appointment.query.filter(*_overlap_filter(staff_id, start, end, exclude_id)) \
+        .order_by(Appointment.starts_at)
+
+
+def busy_intervals_query(staff_id, start, end):
+    """(starts_at, ends_at) of `staff_id`'s held appointments overlapping [start, end).
+
+    Served by ix_appointments_staff_starts (the slot engine's busy list).
+    """
+    return select(Appointment.starts_at, Appointment.ends_at) \
+        .where(*_overlap_filter(staff_id, start, end)).order_by(Appointment.starts_at)
+
+
+def staff_is_free(staff_id, start, end, exclude_id=None):
+    """True if no held appointment of `staff_id` overlaps [start, end)."""
+    return not db.session.execute(
+        select(exists().where(*_overlap_filter(staff_id, start, end, exclude_id)))
+    ).scalar()
+
+
+def availability_query(staff_id, weekday):
+    """`staff_id`'s availability rows for `weekday` (0 = monday); ix_staff_availability_staff_weekday."""
+    return select(StaffAvailability.start_minute, StaffAvailability.end_minute, StaffAvailability.is_available) \
+        .where(StaffAvailability.staff_id == staff_id, StaffAvailability.weekday == weekday) \
+        .order_by(StaffAvailability.start_minute)
+
+
+def availability_windows(staff_id, weekday):
+    """Sorted (start_minute, end_minute) windows `staff_id` works on `weekday` (0 = monday).
+
+    None when the staff member has no availability rows for that weekday
+    (callers fall back to their working hours); an empty list when every
+    row marks the day unavailable.
+    """
+    rows = db.session.execute(availability_query(staff_id, weekday)).all()
+    if not rows:
+        return None
+    return [(start, end) for start, end, available in rows
+            if available and start is not None and end is not None]
@@ -0,0 +1,243 @@
+# Appointment reminder scheduler (time-ordered heap fed by range queries)
+import heapq
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+
+from extensions import db
+from models import Appointment, NotificationOutbox
+from appointments.outbox import enqueue_appointment_reminder, reminder_dedupe_keys
+
+logger = logging.getLogger(__name__)
+
+# Reminder name -> how long before the appointment it is due
+REMINDER_LEADS = {'24h': timedelta(hours=24), '2h': timedelta(hours=2)}
+
+REMINDED_STATUSES = ('confirmed',)
+
+# (appointment_id, date, time, status) committed in this process
+_committed_changes = deque()
+
+
+def appointment_start(day, time):
+    hours, minutes = time.split(':')[:2]
+    return datetime(day.year, day.month, day.day, int(hours), int(minutes))
+
+
+def reminder_range_query(first_day, last_day):
+    """Reminded appointments dated first_day..last_day, across all branches (query_plans checks it)."""
+    return select(Appointment.id, Appointment.date, Appointment.time, Appointment.status) \
+        .where(Appointment.date >= first_day, Appointment.date <= last_day,
+               Appointment.status.in_(REMINDED_STATUSES)) \
+        .order_by(Appointment.date, Appointment.id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_appointment_changes(session, flush_context):
+    changed = session.info.setdefault('reminder_changes', {})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Appointment):
+            status = 'deleted' if obj in session.deleted else obj.status
+            changed[obj.id] = (obj.id, obj.date, obj.time, status)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_appointment_changes(session):
+    changed = session.info.pop('reminder_changes', None)
+    if changed:
+        _committed_changes.extend(changed.values())
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_appointment_changes(session, previous_transaction):
+    session.info.pop('reminder_changes', None)
+
+
+class ReminderScheduler:
+    """Keeps the reminders due soon in a min-heap and enqueues them on time.
+
+    Appointments are loaded incrementally: each tick queries only the
+    (date, time) range between the previous horizon and
+    now + longest lead + lookahead, using the (date, id) index, so the heap
+    holds roughly one day of reminders however large the table grows.
+
+    Reschedules and cancellations arrive two ways: the ORM events above for
+    commits made in this process, and an `updated_at` range query for
+    commits made elsewhere. Either bumps the appointment's version, which
+    invalidates its old heap entries.
+
+    Each reminder goes to the outbox under a dedupe key derived from the
+    appointment and its start time, and the key is unique. After a restart,
+    or with two schedulers running, a reminder is queued at most once.
+    """
+
+    def __init__(self, app, leads=None, lookahead=timedelta(minutes=30),
+                 grace=timedelta(minutes=30), batch_size=500, poll_interval=30):
+        self.app = app
+        self.leads = leads or REMINDER_LEADS
+        self.lookahead = lookahead
+        self.grace = grace
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._heap = []  # (due_at, appointment_id, lead, version)
+        self._versions = {}
+        self._loaded_until = None
+        self._changes_since = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ==============================
+    # LOADING
+    # ==============================
+
+    def _schedule(self, appointment_id, day, time, status, now):
+        starts_at = appointment_start(day, time)
+        previous = self._versions.get(appointment_id)
+        if previous and previous[1:] == (starts_at, status):
+            return  # already scheduled as-is
+        # A new version invalidates any heap entries queued for the old one
+        version = (previous[0] + 1) if previous else 1
+        if status not in REMINDED_STATUSES or starts_at > self._loaded_until:
+            # Cancelled, or picked up later when the horizon reaches it
+            if previous:
+                self._versions[appointment_id] = (version, starts_at, status)
+            return
+        self._versions[appointment_id] = (version, starts_at, status)
+        for lead, offset in self.leads.items():
+            due_at = starts_at - offset
+            if due_at >= now - self.grace and starts_at > now:
+                heapq.heappush(self._heap, (due_at, appointment_id, lead, version))
+
+    def _load_range(self, start, end, now):
+        """Schedule confirmed appointments starting in (start, end]."""
+        rows = db.session.execute(reminder_range_query(start.date(), end.date())).all()
+        for appointment_id, day, time, status in rows:
+            starts_at = appointment_start(day, time)
+            if start < starts_at <= end:
+                self._schedule(appointment_id, day, time, status, now)
+
+    def _apply_changes(self, now):
+        changes = []
+        while _committed_changes:
+            changes.append(_committed_changes.popleft())
+
+        # Overlap the previous poll so rows committed late are not missed;
+        # re-scheduling an unchanged appointment is harmless.
+        since = self._changes_since - timedelta(seconds=60)
+        self._changes_since = datetime.utcnow()
+        changes.extend(db.session.execute(
+            select(Appointment.id, Appointment.date, Appointment.time, Appointment.status)
+            .where(Appointment.updated_at >= since)
+        ).all())
+
+        for appointment_id, day, time, status in changes:
+            self._schedule(appointment_id, day, time, status, now)
+
+        if len(self._versions) > 2 * len(self._heap) + 1000:
+            live = {appointment_id for _, appointment_id, _, _ in self._heap}
+            self._versions = {key: value for key, value in self._versions.items() if key in live}
+
+    def refresh(self, now=None):
+        """Extend the loaded horizon and fold in recent appointment changes."""
+        now = now or datetime.now()
+        horizon = now + max(self.leads.values()) + self.lookahead
+        if self._loaded_until is None:
+            # Start (or restart) slightly in the past so reminders missed
+            # while down are still sent within the grace period.
+            self._loaded_until = now + min(self.leads.values()) - self.grace
+            self._changes_since = datetime.utcnow()
+        if horizon > self._loaded_until:
+            start, self._loaded_until = self._loaded_until, horizon
+            self._load_range(start, horizon, now)
+        self._apply_changes(now)
+
+    # ==============================
+    # FIRING
+    # ==============================
+
+    def pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            due_at, appointment_id, lead, version = heapq.heappop(self._heap)
+            current = self._versions.get(appointment_id)
+            if current and current[0] == version:
+                due.append((appointment_id, lead))
+        return due
+
+    def fire(self, due, now):
+        """Enqueue reminders for (appointment_id, lead) pairs; returns how many were queued."""
+        if not due:
+            return 0
+        appointments = {
+            appointment.id: appointment
+            for appointment in Appointment.query.options(
+                selectinload(Appointment.user), selectinload(Appointment.service)
+            ).filter(Appointment.id.in_({appointment_id for appointment_id, _ in due}))
+        }
+
+        planned = []
+        for appointment_id, lead in dict.fromkeys(due):
+            appointment = appointments.get(appointment_id)
+            if not appointment or appointment.status not in REMINDED_STATUSES:
+                continue
+            starts_at = appointment_start(appointment.date, appointment.time)
+            if starts_at <= now:
+                continue
+            planned.append((appointment, lead, starts_at))
+
+        all_keys = [key for appointment, lead, starts_at in planned
+                    for key in reminder_dedupe_keys(appointment.id, lead, starts_at).values()]
+        existing = set(db.session.execute(
+            select(NotificationOutbox.dedupe_key).where(NotificationOutbox.dedupe_key.in_(all_keys))
+        ).scalars()) if all_keys else set()
+
+        queued = 0
+        for appointment, lead, starts_at in planned:
+            try:
+                with db.session.begin_nested():
+                    if enqueue_appointment_reminder(appointment, lead, starts_at, skip_keys=existing):
+                        queued += 1
+            except IntegrityError:
+                # Another scheduler queued it first
+                continue
+        db.session.commit()
+        return queued
+
+    def tick(self, now=None):
+        now = now or datetime.now()
+        self.refresh(now)
+        total = 0
+        while True:
+            due = self.pop_due(now)
+            total += self.fire(due, now)
+            if len(due) < self.batch_size:
+                return total
+
+    # ==============================
+    # THREAD
+    # ==============================
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.tick()
+                    db.session.remove()
+            except Exception:
+                logger.exception("Reminder scheduler tick failed; retrying")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='reminder-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
@@ -0,0 +1,111 @@
+# Atomic slot reservation (unique slot-claim rows arbitrate concurrent bookings)
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from extensions import db
+from models import SlotClaim
+from appointments.slots import RELEASED_STATUSES, find_free_slots, grid_cell, parse_hhmm
+
+
+class SlotUnavailable(Exception):
+    """Another appointment already holds part of the requested slot."""
+
+
+def slot_cells(starts_at, ends_at, interval):
+    """Start times of the `interval`-minute grid cells (see grid_cell) that [starts_at, ends_at) touches."""
+    midnight = datetime(starts_at.year, starts_at.month, starts_at.day)
+    step = timedelta(minutes=interval)
+    cell = midnight + timedelta(minutes=grid_cell((starts_at - midnight) // timedelta(minutes=1), interval))
+    cells = []
+    while cell < ends_at:
+        cells.append(cell)
+        cell += step
+    return cells
+
+
+def claim_slot(appointment, interval):
+    """Claim every grid cell a flushed appointment occupies.
+
+    The INSERT itself is the availability check: two bookings that overlap
+    share at least one (staff_id, slot_start) cell, so whichever commits
+    second hits the unique constraint. Non-overlapping bookings never touch
+    the same rows, so they never wait on each other. On SlotUnavailable the
+    caller must roll the transaction back.
+    """
+    rows = [
+        {'staff_id': appointment.staff_id, 'slot_start': cell, 'appointment_id': appointment.id}
+        for cell in slot_cells(appointment.starts_at, appointment.ends_at, interval)
+    ]
+    try:
+        db.session.execute(insert(SlotClaim), rows)
+    except IntegrityError as e:
+        raise SlotUnavailable('Slot already taken') from e
+
+
+def release_slot(appointment):
+    db.session.execute(delete(SlotClaim).where(SlotClaim.appointment_id == appointment.id))
+
+
+def sync_slot_claims(appointment, interval):
+    """Re-claim after a reschedule, or release once the status frees the slot."""
+    db.session.flush()
+    release_slot(appointment)
+    if appointment.status not in RELEASED_STATUSES:
+        claim_slot(appointment, interval)
+
+
+def _is_lock_error(error):
+    message = str(error.orig).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def reserve_appointment(make_appointment, interval, on_reserved=None, attempts=3):
+    """Insert an appointment and its slot claims in one transaction.
+
+    `make_appointment()` builds the (unsaved) Appointment; `on_reserved`
+    runs inside the same transaction once the slot is held (e.g. to queue
+    confirmations). Raises SlotUnavailable on a conflict. SQLite "database
+    is locked" errors from a concurrent writer are retried with a short
+    backoff; they mean "try again", not "taken".
+    """
+    for attempt in range(attempts):
+        try:
+            appointment = make_appointment()
+            db.session.add(appointment)
+            db.session.flush()
+            claim_slot(appointment, interval)
+            if on_reserved:
+                on_reserved(appointment)
+            db.session.commit()
+            return appointment
+        except SlotUnavailable:
+            db.session.rollback()
+            raise
+        except OperationalError as e:
+            db.session.rollback()
+            if not _is_lock_error(e) or attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def nearest_free_slots(staff, service, day, time_hhmm, interval, limit=5, days_ahead=7, now=None):
+    """Up to `limit` free {'date', 'time'} alternatives, closest to the request first.
+
+    Same-day slots are ordered by distance from the requested time; if that
+    is not enough, the earliest slots of the following days fill the list.
+    """
+    requested = parse_hhmm(time_hhmm)
+    alternatives = []
+    for offset in range(days_ahead + 1):
+        current = day + timedelta(days=offset)
+        slots = find_free_slots(staff, service, current, interval=interval, now=now)
+        if offset == 0:
+            slots.sort(key=lambda slot: (abs(parse_hhmm(slot) - requested), slot))
+        for slot in slots[:limit - len(alternatives)]:
+            alternatives.append({'date': current.isoformat(), 'time': slot})
+        if len(alternatives) >= limit:
+            break
+    return alternatives
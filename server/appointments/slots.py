@@ -0,0 +1,129 @@
+# Slot engine (free start times per staff member and day)
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import start_datetime
+from appointments.ranges import RELEASED_STATUSES, availability_windows, busy_intervals_query
+
+DEFAULT_SLOT_INTERVAL = 15  # minutes between candidate start times
+
+
+# ==============================
+# TIME HELPERS
+# ==============================
+
+def parse_hhmm(value):
+    """Convert an 'HH:MM' string into minutes since midnight."""
+    hours, minutes = value.strip().split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def format_hhmm(minutes):
+    """Convert minutes since midnight back into an 'HH:MM' string."""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def grid_cell(minute, interval):
+    """Start minute of the slot-grid cell holding `minute`.
+
+    The grid runs from midnight in `interval`-minute steps. Candidate start
+    times (DayOccupancy.free_slots) and the cells a booking claims
+    (reservations.slot_cells) both come from it, so an offered slot only
+    collides with claims it really overlaps.
+    """
+    return minute // interval * interval
+
+
+def next_grid_start(minute, interval):
+    """First grid point at or after `minute`."""
+    cell = grid_cell(minute, interval)
+    return cell if cell == minute else cell + interval
+
+
+def merge_intervals(intervals):
+    """Sort and merge overlapping [start, end) intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+# ==============================
+# DAY OCCUPANCY
+# ==============================
+
+class DayOccupancy:
+    """Working windows and busy intervals for one staff member on one day.
+
+    Both lists are sorted, merged [start, end) minute intervals, so a
+    candidate slot is checked with a single bisect over the busy list.
+    """
+
+    def __init__(self, windows, busy):
+        self.windows = merge_intervals(windows)
+        self.busy = merge_intervals(busy)
+        self._busy_starts = [start for start, _ in self.busy]
+
+    def is_free(self, start, end):
+        """Return True if [start, end) sits inside a window and overlaps nothing busy."""
+        if not any(w_start <= start and end <= w_end for w_start, w_end in self.windows):
+            return False
+        index = bisect_right(self._busy_starts, start) - 1
+        if index >= 0 and self.busy[index][1] > start:
+            return False
+        return index + 1 >= len(self.busy) or self.busy[index + 1][0] >= end
+
+    def free_slots(self, duration, interval=DEFAULT_SLOT_INTERVAL, not_before=0):
+        """Yield every grid start minute where `duration` minutes fit without a clash."""
+        busy = self.busy
+        for w_start, w_end in self.windows:
+            start = next_grid_start(max(w_start, not_before), interval)
+            index = bisect_right(self._busy_starts, start) - 1
+            index = max(index, 0)
+            while start + duration <= w_end:
+                end = start + duration
+                while index < len(busy) and busy[index][1] <= start:
+                    index += 1
+                if index < len(busy) and busy[index][0] < end:
+                    # Jump straight past the blocking appointment
+                    start = next_grid_start(busy[index][1], interval)
+                    continue
+                yield start
+                start += interval
+
+
+def load_day_occupancy(staff, day):
+    """Build the DayOccupancy for `staff` on `day` from availability and appointments.
+
+    Reads only the typed columns: availability by weekday/start_minute, and
+    appointments by their [starts_at, ends_at) overlap with the day, so one
+    running past midnight still blocks the next morning.
+    """
+    windows = availability_windows(staff.id, day.weekday())
+    if windows is None:
+        windows = [(staff.work_start_minute if staff.work_start_minute is not None else 9 * 60,
+                    staff.work_end_minute if staff.work_end_minute is not None else 18 * 60)]
+
+    midnight = start_datetime(day, 0)
+    booked = db.session.execute(busy_intervals_query(staff.id, midnight, midnight + timedelta(days=1))).all()
+    minute = timedelta(minutes=1)
+    busy = [((starts_at - midnight) // minute, (ends_at - midnight) // minute) for starts_at, ends_at in booked]
+
+    return DayOccupancy(windows, busy)
+
+
+def find_free_slots(staff, service, day, interval=DEFAULT_SLOT_INTERVAL, now=None):
+    """Return the free 'HH:MM' start times for `service` with `staff` on `day`."""
+    now = now or datetime.now()
+    if day < now.date():
+        return []
+    not_before = now.hour * 60 + now.minute if day == now.date() else 0
+
+    occupancy = load_day_occupancy(staff, day)
+    duration = service.duration or 60
+    return [format_hhmm(start) for start in occupancy.free_slots(duration, interval, not_before)]
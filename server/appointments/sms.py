@@ -0,0 +1,43 @@
+# SMS transport (bulk HTTP gateway) and appointment SMS templates
+from appointments.transports import Transport, post_json
+
+
+class HTTPSMSTransport(Transport):
+    """Post a batch of SMS messages to a bulk-send HTTP gateway.
+
+    The gateway receives {"from": ..., "messages": [{"id", "to", "text"}]}
+    and may answer {"failed": {"<id>": "<reason>"}} for rejected numbers.
+    """
+
+    def __init__(self, url, api_key=None, sender=None, timeout=10):
+        self.url = url
+        self.api_key = api_key
+        self.sender = sender
+        self.timeout = timeout
+
+    def send_batch(self, messages):
+        response = post_json(self.url, {
+            'from': self.sender,
+            'messages': [
+                {'id': message['id'], 'to': message['recipient'], 'text': message['body']}
+                for message in messages
+            ]
+        }, api_key=self.api_key, timeout=self.timeout)
+        failed = response.get('failed') or {}
+        return {int(message_id): reason for message_id, reason in failed.items()}
+
+
+def confirmation_sms(appointment):
+    service = appointment.service.name if appointment.service else 'appointment'
+    return (
+        f"Desire Salon: booking received for {service} on "
+        f"{appointment.date.isoformat()} at {appointment.time}."
+    )
+
+
+def reminder_sms(appointment, lead):
+    service = appointment.service.name if appointment.service else 'appointment'
+    return (
+        f"Desire Salon reminder: {service} on {appointment.date.isoformat()} "
+        f"at {appointment.time}."
+    )
@@ -0,0 +1,125 @@
+# Notification transports (shared base, local file and loopback transports)
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+
+class TransportError(Exception):
+    """A whole batch could not be handed to the gateway."""
+
+
+class Transport:
+    """Delivers batches of outbox messages for one channel.
+
+    `send_batch(messages)` receives dicts with id, recipient, subject, body
+    and payload. It returns {message_id: error} for messages that failed
+    individually (empty when everything went through) and raises
+    TransportError when the whole batch failed.
+    """
+
+    def send_batch(self, messages):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileTransport(Transport):
+    """Append each message as one JSON line to a local file (development)."""
+
+    def __init__(self, path, channel=None):
+        self.path = path
+        self.channel = channel
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        lines = [
+            json.dumps({'channel': self.channel, 'sentAt': datetime.utcnow().isoformat(), **message}, default=str)
+            for message in messages
+        ]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as handle:
+            handle.write('\n'.join(lines) + '\n')
+        return {}
+
+
+class LoopbackTransport(Transport):
+    """Keep sent messages in memory; `fail_recipients` simulates rejections (tests)."""
+
+    def __init__(self, channel=None, fail_recipients=()):
+        self.channel = channel
+        self.fail_recipients = set(fail_recipients)
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        failures = {}
+        with self._lock:
+            for message in messages:
+                if message['recipient'] in self.fail_recipients:
+                    failures[message['id']] = 'rejected by loopback transport'
+                else:
+                    self.sent.append(message)
+        return failures
+
+
+def post_json(url, data, api_key=None, timeout=10):
+    """POST a JSON document and return the decoded response body."""
+    headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+    if api_key:
+        headers['Authorization'] = f'Bearer {api_key}'
+    request = urllib.request.Request(url, data=json.dumps(data, default=str).encode('utf-8'),
+                                     headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+    except (urllib.error.URLError, OSError) as e:
+        raise TransportError(str(e))
+    return json.loads(body) if body else {}
+
+
+# ==============================
+# REGISTRY
+# ==============================
+
+def build_transport(config, channel):
+    """Create the transport configured for `channel` ('email', 'sms' or 'push').
+
+    NOTIFICATION_TRANSPORT_<CHANNEL> picks the kind ('file', 'loopback' or
+    the channel's gateway: 'smtp' for email, 'http' for sms/push) and falls
+    back to NOTIFICATION_TRANSPORT.
+    """
+    kind = config.get(f'NOTIFICATION_TRANSPORT_{channel.upper()}') or config.get('NOTIFICATION_TRANSPORT', 'file')
+
+    if kind == 'file':
+        return FileTransport(config.get('NOTIFICATION_FILE', 'notifications.jsonl'), channel=channel)
+    if kind == 'loopback':
+        return LoopbackTransport(channel=channel)
+
+    if channel == 'email' and kind == 'smtp':
+        from appointments.email import SMTPTransport
+        return SMTPTransport(
+            host=config.get('SMTP_HOST', 'localhost'),
+            port=int(config.get('SMTP_PORT', 587)),
+            username=config.get('SMTP_USERNAME'),
+            password=config.get('SMTP_PASSWORD'),
+            use_tls=config.get('SMTP_USE_TLS', True),
+            sender=config.get('MAIL_DEFAULT_SENDER', 'no-reply@desiresalon.com'),
+        )
+    if channel == 'sms' and kind == 'http':
+        from appointments.sms import HTTPSMSTransport
+        return HTTPSMSTransport(
+            url=config['SMS_GATEWAY_URL'],
+            api_key=config.get('SMS_API_KEY'),
+            sender=config.get('SMS_SENDER_ID'),
+        )
+    if channel == 'push' and kind == 'http':
+        from appointments.push import HTTPPushTransport
+        return HTTPPushTransport(url=config['PUSH_GATEWAY_URL'], api_key=config.get('PUSH_API_KEY'))
+
+    raise ValueError(f"Unknown {channel} transport: {kind}")
@@ -0,0 +1,182 @@
+# Notification worker pool (drains the outbox per channel, with retries)
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from extensions import db
+from models import NotificationOutbox
+from appointments.outbox import CHANNELS, outbox_ready
+from appointments.transports import build_transport
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationWorkerPool:
+    """Background threads that deliver outbox messages.
+
+    Each channel gets `workers_per_channel` threads. A thread claims up to
+    `batch_size` due messages of its channel in one UPDATE (stamping a claim
+    token), hands them to the channel transport as a single batch, then marks
+    them sent or schedules a retry with exponential backoff. Claims that are
+    never settled (a crashed worker) become claimable again after
+    `lease_seconds`.
+    """
+
+    def __init__(self, app, channels=CHANNELS, transports=None):
+        config = app.config
+        self.app = app
+        self.channels = tuple(channels)
+        self.workers_per_channel = config.get('NOTIFICATION_WORKERS_PER_CHANNEL', 1)
+        self.batch_size = config.get('NOTIFICATION_BATCH_SIZE', 50)
+        self.max_attempts = config.get('NOTIFICATION_MAX_ATTEMPTS', 5)
+        self.retry_base = config.get('NOTIFICATION_RETRY_BASE_SECONDS', 30)
+        self.retry_max = config.get('NOTIFICATION_RETRY_MAX_SECONDS', 3600)
+        self.poll_interval = config.get('NOTIFICATION_POLL_SECONDS', 2.0)
+        self.lease = timedelta(seconds=config.get('NOTIFICATION_LEASE_SECONDS', 300))
+        self.transports = transports or {channel: build_transport(config, channel) for channel in self.channels}
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ==============================
+    # CLAIM / DELIVER
+    # ==============================
+
+    def _claimable(self, channel, now):
+        return and_(
+            NotificationOutbox.channel == channel,
+            or_(
+                and_(NotificationOutbox.status == 'pending', NotificationOutbox.next_attempt_at <= now),
+                and_(NotificationOutbox.status == 'sending', NotificationOutbox.claimed_at < now - self.lease),
+            )
+        )
+
+    def claim_batch(self, channel):
+        """Claim due messages for `channel` and return them as dicts."""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        candidates = select(NotificationOutbox.id).where(self._claimable(channel, now)) \
+            .order_by(NotificationOutbox.next_attempt_at, NotificationOutbox.id).limit(self.batch_size)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            candidates = candidates.with_for_update(skip_locked=True)
+
+        ids = db.session.execute(candidates).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return token, []
+
+        # The claimable condition is repeated so a row taken by another
+        # worker between the SELECT and this UPDATE is skipped.
+        db.session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(ids), self._claimable(channel, now))
+            .values(status='sending', claim_token=token, claimed_at=now,
+                    attempts=NotificationOutbox.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        rows = db.session.execute(
+            select(NotificationOutbox.id, NotificationOutbox.recipient, NotificationOutbox.subject,
+                   NotificationOutbox.body, NotificationOutbox.payload, NotificationOutbox.attempts)
+            .where(NotificationOutbox.claim_token == token)
+        ).all()
+        db.session.rollback()
+        return token, [row._asdict() for row in rows]
+
+    def retry_delay(self, attempts):
+        return timedelta(seconds=min(self.retry_base * 2 ** max(attempts - 1, 0), self.retry_max))
+
+    def deliver(self, channel, token, messages):
+        """Send one claimed batch and record the outcome of every message."""
+        try:
+            failures = self.transports[channel].send_batch(
+                [{key: message[key] for key in ('id', 'recipient', 'subject', 'body', 'payload')}
+                 for message in messages]
+            )
+        except Exception as e:
+            logger.warning("%s batch of %d failed: %s", channel, len(messages), e)
+            failures = {message['id']: str(e) for message in messages}
+
+        now = datetime.utcnow()
+        sent_ids = [message['id'] for message in messages if message['id'] not in failures]
+        if sent_ids:
+            db.session.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(sent_ids), NotificationOutbox.claim_token == token)
+                .values(status='sent', sent_at=now, claim_token=None, last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+        for message in messages:
+            if message['id'] not in failures:
+                continue
+            give_up = message['attempts'] >= self.max_attempts
+            db.session.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id == message['id'], NotificationOutbox.claim_token == token)
+                .values(
+                    status='failed' if give_up else 'pending',
+                    next_attempt_at=now + self.retry_delay(message['attempts']),
+                    claim_token=None,
+                    last_error=str(failures[message['id']])[:1000],
+                )
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        return len(sent_ids)
+
+    def run_once(self, channel):
+        """Claim and deliver a single batch; returns how many were claimed."""
+        token, messages = self.claim_batch(channel)
+        if messages:
+            self.deliver(channel, token, messages)
+        return len(messages)
+
+    def drain(self):
+        """Deliver everything currently due on every channel (tests, CLI)."""
+        total = 0
+        with self.app.app_context():
+            for channel in self.channels:
+                while True:
+                    claimed = self.run_once(channel)
+                    total += claimed
+                    if claimed < self.batch_size:
+                        break
+        return total
+
+    # ==============================
+    # THREADS
+    # ==============================
+
+    def _loop(self, channel):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    claimed = self.run_once(channel)
+                    db.session.remove()
+            except Exception:
+                logger.exception("Notification worker for %s crashed; retrying", channel)
+                claimed = 0
+            if claimed < self.batch_size:
+                outbox_ready.wait(self.poll_interval)
+                outbox_ready.clear()
+
+    def start(self):
+        for channel in self.channels:
+            for index in range(self.workers_per_channel):
+                thread = threading.Thread(target=self._loop, args=(channel,),
+                                          name=f'notify-{channel}-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        outbox_ready.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        for transport in self.transports.values():
+            transport.close()
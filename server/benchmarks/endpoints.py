@@ -0,0 +1,276 @@
+"""Endpoint benchmark suite.
+
+Generates (or reuses) a synthetic dataset with seed.py, boots the API on
+Werkzeug's threaded server and drives each scenario for --duration seconds
+at every --concurrency level. Reports throughput, p50/p95/p99 latency and
+SQL statements per request, and saves the run as JSON (stamped with the
+git commit) so runs can be compared across commits.
+
+    python benchmarks/endpoints.py                                  # small dataset, all scenarios
+    python benchmarks/endpoints.py --users 1e5 --appointments 1e6 --database /tmp/bench-1m.db
+    python benchmarks/endpoints.py --scenarios services,appointments --concurrency 1,8,32
+    python benchmarks/endpoints.py --compare benchmarks/results/<earlier run>.json
+
+A --database that already exists is reused as is (pass --regenerate to
+rebuild it), so large datasets are only generated once.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime
+
+from loadgen import run_clients, summarize
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from seed import SEED_PASSWORD, parse_count  # noqa: E402  (no app is created on import)
+
+RESULTS_DIR = os.path.join(SERVER_DIR, 'benchmarks', 'results')
+
+SCENARIOS = ('login', 'services', 'appointments', 'dashboard', 'profile_get', 'profile_put')
+
+
+# ==============================
+# SERVER-SIDE QUERY COUNTS
+# ==============================
+
+class QueryCounter:
+    """SQL statements issued while serving requests, summed across requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.queries = 0
+
+    def install(self, app, engine):
+        from flask import g, has_app_context
+        from sqlalchemy import event
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            if has_app_context() and 'bench_queries' in g:
+                g.bench_queries += 1
+
+        @app.before_request
+        def start_counting():
+            g.bench_queries = 0
+
+        @app.after_request
+        def stop_counting(response):
+            with self._lock:
+                self.requests += 1
+                self.queries += g.pop('bench_queries', 0)
+            return response
+
+    def reset(self):
+        with self._lock:
+            self.requests = self.queries = 0
+
+    def per_request(self):
+        with self._lock:
+            return round(self.queries / self.requests, 2) if self.requests else None
+
+
+# ==============================
+# SCENARIOS
+# ==============================
+
+def build_scenarios(base, accounts, admin_token):
+    """name -> make_request(client, iteration) for loadgen.run_clients()."""
+    def bearer(token):
+        return {'Authorization': f'Bearer {token}'}
+
+    def account(client, iteration):
+        return accounts[(client * 7919 + iteration) % len(accounts)]
+
+    def login(client, iteration):
+        email, _ = account(client, iteration)
+        return 'POST', f'{base}/auth/login', {'email': email, 'password': SEED_PASSWORD}, None
+
+    def services(client, iteration):
+        return 'GET', f'{base}/services', None, None
+
+    def appointments(client, iteration):
+        return 'GET', f'{base}/appointments?limit=20', None, bearer(account(client, iteration)[1])
+
+    def dashboard(client, iteration):
+        return 'GET', f'{base}/admin/dashboard/stats', None, bearer(admin_token)
+
+    def profile_get(client, iteration):
+        return 'GET', f'{base}/users/profile', None, bearer(account(client, iteration)[1])
+
+    def profile_put(client, iteration):
+        phone = f'+2547{(client * 100000 + iteration) % 10 ** 8:08d}'
+        return 'PUT', f'{base}/users/profile', {'phone': phone}, bearer(account(client, iteration)[1])
+
+    return {
+        'login': login, 'services': services, 'appointments': appointments,
+        'dashboard': dashboard, 'profile_get': profile_get, 'profile_put': profile_put,
+    }
+
+
+def sample_accounts(app, count, seed):
+    """(email, access token) for `count` customers spread over the id range."""
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import func
+    from extensions import db
+    from models import User
+
+    with app.app_context():
+        max_id = db.session.query(func.max(User.id)).scalar() or 0
+        rng = random.Random(seed)
+        ids = rng.sample(range(2, max_id + 1), min(count, max(max_id - 1, 0)))
+        rows = db.session.query(User.id, User.email).filter(User.id.in_(ids), User.role == 'user').all()
+        accounts = [(email, create_access_token(identity=user_id)) for user_id, email in rows]
+        admin = db.session.query(User.id).filter(User.role == 'admin').order_by(User.id).first()
+        admin_token = create_access_token(identity=admin.id) if admin else None
+    if not accounts:
+        raise SystemExit('The dataset has no customer accounts to log in as')
+    return accounts, admin_token
+
+
+# ==============================
+# RESULTS
+# ==============================
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=SERVER_DIR, capture_output=True, text=True).stdout.strip()
+    try:
+        return {'commit': git('rev-parse', '--short', 'HEAD') or None,
+                'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+    except OSError:
+        return {'commit': None, 'dirty': None}
+
+
+def compare(previous, current):
+    """Print throughput and p95 changes against an earlier results file."""
+    old = {(row['endpoint'], row['concurrency']): row for row in previous['results']}
+    print(f"\nvs {previous['meta'].get('git', {}).get('commit')} ({previous['meta'].get('started_at')})")
+    print(f"{'scenario':<14}{'conc':>5}{'req/s':>10}{'Δ':>8}{'p95 ms':>10}{'Δ':>8}{'q/req':>8}{'Δ':>7}")
+    for row in current['results']:
+        before = old.get((row['endpoint'], row['concurrency']))
+        if before is None:
+            continue
+
+        def delta(key, pct=True):
+            if before.get(key) is None or row.get(key) is None:
+                return '-'
+            if not pct:
+                return f"{row[key] - before[key]:+.1f}"
+            if not before[key]:
+                return '-'
+            return f"{(row[key] - before[key]) / before[key] * 100:+.0f}%"
+
+        print(f"{row['endpoint']:<14}{row['concurrency']:>5}{row['throughput']:>10}{delta('throughput'):>8}"
+              f"{row['p95_ms']:>10}{delta('p95_ms'):>8}{'-' if row['queries_per_request'] is None else row['queries_per_request']:>8}"
+              f"{delta('queries_per_request', pct=False):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"comma list of {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', default='1,8,32', help='comma list of client counts')
+    parser.add_argument('--duration', type=float, default=10, help='measured seconds per run')
+    parser.add_argument('--warmup', type=float, default=2, help='unmeasured seconds before each run')
+    parser.add_argument('--database', help='SQLite file to reuse or create (default: a temp file)')
+    parser.add_argument('--regenerate', action='store_true', help='rebuild --database even if it exists')
+    parser.add_argument('--users', type=parse_count, default=2000)
+    parser.add_argument('--appointments', type=parse_count, default=20000)
+    parser.add_argument('--years', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--accounts', type=int, default=200, help='customers the clients log in as')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--output', help=f'results file (default: {RESULTS_DIR}/<time>-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+
+    workdir = tempfile.mkdtemp(prefix='salon-bench-')
+    database = os.path.abspath(args.database or os.path.join(workdir, 'bench.db'))
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+    os.environ['NOTIFICATION_FILE'] = os.path.join(workdir, 'notifications.jsonl')
+    os.environ['BCRYPT_LOG_ROUNDS'] = str(args.bcrypt_rounds)
+
+    from werkzeug.serving import make_server
+    from app import app
+    from extensions import db
+    from seed import seed_database
+
+    generate = args.regenerate or not os.path.exists(database)
+    if generate:
+        with app.app_context():
+            dataset = seed_database(users=args.users, appointments=args.appointments, years=args.years,
+                                    seed=args.seed)
+    else:
+        print(f"♻️  Reusing dataset {database}")
+        dataset = None
+    with app.app_context():
+        db.create_all()
+        counter = QueryCounter()
+        counter.install(app, db.engine)
+    app.db_initialized = True
+
+    accounts, admin_token = sample_accounts(app, args.accounts, args.seed)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no per-request access log
+    server = make_server('127.0.0.1', args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    requests = build_scenarios(f'http://127.0.0.1:{args.port}/api', accounts, admin_token)
+
+    summary = {
+        'meta': {
+            'started_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': database,
+            'dataset': dataset,
+            'config': vars(args),
+        },
+        'results': [],
+    }
+    try:
+        for name in scenarios:
+            for clients in levels:
+                counter.reset()
+                samples, errors, statuses, elapsed = run_clients(requests[name], clients, args.duration,
+                                                                 args.warmup)
+                row = summarize(name, samples, errors, elapsed)
+                row.update(concurrency=clients, statuses={str(k): v for k, v in sorted(statuses.items())},
+                           queries_per_request=counter.per_request())
+                summary['results'].append(row)
+                print(f"{name:<14} c={clients:<4} {row['throughput']:>8} req/s  p50 {row['p50_ms']:>8} ms  "
+                      f"p95 {row['p95_ms']:>8} ms  p99 {row['p99_ms']:>8} ms  "
+                      f"{row['queries_per_request']} q/req  errors {errors}")
+    finally:
+        server.shutdown()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S}-{summary['meta']['git']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as handle:
+        json.dump(summary, handle, indent=2, default=str)
+    print(f"\n💾 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            compare(json.load(handle), summary)
+
+
+if __name__ == '__main__':
+    main()
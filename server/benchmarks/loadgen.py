@@ -0,0 +1,87 @@
+"""Small threaded HTTP load driver shared by the benchmark scripts."""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name, samples, errors, duration):
+    ms = [s * 1000 for s in samples]
+    return {
+        'endpoint': name,
+        'requests': len(samples),
+        'errors': errors,
+        'throughput': round(len(samples) / duration, 1),
+        'p50_ms': round(percentile(ms, 50) or 0, 2),
+        'p95_ms': round(percentile(ms, 95) or 0, 2),
+        'p99_ms': round(percentile(ms, 99) or 0, 2),
+    }
+
+
+def send(method, url, body=None, headers=None, timeout=30):
+    """Issue one request; returns the HTTP status (0 for a connection error)."""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method,
+                                     headers={'Content-Type': 'application/json', **(headers or {})})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return 0
+
+
+def run_clients(make_request, clients, duration, warmup=0.0):
+    """Run `clients` threads in a closed loop for `warmup + duration` seconds.
+
+    `make_request(client, iteration)` returns (method, url, body, headers).
+    Only requests that start after the warmup are measured; 2xx/3xx answers
+    count as samples, everything else as errors. Returns (samples in
+    seconds, error count, {status: count}, measured wall time).
+    """
+    stop = threading.Event()
+    measuring = threading.Event()
+    lock = threading.Lock()
+    samples, statuses, errors = [], {}, [0]
+
+    def loop(client):
+        iteration = 0
+        while not stop.is_set():
+            method, url, body, headers = make_request(client, iteration)
+            iteration += 1
+            measured = measuring.is_set()
+            started = time.perf_counter()
+            status = send(method, url, body, headers)
+            elapsed = time.perf_counter() - started
+            if not measured:
+                continue
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if 200 <= status < 400:
+                    samples.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=loop, args=(client,), daemon=True) for client in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    measuring.set()
+    started = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return samples, errors[0], statuses, time.perf_counter() - started
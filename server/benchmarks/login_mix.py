@@ -0,0 +1,105 @@
+"""Mixed login + catalog load benchmark.
+
+Boots the API on a throwaway SQLite database with Werkzeug's threaded
+server, then runs login clients (bcrypt-heavy) and catalog clients
+(/api/services) side by side and prints p50/p95/p99 for each.
+
+    python benchmarks/login_mix.py --duration 10 --login-clients 16 --catalog-clients 16
+    python benchmarks/login_mix.py --hash-workers 64   # effectively unbounded, for comparison
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from loadgen import summarize
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def client_loop(url, body, stop, samples, errors, lock):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    headers = {'Content-Type': 'application/json'}
+    while not stop.is_set():
+        request = urllib.request.Request(url, data=data, headers=headers, method='POST' if data else 'GET')
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+            ok = True
+        except (urllib.error.URLError, OSError):
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                samples.append(elapsed)
+            else:
+                errors[0] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--login-clients', type=int, default=16)
+    parser.add_argument('--catalog-clients', type=int, default=16)
+    parser.add_argument('--hash-workers', type=int, default=0, help='PASSWORD_HASH_WORKERS (0 = default)')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--output', help='write the JSON summary here as well')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='salon-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['NOTIFICATION_FILE'] = os.path.join(workdir, 'notifications.jsonl')
+    os.environ['BCRYPT_LOG_ROUNDS'] = str(args.bcrypt_rounds)
+    if args.hash_workers:
+        os.environ['PASSWORD_HASH_WORKERS'] = str(args.hash_workers)
+    sys.path.insert(0, SERVER_DIR)
+
+    from werkzeug.serving import make_server
+    from app import app, initialize_database
+
+    initialize_database()
+    app.db_initialized = True
+    server = make_server('127.0.0.1', args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{args.port}/api'
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'login': ([], [0]), 'services': ([], [0])}
+    threads = []
+    for _ in range(args.login_clients):
+        threads.append(threading.Thread(target=client_loop, args=(
+            f'{base}/auth/login', {'email': 'customer@example.com', 'password': 'password123'},
+            stop, *results['login'], lock)))
+    for _ in range(args.catalog_clients):
+        threads.append(threading.Thread(target=client_loop, args=(
+            f'{base}/services', None, stop, *results['services'], lock)))
+
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    summary = {
+        'config': vars(args),
+        'results': [summarize(name, samples, errors[0], args.duration)
+                    for name, (samples, errors) in results.items()],
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(summary, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+# Catalog cache (pre-serialized service/staff responses with ETags)
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, current_app, g, request
+from sqlalchemy import event, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from db_engine import current_bind_key
+from extensions import db
+from models import CacheVersion, Service, Staff, StaffAvailability
+from replicas import data_as_of
+from tenancy import BRANCH_HEADER
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAME = 'catalog'  # CacheVersion row
+
+
+class CatalogCache:
+    """Bounded LRU of serialized catalog responses, keyed by request.
+
+    Every entry is stamped with the cache version; any committed change to
+    services, staff, their availability or the staff_services link bumps the
+    version and drops all entries. Catalog payloads carry no per-booking
+    data, so appointments never invalidate it.
+
+    Each worker keeps its own copy in memory. Commits also bump the
+    'catalog' row of cache_versions in the same transaction, and every
+    worker compares that row with the value it last saw at most once every
+    `check_interval` seconds, so a change made by any process is picked up
+    everywhere. Entries older than `ttl` seconds are rebuilt regardless,
+    which bounds staleness from writes that bypass the ORM. Payloads built
+    from replica data older than the last invalidation are served but not
+    stored.
+    """
+
+    def __init__(self, max_entries=256, ttl=300, check_interval=2.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.version = 0
+        self.invalidated_at = 0.0
+        self._entries = OrderedDict()
+        self._shared = {}  # bind key -> (cache_versions value last seen, time.monotonic() of the check)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, etag, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, etag
+
+    def put(self, key, version, body, as_of=None):
+        etag = f"{version}-{hashlib.sha1(body).hexdigest()[:20]}"
+        with self._lock:
+            # A write committed while we were building, or the data predates
+            # the last write (a lagging replica); don't cache stale data
+            if version != self.version or (as_of is not None and as_of < self.invalidated_at):
+                return body, etag
+            self._entries[key] = (body, etag, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body, etag
+
+    def invalidate(self):
+        with self._lock:
+            self._invalidate_locked()
+
+    def _invalidate_locked(self):
+        self.version += 1
+        self.invalidated_at = time.time()
+        self._entries.clear()
+
+    def sync(self, bind_key=None):
+        """Drop every entry if another process changed the catalog in `bind_key`'s database.
+
+        Reads the shared version at most once every check_interval seconds,
+        on a plain primary connection and outside the lock.
+        """
+        now = time.monotonic()
+        with self._lock:
+            seen, checked_at = self._shared.get(bind_key, (None, None))
+            if checked_at is not None and now - checked_at < self.check_interval:
+                return
+            # Other requests skip the check while this one reads
+            self._shared[bind_key] = (seen, now)
+        try:
+            current = read_shared_version(bind_key)
+        except DBAPIError as e:
+            logger.warning('Catalog cache version check failed: %s', e.orig)
+            current = None
+        with self._lock:
+            if current is None or (seen is not None and current != seen):
+                # Unknown or changed: nothing cached so far can be trusted
+                self._invalidate_locked()
+            self._shared[bind_key] = (current, now)
+
+
+catalog_cache = CatalogCache()
+
+# Models whose changes make cached catalog payloads stale
+CATALOG_MODELS = (Service, Staff, StaffAvailability)
+
+
+def init_app(app):
+    catalog_cache.ttl = app.config.get('CATALOG_CACHE_TTL_SECONDS', 300)
+    catalog_cache.check_interval = app.config.get('CATALOG_CACHE_CHECK_SECONDS', 2.0)
+
+
+# ==============================
+# SHARED VERSION
+# ==============================
+
+def read_shared_version(bind_key=None):
+    table = CacheVersion.__table__
+    with db.engines[bind_key].connect() as connection:
+        return connection.execute(select(table.c.version).where(table.c.name == CACHE_NAME)).scalar() or 0
+
+
+def bump_shared_version(connection):
+    """Bump the shared catalog version on `connection`, inside the caller's transaction."""
+    table = CacheVersion.__table__
+    result = connection.execute(
+        table.update().where(table.c.name == CACHE_NAME).values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(name=CACHE_NAME, version=1))
+
+
+def cached_json(build):
+    """Serve `build()` (a JSON-able payload) from the catalog cache.
+
+    The key is the branch plus the request path and query string, so
+    branches and different ?fields=/?expand= projections are cached
+    separately. Honors If-None-Match with a 304.
+    """
+    catalog_cache.sync(current_bind_key())
+    key = (g.get('branch_code'), request.full_path)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        version, as_of = catalog_cache.version, data_as_of()
+        payload = build()
+        if isinstance(payload, (Response, tuple)):
+            # Error responses pass through uncached
+            return payload
+        body = current_app.json.dumps(payload).encode('utf-8') + b'\n'
+        entry = catalog_cache.put(key, version, body, as_of)
+    body, etag = entry
+
+    # Weak match: compression.py weakens the ETag on gzipped responses
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=current_app.json.mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, no-cache'
+    response.vary.add(BRANCH_HEADER)
+    return response
+
+
+# ==============================
+# INVALIDATION
+# ==============================
+
+def _touches_catalog(session):
+    for obj in session.dirty:
+        if isinstance(obj, CATALOG_MODELS) and session.is_modified(obj):
+            return True
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, CATALOG_MODELS):
+            return True
+    return False
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_catalog_dirty(session, flush_context):
+    if _touches_catalog(session) and not session.info.get('catalog_dirty'):
+        session.info['catalog_dirty'] = True
+        bump_shared_version(session.connection())
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_catalog(session):
+    if session.info.pop('catalog_dirty', False):
+        catalog_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_catalog_changes(session, previous_transaction):
+    session.info.pop('catalog_dirty', None)
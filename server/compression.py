@@ -0,0 +1,61 @@
+# Response compression (gzip for JSON/text bodies above a size threshold)
+import gzip
+import zlib
+
+from flask import request
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'text/')
+
+
+def _compressible(response, min_size):
+    if response.status_code != 200 or response.direct_passthrough:
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    if not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES):
+        return False
+    # Streamed bodies have no length up front; they are usually the big ones
+    return response.is_streamed or response.calculate_content_length() >= min_size
+
+
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def init_app(app):
+    """Gzip responses of COMPRESS_MIN_SIZE bytes or more for clients that accept it.
+
+    Register after other after_request hooks that read the body (Flask runs
+    them in reverse order). A strong ETag becomes weak once the body is
+    encoded, so If-None-Match handling must use weak comparison.
+    """
+    if not app.config.get('COMPRESS_RESPONSES', True):
+        return
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    level = app.config.get('COMPRESS_LEVEL', 6)
+
+    @app.after_request
+    def compress_response(response):
+        if not _compressible(response, min_size):
+            return response
+        response.vary.add('Accept-Encoding')
+        if not request.accept_encodings.quality('gzip'):
+            return response
+
+        if response.is_streamed:
+            response.response = _gzip_stream(response.response, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(gzip.compress(response.get_data(), compresslevel=level, mtime=0))
+        response.headers['Content-Encoding'] = 'gzip'
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,41 @@
+# Shared pytest setup: a throwaway seeded database and the query-count fixture
+import os
+import tempfile
+
+import pytest
+
+# app.py builds the app at import time, so point it at a scratch database first
+_DATA_DIR = tempfile.mkdtemp(prefix='salon-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_DATA_DIR, 'test.db')
+os.environ.setdefault('NOTIFICATION_FILE', os.path.join(_DATA_DIR, 'notifications.jsonl'))
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+
+pytest_plugins = ['query_counter']
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app as flask_app
+    from seed import seed_database
+
+    with flask_app.app_context():
+        seed_database(users=60, appointments=600, years=0.5, seed=7, bcrypt_rounds=4)
+    flask_app.db_initialized = True
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def admin_headers(app):
+    from flask_jwt_extended import create_access_token
+    from models import User
+
+    with app.app_context():
+        admin = User.query.filter_by(role='admin').first()
+        with app.test_request_context():
+            token = create_access_token(identity=admin.id)
+    return {'Authorization': f'Bearer {token}'}
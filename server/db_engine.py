@@ -0,0 +1,255 @@
+# Database engine profiles (SQLite/PostgreSQL tuning), per-context bind routing and pool metrics
+import threading
+import time
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """Counters for connection pool activity across all engines."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.checked_out = 0
+            self.checkout_timeouts = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.checkout_timeouts += 1
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'checkedOut': self.checked_out,
+                'invalidations': self.invalidations,
+                'checkoutTimeouts': self.checkout_timeouts,
+                'waitSecondsTotal': round(self.wait_seconds_total, 6),
+                'waitSecondsMax': round(self.wait_seconds_max, 6),
+                'waitSecondsAvg': round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except Exception:
+            timed_out = True
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started, timed_out)
+
+
+# ==============================
+# PROFILES
+# ==============================
+
+def resolve_profile(config, uri):
+    profile = config.get('DB_ENGINE_PROFILE', 'auto')
+    if profile != 'auto':
+        return profile
+    backend = make_url(uri).get_backend_name()
+    if backend in ('sqlite', 'postgresql'):
+        return backend
+    return 'default'
+
+
+def _is_memory_sqlite(uri):
+    database = make_url(uri).database
+    return not database or database == ':memory:' or 'mode=memory' in uri
+
+
+def engine_options(config, uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for the selected profile."""
+    profile = resolve_profile(config, uri)
+
+    if profile == 'sqlite':
+        options = {
+            'connect_args': {
+                'timeout': config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000,
+                'check_same_thread': False,
+            },
+        }
+        if not _is_memory_sqlite(uri):
+            options.update({
+                'poolclass': TimedQueuePool,
+                'pool_size': config.get('DB_POOL_SIZE', 10),
+                'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+                'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+            })
+        return options
+
+    if profile == 'postgresql':
+        session_settings = [
+            f"-c statement_timeout={config.get('DB_STATEMENT_TIMEOUT_MS', 5000)}",
+            f"-c lock_timeout={config.get('DB_LOCK_TIMEOUT_MS', 2000)}",
+            f"-c idle_in_transaction_session_timeout={config.get('DB_IDLE_TX_TIMEOUT_MS', 60000)}",
+        ]
+        return {
+            'poolclass': TimedQueuePool,
+            'pool_size': config.get('DB_POOL_SIZE', 10),
+            'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+            'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+            'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+            'pool_pre_ping': True,
+            'connect_args': {
+                'options': ' '.join(session_settings),
+                'application_name': config.get('DB_APPLICATION_NAME', 'salon-api'),
+            },
+        }
+
+    return {'pool_pre_ping': True}
+
+
+def _sqlite_pragmas(config):
+    return [
+        f"PRAGMA journal_mode={config.get('SQLITE_JOURNAL_MODE', 'WAL')}",
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA cache_size=-{int(config.get('SQLITE_CACHE_SIZE_KB', 20000))}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def install_engine_hooks(engine, config):
+    """Per-connection setup and pool metrics for one engine."""
+    if engine.dialect.name == 'sqlite':
+        pragmas = _sqlite_pragmas(config)
+
+        @event.listens_for(engine, 'connect')
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    @event.listens_for(engine, 'connect')
+    def count_connect(dbapi_connection, connection_record):
+        pool_metrics.incr('connects')
+
+    @event.listens_for(engine, 'checkout')
+    def count_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_metrics.incr('checkouts')
+        pool_metrics.incr('checked_out')
+
+    @event.listens_for(engine, 'checkin')
+    def count_checkin(dbapi_connection, connection_record):
+        pool_metrics.incr('checkins')
+        pool_metrics.incr('checked_out', -1)
+
+    @event.listens_for(engine, 'invalidate')
+    def count_invalidate(dbapi_connection, connection_record, exception):
+        pool_metrics.incr('invalidations')
+
+
+def configure_engine_options(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS before db.init_app() builds the engines.
+
+    Binds given as a bare URL get their own profile's options, so a SQLite
+    bind next to a PostgreSQL default is tuned as SQLite.
+    """
+    options = engine_options(app.config, app.config['SQLALCHEMY_DATABASE_URI'])
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    binds = app.config.get('SQLALCHEMY_BINDS') or {}
+    for key, value in binds.items():
+        if isinstance(value, str):
+            binds[key] = {'url': value, **engine_options(app.config, value)}
+
+
+# ==============================
+# BIND ROUTING
+# ==============================
+
+def current_bind_key():
+    """Bind the current context's session is pinned to; None means the default.
+
+    tenancy.py sets g.bind_key for requests to a branch with a database of
+    its own; SESSION_BIND_KEY pins a whole process (workers, CLI).
+    """
+    if not has_app_context():
+        return None
+    return g.get('bind_key', current_app.config.get('SESSION_BIND_KEY'))
+
+
+def current_read_bind_key():
+    """Bind the current context may read from instead of the primary (replicas.py sets g.read_bind)."""
+    return g.get('read_bind') if has_app_context() else None
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends every statement to current_bind_key()'s engine.
+
+    On the default database, reads go to current_read_bind_key() (the
+    replica) when one is set. Flushes and DML statements always go to the
+    primary, and once a session has written, its later reads do too, so a
+    handler sees its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            key = current_bind_key()
+            if key is None:
+                key = self._read_bind(clause)
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _read_bind(self, clause):
+        if self._flushing or getattr(clause, 'is_dml', False):
+            self.info['wrote_primary'] = True
+        if self.info.get('wrote_primary'):
+            return None
+        return current_read_bind_key()
+
+
+def init_app(app, db):
+    """Attach connection hooks to every engine Flask-SQLAlchemy created."""
+    with app.app_context():
+        for engine in db.engines.values():
+            install_engine_hooks(engine, app.config)
+
+
+def pool_status(db):
+    """Pool state per bind plus the shared checkout counters."""
+    return {
+        'engines': {
+            bind_key or 'default': {
+                'dialect': engine.dialect.name,
+                'pool': engine.pool.status(),
+            }
+            for bind_key, engine in db.engines.items()
+        },
+        'metrics': pool_metrics.snapshot(),
+    }
@@ -3,8 +3,10 @@ from flask_bcrypt import Bcrypt
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 
+from db_engine import RoutingSession
+
 # Initialize extensions WITHOUT binding to app
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 migrate = Migrate()
 jwt = JWTManager()
@@ -0,0 +1,89 @@
+# Password hashing on a bounded worker pool
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app
+
+from extensions import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """The hashing pool and its queue are full, or the work timed out."""
+
+
+class PasswordHasherPool:
+    """Run bcrypt on a fixed number of threads with a bounded queue.
+
+    bcrypt releases the GIL, so at most `workers` CPU cores are ever spent
+    on hashing no matter how many login requests arrive; the rest of the
+    request threads stay free for cheap endpoints. When `workers +
+    queue_limit` jobs are already in flight, submit() fails immediately
+    instead of letting requests pile up.
+    """
+
+    def __init__(self, workers=None, queue_limit=32, timeout=10):
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(self.workers + queue_limit)
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy('Password hashing queue is full')
+        try:
+            future = self._executor.submit(fn, *args)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise PasswordHasherBusy('Password hashing timed out')
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def init_app(app):
+    app.extensions['password_hasher'] = PasswordHasherPool(
+        workers=app.config.get('PASSWORD_HASH_WORKERS'),
+        queue_limit=app.config.get('PASSWORD_HASH_QUEUE_LIMIT', 32),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10),
+    )
+
+
+def _pool():
+    return current_app.extensions['password_hasher']
+
+
+def bcrypt_cost(password_hash):
+    """Log rounds stored in a '$2b$<cost>$...' hash, or None if unparseable."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def hash_password(password, rounds=None):
+    rounds = rounds or current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+    return _pool().submit(bcrypt.generate_password_hash, password, rounds).decode('utf-8')
+
+
+def set_user_password(user, password):
+    user.password_hash = hash_password(password)
+
+
+def verify_user_password(user, password):
+    """Check `password` on the pool; rehash it if the stored cost is outdated.
+
+    Returns True on a match. A rehash only updates `user.password_hash`;
+    the caller commits it.
+    """
+    if not _pool().submit(bcrypt.check_password_hash, user.password_hash, password):
+        return False
+    if bcrypt_cost(user.password_hash) != current_app.config.get('BCRYPT_LOG_ROUNDS', 12):
+        set_user_password(user, password)
+    return True
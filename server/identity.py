@@ -0,0 +1,169 @@
+# Identity cache for JWT-authenticated requests
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from db_engine import current_bind_key
+from extensions import db
+from models import User, Appointment, Booking
+from replicas import primary_reads
+
+
+class CachedUser:
+    """Read-only snapshot of a user, as served to `current_user`.
+
+    Carries the serialized profile (including counts) so /auth/me and
+    profile reads need no query. Handlers that modify the user load the
+    real row with `load()`.
+    """
+
+    __slots__ = ('id', 'role', 'email', 'is_active', 'updated_at', '_data')
+
+    def __init__(self, user):
+        self.id = user.id
+        self.role = user.role
+        self.email = user.email
+        self.is_active = user.is_active
+        self.updated_at = user.updated_at
+        self._data = user.to_dict()
+
+    def to_dict(self):
+        return dict(self._data)
+
+    def load(self):
+        return db.session.get(User, self.id)
+
+
+class IdentityCache:
+    """Size-bounded LRU of CachedUser entries with a short TTL.
+
+    Entries are keyed by (bind, user id), since a branch with a database of
+    its own has its own users table, and remember the row's `updated_at`.
+    A hit is only served while the row's updated_at (one primary-key read)
+    still matches, so writes from other processes and raw UPDATEs such as
+    loyalty.record_entries() are picked up on the next request. Commits in
+    this process that touch a user, or add/remove their appointments or
+    bookings, evict the entry; the TTL bounds how stale the counts can get
+    from other processes.
+    """
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        key = (current_bind_key(), user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, cached = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return cached
+
+    def put(self, cached):
+        key = (current_bind_key(), cached.id)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, cached)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        bind_key = current_bind_key()
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop((bind_key, user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def lookup(self, user_id):
+        """Return the CachedUser for `user_id`, loading it on a miss."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        cached = self.get(user_id)
+        # From the primary: a lagging replica could serve a revoked role or
+        # a deactivated account
+        with primary_reads():
+            if cached is not None and cached.updated_at != db.session.execute(
+                    select(User.updated_at).where(User.id == user_id)).scalar():
+                self.invalidate(user_id)
+                cached = None
+            if cached is None:
+                user = db.session.get(User, user_id)
+                if user is None:
+                    return None
+                cached = CachedUser(user)
+                self.put(cached)
+        return cached
+
+
+identity_cache = IdentityCache()
+
+
+def init_app(app, jwt):
+    identity_cache.ttl = app.config.get('IDENTITY_CACHE_TTL', 30)
+    identity_cache.max_entries = app.config.get('IDENTITY_CACHE_SIZE', 10000)
+
+    @jwt.user_identity_loader
+    def user_identity(identity):
+        # PyJWT requires the subject to be a string
+        return str(identity)
+
+    @jwt.additional_claims_loader
+    def database_claim(identity):
+        # User ids are per database; tokens from a dedicated branch database
+        # say which one, so they can't log in as another user elsewhere
+        bind_key = current_bind_key()
+        return {'db': bind_key} if bind_key else {}
+
+    @jwt.token_verification_loader
+    def same_database(jwt_header, jwt_data):
+        return jwt_data.get('db') == current_bind_key()
+
+    @jwt.token_verification_failed_loader
+    def other_database(jwt_header, jwt_data):
+        return jsonify({'message': 'Token was issued for another branch'}), 401
+
+    @jwt.user_lookup_loader
+    def load_current_user(jwt_header, jwt_data):
+        return identity_cache.lookup(jwt_data['sub'])
+
+
+# ==============================
+# INVALIDATION
+# ==============================
+
+@event.listens_for(Session, 'after_flush')
+def _note_changed_users(session, flush_context):
+    changed = session.info.setdefault('identity_changes', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            changed.add(obj.id)
+        elif isinstance(obj, (Appointment, Booking)) and obj not in session.dirty:
+            changed.add(obj.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_changed_users(session):
+    changed = session.info.pop('identity_changes', None)
+    if changed:
+        identity_cache.invalidate(*changed)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_changed_users(session, previous_transaction):
+    session.info.pop('identity_changes', None)
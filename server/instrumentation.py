@@ -0,0 +1,232 @@
+# Per-request instrumentation: latency/SQL/size histograms, slow queries, Server-Timing
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from db_engine import pool_metrics
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense (not thread-safe)."""
+
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.total += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class RequestMetrics:
+    """Per-route request metrics plus a ring of recent slow SQL statements.
+
+    Series are keyed by (method, url rule, status class), so paths with ids
+    share one series and unmatched URLs collapse into route="unmatched".
+    Everything lives in process memory; each worker reports its own numbers.
+    """
+
+    def __init__(self, slow_query_seconds=0.1, slow_query_samples=100):
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self._slow_samples = slow_query_samples
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.series = {}
+            self.statements = {'request': 0, 'background': 0}
+            self.statement_seconds = {'request': 0.0, 'background': 0.0}
+            self.slow_queries = deque(maxlen=self._slow_samples)
+            self.slow_query_counts = {}
+
+    def observe_request(self, method, route, status, seconds, size, statements, db_seconds):
+        key = (method, route, f'{status // 100}xx')
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {
+                    'latency': Histogram(LATENCY_BUCKETS),
+                    'size': Histogram(SIZE_BUCKETS),
+                    'statements': Histogram(STATEMENT_BUCKETS),
+                    'db_seconds': 0.0,
+                }
+            series['latency'].observe(seconds)
+            if size is not None:
+                series['size'].observe(size)
+            series['statements'].observe(statements)
+            series['db_seconds'] += db_seconds
+
+    def observe_statement(self, seconds, statement, route):
+        context = 'background' if route is None else 'request'
+        with self._lock:
+            self.statements[context] += 1
+            self.statement_seconds[context] += seconds
+            if seconds < self.slow_query_seconds:
+                return
+            self.slow_query_counts[route] = self.slow_query_counts.get(route, 0) + 1
+            self.slow_queries.append({
+                'route': route,
+                'durationMs': round(seconds * 1000, 2),
+                'statement': ' '.join(statement.split())[:2000],
+                'at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            })
+
+    def slow_query_snapshot(self):
+        with self._lock:
+            return list(reversed(self.slow_queries))
+
+    # ==============================
+    # PROMETHEUS TEXT FORMAT
+    # ==============================
+
+    def render(self):
+        lines = []
+        with self._lock:
+            series = sorted(self.series.items())
+            self._render_histogram(lines, 'http_request_duration_seconds', 'Request latency by route.',
+                                   [(labels, data['latency']) for labels, data in series])
+            self._render_histogram(lines, 'http_response_size_bytes', 'Response body size by route.',
+                                   [(labels, data['size']) for labels, data in series if data['size'].count])
+            self._render_histogram(lines, 'db_statements_per_request', 'SQL statements issued per request.',
+                                   [(labels, data['statements']) for labels, data in series])
+            lines += ['# HELP db_request_seconds_total Time spent in SQL while serving requests, by route.',
+                      '# TYPE db_request_seconds_total counter']
+            lines += [f'db_request_seconds_total{_labels(_route_labels(labels))} {data["db_seconds"]:.6f}'
+                      for labels, data in series]
+
+            lines += ['# HELP db_statements_total SQL statements executed, inside requests or in background work.',
+                      '# TYPE db_statements_total counter']
+            lines += [f'db_statements_total{_labels({"context": context})} {count}'
+                      for context, count in self.statements.items()]
+            lines += ['# HELP db_statement_seconds_total Time spent executing SQL statements.',
+                      '# TYPE db_statement_seconds_total counter']
+            lines += [f'db_statement_seconds_total{_labels({"context": context})} {seconds:.6f}'
+                      for context, seconds in self.statement_seconds.items()]
+            lines += [f'# HELP db_slow_statements_total Statements slower than {self.slow_query_seconds}s, by route.',
+                      '# TYPE db_slow_statements_total counter']
+            lines += [f'db_slow_statements_total{_labels({"route": route or "background"})} {count}'
+                      for route, count in sorted(self.slow_query_counts.items(), key=lambda item: item[0] or '')]
+
+        pool = pool_metrics.snapshot()
+        for name, key, kind, text in (
+            ('db_pool_checked_out', 'checkedOut', 'gauge', 'Connections currently checked out.'),
+            ('db_pool_connects_total', 'connects', 'counter', 'New DBAPI connections opened.'),
+            ('db_pool_checkouts_total', 'checkouts', 'counter', 'Connection checkouts.'),
+            ('db_pool_invalidations_total', 'invalidations', 'counter', 'Connections invalidated.'),
+            ('db_pool_checkout_timeouts_total', 'checkoutTimeouts', 'counter', 'Checkouts that timed out.'),
+            ('db_pool_wait_seconds_total', 'waitSecondsTotal', 'counter', 'Time spent waiting for a connection.'),
+        ):
+            lines += [f'# HELP {name} {text}', f'# TYPE {name} {kind}', f'{name} {pool[key]}']
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(lines, name, text, series):
+        lines += [f'# HELP {name} {text}', f'# TYPE {name} histogram']
+        for labels, histogram in series:
+            base = _route_labels(labels)
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{_labels({**base, "le": _number(bound)})} {count}')
+            lines.append(f'{name}_bucket{_labels({**base, "le": "+Inf"})} {histogram.count}')
+            lines.append(f'{name}_sum{_labels(base)} {histogram.total:.6f}')
+            lines.append(f'{name}_count{_labels(base)} {histogram.count}')
+
+
+def _route_labels(key):
+    method, route, status = key
+    return {'method': method, 'route': route, 'status': status}
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+request_metrics = RequestMetrics()
+
+
+# ==============================
+# HOOKS
+# ==============================
+
+def _current_route():
+    if not has_request_context():
+        return None
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def install_engine_hooks(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def finish_statement(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['statement_started'].pop()
+        elapsed = time.perf_counter() - started
+        route = _current_route()
+        if route is not None and 'sql_statements' in g:
+            g.sql_statements += 1
+            g.sql_seconds += elapsed
+        request_metrics.observe_statement(elapsed, statement, route)
+
+    @event.listens_for(engine, 'handle_error')
+    def drop_failed_statement(exception_context):
+        # after_cursor_execute never fires for a failed statement
+        started = exception_context.connection.info.get('statement_started') \
+            if exception_context.connection is not None else None
+        if started:
+            started.pop()
+
+
+def init_app(app, db):
+    """Time every request and SQL statement; add Server-Timing headers."""
+    request_metrics.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 100) / 1000
+    server_timing = app.config.get('SERVER_TIMING_HEADER', True)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            install_engine_hooks(engine)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        statements, db_seconds = g.pop('sql_statements', 0), g.pop('sql_seconds', 0.0)
+        size = None if response.is_streamed else response.calculate_content_length()
+        request_metrics.observe_request(request.method, _current_route(), response.status_code,
+                                        elapsed, size, statements, db_seconds)
+        if server_timing:
+            response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.2f}')
+            response.headers.add('Server-Timing', f'db;dur={db_seconds * 1000:.2f};desc="{statements} queries"')
+        return response
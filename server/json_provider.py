@@ -0,0 +1,131 @@
+# JSON provider (orjson when installed, stdlib otherwise) and streamed JSON arrays
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time
+
+from flask import current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the stdlib encoder is used without it
+    orjson = None
+
+
+def _default(value):
+    """Types neither encoder handles natively (orjson already covers dates)."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, with a stdlib fallback.
+
+    Dates and datetimes are written as ISO 8601 by both encoders (Flask's
+    default writes HTTP dates). Keys stay sorted like Flask's default so
+    cached bodies and ETags are stable. Set JSON_ENCODER to 'stdlib' to
+    force the fallback.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.use_orjson = orjson is not None and app.config.get('JSON_ENCODER', 'auto') != 'stdlib'
+
+    @property
+    def encoder_name(self):
+        return 'orjson' if self.use_orjson else 'json'
+
+    def _orjson_options(self, indent=False, newline=False):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        if newline:
+            options |= orjson.OPT_APPEND_NEWLINE
+        return options
+
+    def dumps_bytes(self, obj, indent=False):
+        """Encode `obj` straight to UTF-8 bytes."""
+        if self.use_orjson:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options(indent))
+        return self._stdlib_dumps(obj, indent).encode('utf-8')
+
+    def _stdlib_dumps(self, obj, indent=False):
+        if indent:
+            return json.dumps(obj, default=_default, sort_keys=self.sort_keys, ensure_ascii=self.ensure_ascii,
+                              indent=2)
+        return json.dumps(obj, default=_default, sort_keys=self.sort_keys, ensure_ascii=self.ensure_ascii,
+                          separators=(',', ':'))
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson and set(kwargs) <= {'indent', 'separators'}:
+            return orjson.dumps(obj, default=_default,
+                                option=self._orjson_options(indent=bool(kwargs.get('indent')))).decode('utf-8')
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        if self.use_orjson:
+            body = orjson.dumps(obj, default=_default, option=self._orjson_options(indent, newline=True))
+        else:
+            body = self._stdlib_dumps(obj, indent) + '\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
+
+
+# ==============================
+# STREAMING
+# ==============================
+
+def stream_json_array(rows, key=None, extra=None, batch_size=200):
+    """Stream `rows` (an iterable of JSON-able values) as a JSON array.
+
+    Rows are encoded in batches of `batch_size` as the iterable produces
+    them, so memory stays flat however many rows there are; pair it with
+    Query.yield_per(). With `key` the body is
+    {"<key>": [...], "count": n, **extra}, otherwise a bare array. The
+    request context (and db.session) stays open while the body streams.
+    """
+    provider = current_app.json
+
+    def generate():
+        yield b'{' + provider.dumps_bytes(key) + b':[' if key else b'['
+        count, batch = 0, []
+        for row in rows:
+            batch.append(provider.dumps_bytes(row))
+            if len(batch) >= batch_size:
+                yield (b',' if count else b'') + b','.join(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            yield (b',' if count else b'') + b','.join(batch)
+            count += len(batch)
+        if key:
+            tail = {'count': count, **(extra or {})}
+            yield b'],' + provider.dumps_bytes(tail)[1:] + b'\n'
+        else:
+            yield b']\n'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype=provider.mimetype)
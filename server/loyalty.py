@@ -0,0 +1,253 @@
+# Loyalty points (append-only ledger, incremental balances, batched tier job)
+import math
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from sqlalchemy import Integer, bindparam, cast, event, exists, func, insert, literal, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from extensions import db
+from orm_history import attribute_values, attributes_changed, track_previous_values
+from models import Appointment, LoyaltyEntry, Payment, User
+
+VISIT_POINTS = 10  # per completed appointment
+SPEND_UNIT = 100  # currency units per point on a settled payment
+# (tier, minimum balance), highest first
+TIERS = (('platinum', 5000), ('gold', 2000), ('silver', 500), ('standard', 0))
+TIER_BATCH_SIZE = 1000
+
+
+def tier_for(points):
+    for tier, threshold in TIERS:
+        if (points or 0) >= threshold:
+            return tier
+    return TIERS[-1][0]
+
+
+# ==============================
+# EARNING RULES
+# ==============================
+# Each tracked model maps a row (as a dict of attribute values) to the
+# points it is worth right now; a flush credits the difference between the
+# pre- and post-flush worth, so completing, un-completing, re-pricing or
+# deleting a row all come out as one signed ledger entry.
+
+def _visit_points(v):
+    return VISIT_POINTS if v['status'] == 'completed' else 0
+
+
+def _spend_points(v):
+    # Floors like rebuild_loyalty()'s CAST(floor(...)); a bare CAST rounds on PostgreSQL
+    return math.floor((v['amount'] or 0) / SPEND_UNIT) if v['status'] == 'completed' else 0
+
+
+# model: (source column, reasons for credit/debit, attributes read, rule)
+TRACKED = {
+    Appointment: ('appointment_id', ('appointment_completed', 'appointment_reversed'),
+                  ('user_id', 'status'), _visit_points),
+    Payment: ('payment_id', ('payment_settled', 'payment_reversed'),
+              ('user_id', 'status', 'amount'), _spend_points),
+}
+
+
+# Load the old value when a tracked attribute is set on an expired instance,
+# so the flush can see what the row was worth before
+for _model, (_, _, _attrs, _) in TRACKED.items():
+    track_previous_values(_model, _attrs)
+
+
+def _entry(user_id, points, reason, appointment_id=None, payment_id=None, note=None):
+    return {'user_id': user_id, 'points': points, 'reason': reason, 'appointment_id': appointment_id,
+            'payment_id': payment_id, 'note': note}
+
+
+def collect_entries(session):
+    """Ledger entries for everything pending in a flush."""
+    worth = defaultdict(int)  # (model, source id, user id) -> points gained
+    deleted_sources = set()
+    for obj in session.new:
+        if type(obj) in TRACKED:
+            _, _, attrs, rule = TRACKED[type(obj)]
+            values = attribute_values(obj, attrs)
+            worth[(type(obj), obj.id, values['user_id'])] += rule(values)
+    for obj in session.deleted:
+        if type(obj) in TRACKED:
+            _, _, attrs, rule = TRACKED[type(obj)]
+            values = attribute_values(obj, attrs, previous=True)
+            worth[(type(obj), obj.id, values['user_id'])] -= rule(values)
+            deleted_sources.add((type(obj), obj.id))
+    for obj in session.dirty:
+        if type(obj) not in TRACKED:
+            continue
+        _, _, attrs, rule = TRACKED[type(obj)]
+        if not attributes_changed(obj, attrs):
+            continue
+        before, after = attribute_values(obj, attrs, previous=True), attribute_values(obj, attrs)
+        worth[(type(obj), obj.id, before['user_id'])] -= rule(before)
+        worth[(type(obj), obj.id, after['user_id'])] += rule(after)
+
+    # A deleted user's ledger goes with them; don't write reversals for it
+    deleted_users = {obj.id for obj in session.deleted if isinstance(obj, User)}
+    entries = []
+    for (model, source_id, user_id), points in sorted(worth.items(), key=lambda item: (item[0][0].__name__,
+                                                                                       *item[0][1:])):
+        if not points or user_id is None or user_id in deleted_users:
+            continue
+        column, (credit, debit), _, _ = TRACKED[model]
+        entry = _entry(user_id, points, credit if points > 0 else debit)
+        if (model, source_id) in deleted_sources:
+            entry['note'] = f'{model.__name__.lower()} {source_id} deleted'
+        else:
+            entry[column] = source_id
+        entries.append(entry)
+    return entries
+
+
+# ==============================
+# LEDGER + BALANCES
+# ==============================
+
+def record_entries(connection, entries):
+    """Append `entries` and move each user's balance by the same points.
+
+    Changed users are flagged `tier_stale` for recalculate_tiers(). Returns
+    {user_id: net points}.
+    """
+    now = datetime.utcnow()
+    connection.execute(LoyaltyEntry.__table__.insert(), [{**entry, 'created_at': now} for entry in entries])
+    deltas = defaultdict(int)
+    for entry in entries:
+        deltas[entry['user_id']] += entry['points']
+    users = User.__table__
+    # Stable order so concurrent flushes lock user rows in the same sequence
+    params = [{'uid': user_id, 'delta': delta} for user_id, delta in sorted(deltas.items()) if delta]
+    if params:
+        connection.execute(
+            users.update().where(users.c.id == bindparam('uid'))
+            .values(loyalty_points=func.coalesce(users.c.loyalty_points, 0) + bindparam('delta'), tier_stale=True),
+            params
+        )
+    return deltas
+
+
+def _note_changed_users(session, user_ids):
+    # identity.py evicts these on commit, so /api/auth/me shows the new balance
+    session.info.setdefault('identity_changes', set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _append_ledger_entries(session, flush_context):
+    entries = collect_entries(session)
+    if entries:
+        deltas = record_entries(session.connection(), entries)
+        session.info.setdefault('loyalty_changes', set()).update(deltas)
+        _note_changed_users(session, deltas)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_balances(session, flush_context):
+    # The balance moved underneath any loaded User; reload it on next access
+    for user_id in session.info.pop('loyalty_changes', ()):
+        user = session.identity_map.get(identity_key(User, user_id))
+        if user is not None:
+            session.expire(user, ['loyalty_points', 'tier_stale', 'updated_at'])
+
+
+def adjust_points(user_id, points, note=None):
+    """Manual credit (or debit, with negative points) by an admin. Commits."""
+    record_entries(db.session.connection(), [_entry(user_id, points, 'adjustment', note=note)])
+    _note_changed_users(db.session, [user_id])
+    db.session.commit()
+
+
+# ==============================
+# TIER RECALCULATION
+# ==============================
+
+def recalculate_tiers(batch_size=TIER_BATCH_SIZE):
+    """Re-evaluate membership_tier for users whose balance changed since the last run.
+
+    Walks ix_users_tier_stale_id in id order, so a run reads only the users
+    touched since the previous one, however long the history. Each batch
+    is written back keyed on the balance it read: a user whose points move
+    mid-run stays flagged and is picked up next time. Commits per batch.
+    """
+    users = User.__table__
+    result = {'evaluated': 0, 'changed': 0, 'tiers': Counter()}
+    after_id = 0
+    while True:
+        connection = db.session.connection()
+        rows = connection.execute(
+            select(users.c.id, func.coalesce(users.c.loyalty_points, 0), users.c.membership_tier)
+            .where(users.c.tier_stale.is_(True), users.c.id > after_id)
+            .order_by(users.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        after_id = rows[-1][0]
+        same, moved = [], []
+        for user_id, points, current in rows:
+            tier = tier_for(points)
+            (same if tier == current else moved).append({'uid': user_id, 'points': points, 'tier': tier})
+
+        unchanged_balance = (users.c.id == bindparam('uid'),
+                             func.coalesce(users.c.loyalty_points, 0) == bindparam('points'))
+        if same:
+            # Only clearing the flag; leave updated_at alone
+            connection.execute(users.update().where(*unchanged_balance)
+                               .values(tier_stale=False, updated_at=users.c.updated_at), same)
+        if moved:
+            connection.execute(users.update().where(*unchanged_balance)
+                               .values(tier_stale=False, membership_tier=bindparam('tier')), moved)
+            _note_changed_users(db.session, [row['uid'] for row in moved])
+        db.session.commit()
+
+        result['evaluated'] += len(rows)
+        result['changed'] += len(moved)
+        result['tiers'].update(row['tier'] for row in moved)
+    result['tiers'] = dict(result['tiers'])
+    return result
+
+
+# ==============================
+# REBUILD (BACKFILL)
+# ==============================
+
+def rebuild_loyalty():
+    """Credit completed history that has no ledger entry, then re-derive balances.
+
+    Scans every completed appointment and payment, so use it after bulk
+    loads that bypass the ORM (seed.py) or to repair drift, not on a
+    schedule. Users whose balance changes are flagged for the tier job.
+    """
+    connection = db.session.connection()
+    ledger, users = LoyaltyEntry.__table__, User.__table__
+    appointments, payments = Appointment.__table__, Payment.__table__
+    columns = ['user_id', 'points', 'reason', 'appointment_id', 'payment_id', 'created_at']
+
+    credited = connection.execute(insert(ledger).from_select(columns, select(
+        appointments.c.user_id, literal(VISIT_POINTS), literal('appointment_completed'), appointments.c.id,
+        literal(None, Integer), func.coalesce(appointments.c.updated_at, appointments.c.created_at)
+    ).where(
+        appointments.c.status == 'completed',
+        ~exists().where(ledger.c.appointment_id == appointments.c.id)
+    ))).rowcount
+
+    spend = cast(func.floor(payments.c.amount / SPEND_UNIT), Integer)
+    credited += connection.execute(insert(ledger).from_select(columns, select(
+        payments.c.user_id, spend, literal('payment_settled'), literal(None, Integer), payments.c.id,
+        func.coalesce(payments.c.completed_at, payments.c.created_at)
+    ).where(
+        payments.c.status == 'completed', payments.c.amount >= SPEND_UNIT,
+        ~exists().where(ledger.c.payment_id == payments.c.id)
+    ))).rowcount
+
+    balance = select(func.coalesce(func.sum(ledger.c.points), 0)) \
+        .where(ledger.c.user_id == users.c.id).scalar_subquery()
+    rebalanced = connection.execute(
+        users.update().where(func.coalesce(users.c.loyalty_points, 0) != balance)
+        .values(loyalty_points=balance, tier_stale=True)
+    ).rowcount
+    db.session.commit()
+    return {'credited': credited, 'rebalanced': rebalanced}
@@ -0,0 +1,30 @@
+"""Cache versions
+
+Revision ID: a3d9f6b2c817
+Revises: e2b7c4d9a1f6
+Create Date: 2026-10-18 00:26:51.730418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d9f6b2c817'
+down_revision = 'e2b7c4d9a1f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'cache_versions' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('cache_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_versions')
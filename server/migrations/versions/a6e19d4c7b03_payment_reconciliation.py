@@ -0,0 +1,69 @@
+"""Payment reconciliation
+
+Revision ID: a6e19d4c7b03
+Revises: f3c8a6d2b915
+Create Date: 2026-10-17 19:48:31.662950
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6e19d4c7b03'
+down_revision = 'f3c8a6d2b915'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_payments_created_at', 'payments', ['created_at']),
+    ('ix_payment_callbacks_receipt_number', 'payment_callbacks', ['receipt_number']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    if 'reconciliation_runs' not in tables:
+        op.create_table('reconciliation_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(length=255), nullable=False),
+        sa.Column('applied', sa.Boolean(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('counts', sa.JSON(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'reconciliation_items' not in tables:
+        op.create_table('reconciliation_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('run_id', sa.Integer(), nullable=False),
+        sa.Column('line_number', sa.Integer(), nullable=True),
+        sa.Column('outcome', sa.String(length=30), nullable=False),
+        sa.Column('match_method', sa.String(length=20), nullable=True),
+        sa.Column('transaction_id', sa.String(length=100), nullable=True),
+        sa.Column('payment_id', sa.Integer(), nullable=True),
+        sa.Column('statement_amount', sa.Float(), nullable=True),
+        sa.Column('payment_amount', sa.Float(), nullable=True),
+        sa.Column('statement_status', sa.String(length=20), nullable=True),
+        sa.Column('payment_status', sa.String(length=20), nullable=True),
+        sa.Column('detail', sa.String(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['run_id'], ['reconciliation_runs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_reconciliation_items_run_outcome', 'reconciliation_items', ['run_id', 'outcome', 'id'])
+
+    for name, table, columns in INDEXES:
+        if table in tables and name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
+    op.drop_index('ix_reconciliation_items_run_outcome', table_name='reconciliation_items')
+    op.drop_table('reconciliation_items')
+    op.drop_table('reconciliation_runs')
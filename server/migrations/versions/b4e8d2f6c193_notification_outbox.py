@@ -0,0 +1,49 @@
+"""Notification outbox
+
+Revision ID: b4e8d2f6c193
+Revises: f7c1e9a4b352
+Create Date: 2026-10-18 01:52:40.261937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e8d2f6c193'
+down_revision = 'f7c1e9a4b352'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Until now the outbox only came from db.create_all()
+    if 'notification_outbox' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('notification_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(length=10), nullable=False),
+    sa.Column('recipient', sa.String(length=120), nullable=False),
+    sa.Column('subject', sa.String(length=200), nullable=True),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=True),
+    sa.Column('appointment_id', sa.Integer(), nullable=True),
+    sa.Column('dedupe_key', sa.String(length=120), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('claim_token', sa.String(length=32), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['appointment_id'], ['appointments.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('dedupe_key')
+    )
+    op.create_index('ix_outbox_channel_status_due', 'notification_outbox', ['channel', 'status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_outbox_channel_status_due', table_name='notification_outbox')
+    op.drop_table('notification_outbox')
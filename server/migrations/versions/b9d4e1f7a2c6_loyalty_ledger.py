@@ -0,0 +1,55 @@
+"""Loyalty points ledger
+
+Revision ID: b9d4e1f7a2c6
+Revises: a6e19d4c7b03
+Create Date: 2026-10-17 21:05:12.418377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9d4e1f7a2c6'
+down_revision = 'a6e19d4c7b03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'tier_stale' not in {column['name'] for column in inspector.get_columns('users')}:
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('tier_stale', sa.Boolean(), nullable=True))
+    if 'ix_users_tier_stale_id' not in {index['name'] for index in inspector.get_indexes('users')}:
+        op.create_index('ix_users_tier_stale_id', 'users', ['tier_stale', 'id'])
+
+    if 'loyalty_ledger' in inspector.get_table_names():
+        return
+    op.create_table('loyalty_ledger',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('points', sa.Integer(), nullable=False),
+    sa.Column('reason', sa.String(length=30), nullable=False),
+    sa.Column('appointment_id', sa.Integer(), nullable=True),
+    sa.Column('payment_id', sa.Integer(), nullable=True),
+    sa.Column('note', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['appointment_id'], ['appointments.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['payment_id'], ['payments.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_loyalty_ledger_user_id_id', 'loyalty_ledger', ['user_id', 'id'])
+    op.create_index('ix_loyalty_ledger_appointment_id', 'loyalty_ledger', ['appointment_id'])
+    op.create_index('ix_loyalty_ledger_payment_id', 'loyalty_ledger', ['payment_id'])
+
+
+def downgrade():
+    op.drop_index('ix_loyalty_ledger_payment_id', table_name='loyalty_ledger')
+    op.drop_index('ix_loyalty_ledger_appointment_id', table_name='loyalty_ledger')
+    op.drop_index('ix_loyalty_ledger_user_id_id', table_name='loyalty_ledger')
+    op.drop_table('loyalty_ledger')
+    op.drop_index('ix_users_tier_stale_id', table_name='users')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('tier_stale')
@@ -0,0 +1,63 @@
+"""Hot query indexes
+
+Revision ID: c3a91f2e7b40
+Revises: bd483bc19d7e
+Create Date: 2026-10-17 09:12:44.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a91f2e7b40'
+down_revision = 'bd483bc19d7e'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns, unique)
+INDEXES = [
+    ('ix_appointments_staff_date', 'appointments', ['staff_id', 'date'], False),
+    ('ix_appointments_user_date_id', 'appointments', ['user_id', 'date', 'id'], False),
+    ('ix_appointments_date_id', 'appointments', ['date', 'id'], False),
+    ('ix_appointments_updated_at', 'appointments', ['updated_at'], False),
+    ('ix_bookings_appointment_id', 'bookings', ['appointment_id'], False),
+    ('ix_bookings_user_id', 'bookings', ['user_id'], False),
+    ('ix_payments_user_created_id', 'payments', ['user_id', 'created_at', 'id'], False),
+    ('ix_payments_appointment_id', 'payments', ['appointment_id'], False),
+    ('ix_payments_booking_id', 'payments', ['booking_id'], False),
+    ('ix_payments_transaction_id', 'payments', ['transaction_id'], True),
+    ('ix_staff_availability_staff_day', 'staff_availability', ['staff_id', 'day_of_week'], False),
+]
+
+
+def _existing(inspector, table):
+    """Column tuples already covered by an index or unique constraint on `table`."""
+    covered = {tuple(index['column_names']) for index in inspector.get_indexes(table)}
+    covered.update(tuple(unique['column_names']) for unique in inspector.get_unique_constraints(table))
+    names = {index['name'] for index in inspector.get_indexes(table)}
+    return covered, names
+
+
+def upgrade():
+    # Databases created with db.create_all() may already have some of these
+    # (or lack tables the initial migration never created), so only add
+    # what is missing.
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns, unique in INDEXES:
+        if table not in tables:
+            continue
+        covered, names = _existing(inspector, table)
+        if name in names or tuple(columns) in covered:
+            continue
+        op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns, unique in reversed(INDEXES):
+        if table in tables and name in {index['name'] for index in inspector.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,186 @@
+"""Branches
+
+Revision ID: c5f2a8e1d094
+Revises: b9d4e1f7a2c6
+Create Date: 2026-10-17 22:14:37.902561
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f2a8e1d094'
+down_revision = 'b9d4e1f7a2c6'
+branch_labels = None
+depends_on = None
+
+# Existing rows all belong to the default branch
+DEFAULT_BRANCH_ID = 1
+SCOPED_TABLES = ('services', 'staff', 'appointments', 'bookings', 'payments')
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_services_branch_active_id', 'services', ['branch_id', 'is_active', 'id']),
+    ('ix_staff_branch_active_id', 'staff', ['branch_id', 'is_active', 'id']),
+    ('ix_appointments_branch_date_id', 'appointments', ['branch_id', 'date', 'id']),
+    ('ix_payments_branch_created_id', 'payments', ['branch_id', 'created_at', 'id']),
+]
+# Superseded by ix_appointments_branch_date_id
+REPLACED_INDEXES = [('ix_appointments_date_id', 'appointments', ['date', 'id'])]
+
+# Frozen copy of search.py's DDL at this revision:
+# kind -> (table, rowid offset, name, category, body)
+SOURCES = {
+    'service': ('services', 0, "{row}.name", "{row}.category", "{row}.description"),
+    'staff': ('staff', 1, "{row}.first_name || ' ' || {row}.last_name", "{row}.specialty", "{row}.bio"),
+}
+
+
+def _sources(bind):
+    # Databases built by the initial migration have staff.name (see e4a7b2c9d1f8)
+    sources = dict(SOURCES)
+    if 'first_name' not in {column['name'] for column in sa.inspect(bind).get_columns('staff')}:
+        sources['staff'] = ('staff', 1, "{row}.name", "{row}.specialty", "{row}.bio")
+    return sources
+
+
+# with_branch=False rebuilds the index as e4a7b2c9d1f8 left it (downgrade)
+def _branch_column(with_branch):
+    return ('branch_id, ', '{row}.branch_id, ') if with_branch else ('', '')
+
+
+def _sqlite_statements(sources, with_branch):
+    extra_column, extra_value = _branch_column(with_branch)
+    statements = [
+        f"CREATE VIRTUAL TABLE catalog_search USING fts5("
+        f"kind UNINDEXED, ref_id UNINDEXED, {'branch_id UNINDEXED, ' if with_branch else ''}name, category, body, "
+        f"prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    ]
+    for kind, (table, offset, name, category, body) in sources.items():
+        def insert(row):
+            return (f"INSERT INTO catalog_search (rowid, kind, ref_id, {extra_column}name, category, body) "
+                    f"SELECT {row}.id * 2 + {offset}, '{kind}', {row}.id, {extra_value.format(row=row)}"
+                    f"{name.format(row=row)}, {category.format(row=row)}, {body.format(row=row)} ")
+        statements += [
+            f"CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN "
+            f"{insert('new')}WHERE coalesce(new.is_active, 1); END",
+            f"CREATE TRIGGER {table}_search_update AFTER UPDATE ON {table} BEGIN "
+            f"DELETE FROM catalog_search WHERE rowid = old.id * 2 + {offset}; "
+            f"{insert('new')}WHERE coalesce(new.is_active, 1); END",
+            f"CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM catalog_search WHERE rowid = old.id * 2 + {offset}; END",
+            f"{insert(table)}FROM {table} WHERE coalesce({table}.is_active, 1)",
+        ]
+    return statements
+
+
+def _pg_document(name, category, body):
+    return (f"setweight(to_tsvector('simple', coalesce({name}, '')), 'A') || "
+            f"setweight(to_tsvector('simple', coalesce({category}, '')), 'B') || "
+            f"setweight(to_tsvector('simple', coalesce({body}, '')), 'C')")
+
+
+def _pg_statements(sources, with_branch):
+    extra_column, extra_value = _branch_column(with_branch)
+    statements = [
+        f"CREATE TABLE catalog_search ("
+        f"kind VARCHAR(10) NOT NULL, ref_id INTEGER NOT NULL, {'branch_id INTEGER, ' if with_branch else ''}"
+        f"document TSVECTOR NOT NULL, PRIMARY KEY (kind, ref_id))",
+        "CREATE INDEX ix_catalog_search_document ON catalog_search USING GIN (document)",
+    ]
+    for kind, (table, _, name, category, body) in sources.items():
+        row_document = _pg_document(*(expr.format(row='NEW') for expr in (name, category, body)))
+        table_document = _pg_document(*(expr.format(row=table) for expr in (name, category, body)))
+        statements += [
+            f"CREATE OR REPLACE FUNCTION {table}_search_sync() RETURNS trigger AS $$ BEGIN "
+            f"IF TG_OP <> 'INSERT' THEN DELETE FROM catalog_search WHERE kind = '{kind}' AND ref_id = OLD.id; "
+            f"END IF; "
+            f"IF TG_OP <> 'DELETE' AND coalesce(NEW.is_active, true) THEN "
+            f"INSERT INTO catalog_search (kind, ref_id, {extra_column}document) "
+            f"VALUES ('{kind}', NEW.id, {extra_value.format(row='NEW')}{row_document}); "
+            f"END IF; RETURN NULL; END $$ LANGUAGE plpgsql",
+            f"CREATE TRIGGER {table}_search_sync AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {table}_search_sync()",
+            f"INSERT INTO catalog_search (kind, ref_id, {extra_column}document) "
+            f"SELECT '{kind}', id, {extra_value.format(row=table)}{table_document} FROM {table} "
+            f"WHERE coalesce(is_active, true)",
+        ]
+    return statements
+
+
+def _drop_search_index(bind):
+    # SQLite drops a table's triggers when batch mode rebuilds it, so the
+    # index is dropped up front and recreated once the columns are in place
+    for table, *_ in SOURCES.values():
+        if bind.dialect.name == 'postgresql':
+            bind.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_search_sync ON {table}")
+            bind.exec_driver_sql(f"DROP FUNCTION IF EXISTS {table}_search_sync()")
+        else:
+            for action in ('insert', 'update', 'delete'):
+                bind.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_search_{action}")
+    bind.exec_driver_sql('DROP TABLE IF EXISTS catalog_search')
+
+
+def _create_search_index(bind, with_branch):
+    sources = _sources(bind)
+    for statement in (_pg_statements(sources, with_branch) if bind.dialect.name == 'postgresql'
+                      else _sqlite_statements(sources, with_branch)):
+        bind.exec_driver_sql(statement)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+    if 'branches' not in tables:
+        op.create_table('branches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('code', sa.String(length=30), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('code')
+        )
+    if bind.execute(sa.text('SELECT 1 FROM branches WHERE id = :id'), {'id': DEFAULT_BRANCH_ID}).first() is None:
+        bind.execute(sa.text("INSERT INTO branches (id, code, name, is_active, created_at) "
+                             "VALUES (:id, 'main', 'Main branch', :active, CURRENT_TIMESTAMP)"),
+                     {'id': DEFAULT_BRANCH_ID, 'active': True})
+
+    pending = [table for table in SCOPED_TABLES if table in tables
+               and 'branch_id' not in {column['name'] for column in inspector.get_columns(table)}]
+    if pending:
+        _drop_search_index(bind)
+        for table in pending:
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.add_column(sa.Column('branch_id', sa.Integer(), nullable=False,
+                                              server_default=str(DEFAULT_BRANCH_ID)))
+                batch_op.create_foreign_key(f'{table}_branch_id_fkey', 'branches', ['branch_id'], ['id'])
+        _create_search_index(bind, with_branch=True)
+
+    inspector = sa.inspect(bind)
+    for name, table, columns in INDEXES:
+        if table in tables and name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+    for name, table, _ in REPLACED_INDEXES:
+        if table in tables and name in {index['name'] for index in inspector.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
+
+
+def downgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+    for name, table, columns in REPLACED_INDEXES:
+        if table in tables:
+            op.create_index(name, table, columns)
+    for name, table, _ in INDEXES:
+        if table in tables:
+            op.drop_index(name, table_name=table)
+    _drop_search_index(bind)
+    for table in (table for table in SCOPED_TABLES if table in tables):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_constraint(f'{table}_branch_id_fkey', type_='foreignkey')
+            batch_op.drop_column('branch_id')
+    _create_search_index(bind, with_branch=False)
+    op.drop_table('branches')
@@ -0,0 +1,149 @@
+"""Typed time columns
+
+Revision ID: c7d2e5a1f9b3
+Revises: c3a91f2e7b40
+Create Date: 2026-10-17 11:40:03.527816
+
+"""
+import os
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e5a1f9b3'
+down_revision = 'c3a91f2e7b40'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = int(os.environ.get('BACKFILL_BATCH_SIZE', 1000))
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# table -> [(column, type)]
+COLUMNS = {
+    'appointments': [('start_minute', sa.SmallInteger()), ('starts_at', sa.DateTime()), ('ends_at', sa.DateTime())],
+    'staff_availability': [('weekday', sa.SmallInteger()), ('start_minute', sa.SmallInteger()),
+                           ('end_minute', sa.SmallInteger())],
+    'staff': [('work_start_minute', sa.SmallInteger()), ('work_end_minute', sa.SmallInteger())],
+}
+
+INDEXES = [
+    ('ix_appointments_staff_starts', 'appointments', ['staff_id', 'starts_at', 'ends_at']),
+    ('ix_appointments_starts_at', 'appointments', ['starts_at']),
+    ('ix_staff_availability_staff_weekday', 'staff_availability', ['staff_id', 'weekday', 'start_minute']),
+]
+
+
+def _minute(value):
+    try:
+        hours, minutes = value.strip().split(':')[:2]
+        return int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _weekday(name):
+    try:
+        return WEEKDAYS.index(name.strip().lower())
+    except (AttributeError, ValueError):
+        return None
+
+
+def _date(value):
+    # SQLite hands back Date columns as 'YYYY-MM-DD' strings through Core
+    return datetime.strptime(value[:10], '%Y-%m-%d') if isinstance(value, str) else \
+        datetime(value.year, value.month, value.day)
+
+
+def _appointment_values(row, durations):
+    minute = _minute(row.time)
+    if minute is None or row.date is None:
+        return {'start_minute': None, 'starts_at': None, 'ends_at': None}
+    starts_at = _date(row.date) + timedelta(minutes=minute)
+    return {
+        'start_minute': minute,
+        'starts_at': starts_at,
+        'ends_at': starts_at + timedelta(minutes=durations.get(row.service_id) or 60),
+    }
+
+
+def _backfill(bind, table, source_columns, derive, pending):
+    """Fill the typed columns of `table` in primary-key chunks.
+
+    Each chunk is one short UPDATE batch run in autocommit mode, so the
+    table is never locked for the whole backfill and the app can keep
+    serving while it runs. Only rows still missing values are touched,
+    which makes the backfill safe to interrupt and re-run.
+    """
+    columns = [sa.column('id')] + [sa.column(name) for name in source_columns] + \
+        [sa.column(name) for name, _ in COLUMNS[table]]
+    target = sa.table(table, *columns)
+    update = target.update().where(target.c.id == sa.bindparam('_id')) \
+        .values({name: sa.bindparam(name) for name, _ in COLUMNS[table]})
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(target.c.id, *[target.c[name] for name in source_columns])
+            .where(target.c.id > last_id, pending(target))
+            .order_by(target.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        with op.get_context().autocommit_block():
+            bind.execute(update, [dict(derive(row), _id=row.id) for row in rows])
+        last_id = rows[-1].id
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    for table, columns in COLUMNS.items():
+        if table not in tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for name, type_ in columns:
+            if name not in existing:
+                op.add_column(table, sa.Column(name, type_, nullable=True))
+    for name, table, columns in INDEXES:
+        if table in tables and name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+    if os.environ.get('SKIP_TIME_BACKFILL'):
+        return
+
+    if 'appointments' in tables:
+        durations = dict(bind.execute(sa.text('SELECT id, duration FROM services')).all())
+        _backfill(bind, 'appointments', ['date', 'time', 'service_id'],
+                  lambda row: _appointment_values(row, durations),
+                  lambda t: t.c.starts_at.is_(None))
+    if 'staff_availability' in tables:
+        _backfill(bind, 'staff_availability', ['day_of_week', 'start_time', 'end_time'],
+                  lambda row: {'weekday': _weekday(row.day_of_week),
+                               'start_minute': _minute(row.start_time),
+                               'end_minute': _minute(row.end_time)},
+                  lambda t: t.c.weekday.is_(None))
+    if 'staff' in tables and 'working_hours_start' in {c['name'] for c in inspector.get_columns('staff')}:
+        _backfill(bind, 'staff', ['working_hours_start', 'working_hours_end'],
+                  lambda row: {'work_start_minute': _minute(row.working_hours_start or '09:00'),
+                               'work_end_minute': _minute(row.working_hours_end or '18:00')},
+                  lambda t: t.c.work_start_minute.is_(None))
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in reversed(INDEXES):
+        if table in tables and name in {index['name'] for index in inspector.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
+    for table, columns in COLUMNS.items():
+        if table not in tables:
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            for name, _ in reversed(columns):
+                batch_op.drop_column(name)
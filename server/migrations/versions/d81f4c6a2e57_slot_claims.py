@@ -0,0 +1,82 @@
+"""Slot claims
+
+Revision ID: d81f4c6a2e57
+Revises: c7d2e5a1f9b3
+Create Date: 2026-10-17 14:05:21.903412
+
+"""
+import os
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f4c6a2e57'
+down_revision = 'c7d2e5a1f9b3'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = int(os.environ.get('BACKFILL_BATCH_SIZE', 1000))
+SLOT_INTERVAL_MINUTES = int(os.environ.get('SLOT_INTERVAL_MINUTES', 15))
+RELEASED_STATUSES = ('cancelled', 'no-show')
+
+
+def _cells(starts_at, ends_at):
+    midnight = datetime(starts_at.year, starts_at.month, starts_at.day)
+    step = timedelta(minutes=SLOT_INTERVAL_MINUTES)
+    cell = midnight + (starts_at - midnight) // step * step
+    while cell < ends_at:
+        yield cell
+        cell += step
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'slot_claims' not in sa.inspect(bind).get_table_names():
+        op.create_table('slot_claims',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('staff_id', sa.Integer(), nullable=False),
+        sa.Column('slot_start', sa.DateTime(), nullable=False),
+        sa.Column('appointment_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['appointment_id'], ['appointments.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['staff_id'], ['staff.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('staff_id', 'slot_start', name='uq_slot_claims_staff_slot')
+        )
+        op.create_index('ix_slot_claims_appointment_id', 'slot_claims', ['appointment_id'])
+
+    # Claim the slots of upcoming active appointments. Existing double
+    # bookings keep the claim of whichever appointment was booked first.
+    appointments = sa.table('appointments', sa.column('id'), sa.column('staff_id'), sa.column('status'),
+                            sa.column('starts_at', sa.DateTime()), sa.column('ends_at', sa.DateTime()))
+    claims = sa.table('slot_claims', sa.column('staff_id'), sa.column('slot_start', sa.DateTime()),
+                      sa.column('appointment_id'), sa.column('created_at', sa.DateTime()))
+    dialect_insert = postgresql.insert if bind.dialect.name == 'postgresql' else sqlite.insert
+    now = datetime.utcnow()
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(appointments.c.id, appointments.c.staff_id, appointments.c.starts_at, appointments.c.ends_at)
+            .where(appointments.c.id > last_id, appointments.c.starts_at >= now,
+                   appointments.c.ends_at.isnot(None), appointments.c.status.notin_(RELEASED_STATUSES))
+            .order_by(appointments.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        values = [
+            {'staff_id': row.staff_id, 'slot_start': cell, 'appointment_id': row.id, 'created_at': now}
+            for row in rows for cell in _cells(row.starts_at, row.ends_at)
+        ]
+        if values:
+            bind.execute(dialect_insert(claims).on_conflict_do_nothing(), values)
+        last_id = rows[-1].id
+
+
+def downgrade():
+    op.drop_index('ix_slot_claims_appointment_id', table_name='slot_claims')
+    op.drop_table('slot_claims')
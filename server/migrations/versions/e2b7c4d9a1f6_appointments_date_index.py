@@ -0,0 +1,35 @@
+"""Appointments date index
+
+Revision ID: e2b7c4d9a1f6
+Revises: c5f2a8e1d094
+Create Date: 2026-10-17 23:41:09.384122
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7c4d9a1f6'
+down_revision = 'c5f2a8e1d094'
+branch_labels = None
+depends_on = None
+
+
+# c5f2a8e1d094 dropped this in favour of ix_appointments_branch_date_id, but
+# the reminder scheduler ranges over every branch and needs (date, id)
+NAME, TABLE, COLUMNS = 'ix_appointments_date_id', 'appointments', ['date', 'id']
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE in inspector.get_table_names() \
+            and NAME not in {index['name'] for index in inspector.get_indexes(TABLE)}:
+        op.create_index(NAME, TABLE, COLUMNS)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE in inspector.get_table_names() \
+            and NAME in {index['name'] for index in inspector.get_indexes(TABLE)}:
+        op.drop_index(NAME, table_name=TABLE)
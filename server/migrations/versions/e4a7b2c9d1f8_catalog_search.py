@@ -0,0 +1,110 @@
+"""Catalog search index
+
+Revision ID: e4a7b2c9d1f8
+Revises: d81f4c6a2e57
+Create Date: 2026-10-17 16:40:12.554019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7b2c9d1f8'
+down_revision = 'd81f4c6a2e57'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of search.py's DDL at this revision:
+# kind -> (table, rowid offset, name, category, body)
+SOURCES = {
+    'service': ('services', 0, "{row}.name", "{row}.category", "{row}.description"),
+    'staff': ('staff', 1, "{row}.first_name || ' ' || {row}.last_name", "{row}.specialty", "{row}.bio"),
+}
+
+
+def _sources(bind):
+    # Databases built by the initial migration have staff.name rather than
+    # first_name/last_name (the models were created with db.create_all())
+    sources = dict(SOURCES)
+    if 'first_name' not in {column['name'] for column in sa.inspect(bind).get_columns('staff')}:
+        sources['staff'] = ('staff', 1, "{row}.name", "{row}.specialty", "{row}.bio")
+    return sources
+
+
+def _sqlite_statements(sources):
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_search USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, name, category, body, "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+        "DELETE FROM catalog_search",
+    ]
+    for kind, (table, offset, name, category, body) in sources.items():
+        def insert(row):
+            return (f"INSERT INTO catalog_search (rowid, kind, ref_id, name, category, body) "
+                    f"SELECT {row}.id * 2 + {offset}, '{kind}', {row}.id, {name.format(row=row)}, "
+                    f"{category.format(row=row)}, {body.format(row=row)} ")
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN "
+            f"{insert('new')}WHERE coalesce(new.is_active, 1); END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table} BEGIN "
+            f"DELETE FROM catalog_search WHERE rowid = old.id * 2 + {offset}; "
+            f"{insert('new')}WHERE coalesce(new.is_active, 1); END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM catalog_search WHERE rowid = old.id * 2 + {offset}; END",
+            f"{insert(table)}FROM {table} WHERE coalesce({table}.is_active, 1)",
+        ]
+    return statements
+
+
+def _pg_document(name, category, body):
+    return (f"setweight(to_tsvector('simple', coalesce({name}, '')), 'A') || "
+            f"setweight(to_tsvector('simple', coalesce({category}, '')), 'B') || "
+            f"setweight(to_tsvector('simple', coalesce({body}, '')), 'C')")
+
+
+def _pg_statements(sources):
+    statements = [
+        "CREATE TABLE IF NOT EXISTS catalog_search ("
+        "kind VARCHAR(10) NOT NULL, ref_id INTEGER NOT NULL, document TSVECTOR NOT NULL, "
+        "PRIMARY KEY (kind, ref_id))",
+        "CREATE INDEX IF NOT EXISTS ix_catalog_search_document ON catalog_search USING GIN (document)",
+        "DELETE FROM catalog_search",
+    ]
+    for kind, (table, _, name, category, body) in sources.items():
+        row_document = _pg_document(*(expr.format(row='NEW') for expr in (name, category, body)))
+        table_document = _pg_document(*(expr.format(row=table) for expr in (name, category, body)))
+        statements += [
+            f"CREATE OR REPLACE FUNCTION {table}_search_sync() RETURNS trigger AS $$ BEGIN "
+            f"IF TG_OP <> 'INSERT' THEN DELETE FROM catalog_search WHERE kind = '{kind}' AND ref_id = OLD.id; "
+            f"END IF; "
+            f"IF TG_OP <> 'DELETE' AND coalesce(NEW.is_active, true) THEN "
+            f"INSERT INTO catalog_search (kind, ref_id, document) VALUES ('{kind}', NEW.id, {row_document}); "
+            f"END IF; RETURN NULL; END $$ LANGUAGE plpgsql",
+            f"DROP TRIGGER IF EXISTS {table}_search_sync ON {table}",
+            f"CREATE TRIGGER {table}_search_sync AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {table}_search_sync()",
+            f"INSERT INTO catalog_search (kind, ref_id, document) "
+            f"SELECT '{kind}', id, {table_document} FROM {table} WHERE coalesce(is_active, true)",
+        ]
+    return statements
+
+
+def upgrade():
+    bind = op.get_bind()
+    sources = _sources(bind)
+    for statement in (_pg_statements(sources) if bind.dialect.name == 'postgresql'
+                      else _sqlite_statements(sources)):
+        bind.exec_driver_sql(statement)
+
+
+def downgrade():
+    bind = op.get_bind()
+    for kind, (table, *_) in SOURCES.items():
+        if bind.dialect.name == 'postgresql':
+            bind.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_search_sync ON {table}")
+            bind.exec_driver_sql(f"DROP FUNCTION IF EXISTS {table}_search_sync()")
+        else:
+            for action in ('insert', 'update', 'delete'):
+                bind.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_search_{action}")
+    op.drop_table('catalog_search')
@@ -0,0 +1,47 @@
+"""Payment callback inbox
+
+Revision ID: f3c8a6d2b915
+Revises: e4a7b2c9d1f8
+Create Date: 2026-10-17 18:22:07.301846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8a6d2b915'
+down_revision = 'e4a7b2c9d1f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'payment_callbacks' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('payment_callbacks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('transaction_id', sa.String(length=100), nullable=False),
+    sa.Column('result_code', sa.Integer(), nullable=False),
+    sa.Column('result_desc', sa.String(length=255), nullable=True),
+    sa.Column('receipt_number', sa.String(length=50), nullable=True),
+    sa.Column('amount', sa.Float(), nullable=True),
+    sa.Column('phone_number', sa.String(length=20), nullable=True),
+    sa.Column('payload', sa.JSON(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('note', sa.String(length=255), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('claim_token', sa.String(length=32), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('received_at', sa.DateTime(), nullable=True),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('transaction_id')
+    )
+    op.create_index('ix_payment_callbacks_status_due', 'payment_callbacks', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_payment_callbacks_status_due', table_name='payment_callbacks')
+    op.drop_table('payment_callbacks')
@@ -0,0 +1,81 @@
+"""Stats summaries
+
+Revision ID: f7c1e9a4b352
+Revises: a3d9f6b2c817
+Create Date: 2026-10-18 01:08:22.519074
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c1e9a4b352'
+down_revision = 'a3d9f6b2c817'
+branch_labels = None
+depends_on = None
+
+
+# table -> (key columns, measure columns); every key column is part of the
+# primary key, and `shard` is added to it
+SUMMARIES = {
+    'stats_daily_revenue': (
+        [sa.Column('day', sa.Date()), sa.Column('status', sa.String(length=20)),
+         sa.Column('payment_method', sa.String(length=50))],
+        [sa.Column('total_amount', sa.Float()), sa.Column('payment_count', sa.Integer())],
+    ),
+    'stats_daily_appointments': (
+        [sa.Column('day', sa.Date()), sa.Column('status', sa.String(length=20)),
+         sa.Column('staff_id', sa.Integer())],
+        [sa.Column('appointment_count', sa.Integer())],
+    ),
+    'stats_daily_activity': (
+        [sa.Column('day', sa.Date())],
+        [sa.Column('new_users', sa.Integer()), sa.Column('new_bookings', sa.Integer())],
+    ),
+    'stats_totals': (
+        [sa.Column('metric', sa.String(length=50))],
+        [sa.Column('value', sa.Float())],
+    ),
+}
+
+
+def _create(name, table, sharded):
+    keys, measures = SUMMARIES[table]
+    key_names = [column.name for column in keys] + (['shard'] if sharded else [])
+    columns = [sa.Column(column.name, column.type, nullable=False) for column in keys]
+    if sharded:
+        columns.append(sa.Column('shard', sa.Integer(), nullable=False, server_default='0'))
+    columns += [sa.Column(column.name, column.type, nullable=False, server_default='0') for column in measures]
+    op.create_table(name, *columns, sa.PrimaryKeyConstraint(*key_names))
+
+
+def _copy(source, target, table):
+    # Sums over shards, so it also collapses them on downgrade
+    keys, measures = (', '.join(column.name for column in columns) for columns in SUMMARIES[table])
+    sums = ', '.join(f'sum({column.name})' for column in SUMMARIES[table][1])
+    op.execute(f'INSERT INTO {target} ({keys}, {measures}) SELECT {keys}, {sums} FROM {source} GROUP BY {keys}')
+
+
+def _rebuild(table, sharded):
+    _create(f'{table}_new', table, sharded)
+    _copy(table, f'{table}_new', table)
+    op.drop_table(table)
+    op.rename_table(f'{table}_new', table)
+
+
+def upgrade():
+    # The summaries used to come from db.create_all() only; create them, or
+    # move existing rows (kept as shard 0) into the sharded layout
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for table in SUMMARIES:
+        if table not in tables:
+            _create(table, table, sharded=True)
+        elif 'shard' not in {column['name'] for column in inspector.get_columns(table)}:
+            _rebuild(table, sharded=True)
+
+
+def downgrade():
+    for table in SUMMARIES:
+        _rebuild(table, sharded=False)
@@ -1,4 +1,7 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from flask import g, has_app_context
+from sqlalchemy import event, exists, func, inspect, select
+from sqlalchemy.orm import declared_attr, selectinload, undefer_group
 # Import db and bcrypt from extensions
 from extensions import db, bcrypt
 
@@ -13,11 +16,162 @@ staff_services = db.Table('staff_services',
     db.Column('created_at', db.DateTime, default=datetime.utcnow)
 )
 
+# ==============================
+# TIME HELPERS
+# ==============================
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def minute_of_day(value):
+    """'HH:MM' -> minutes since midnight, or None for a blank/unparseable value."""
+    try:
+        hours, minutes = value.strip().split(':')[:2]
+        return int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        return None
+
+
+def weekday_number(name):
+    """'monday'..'sunday' -> 0..6 (date.weekday() numbering), or None."""
+    try:
+        return WEEKDAYS.index(name.strip().lower())
+    except (AttributeError, ValueError):
+        return None
+
+
+def start_datetime(day, minute):
+    return datetime(day.year, day.month, day.day) + timedelta(minutes=minute)
+
+# ==============================
+# SERIALIZATION
+# ==============================
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _split_paths(paths):
+    """Split dotted paths into {head: [tails]}; a bare head maps to []."""
+    tree = {}
+    for path in paths or ():
+        head, _, tail = path.partition('.')
+        tree.setdefault(head, [])
+        if tail:
+            tree[head].append(tail)
+    return tree
+
+
+def parse_projection(args):
+    """Read `?fields=a,b,user.email` and `?expand=service,user` into to_dict() kwargs."""
+    projection = {}
+    for key in ('fields', 'expand'):
+        raw = args.get(key)
+        if raw is not None:
+            projection[key] = [part.strip() for part in raw.split(',') if part.strip()]
+    return projection
+
+
+class SerializerMixin:
+    """Projection-based serialization shared by all models.
+
+    Each model declares:
+    - `serialize_fields`: output key -> callable(obj) for plain column values
+    - `serialize_computed`: output key -> callable(obj) for derived values
+      (counts, flags) that may cost a query; emitted by the 'detail' profile
+      or when named in `fields`
+    - `serialize_relations`: output key -> relationship attribute name
+    - `default_expand`: relations the 'detail' profile expands
+
+    Nested objects are always emitted with the 'shallow' profile (columns
+    only) unless the caller expands further with dotted paths, e.g.
+    `expand=['appointment.service']`, so serialization never cascades.
+    """
+
+    serialize_fields = {}
+    serialize_computed = {}
+    serialize_relations = {}
+    default_expand = ()
+
+    def to_dict(self, profile='detail', fields=None, expand=None):
+        field_tree = _split_paths(fields) if fields is not None else None
+        if expand is None:
+            expand = self.default_expand if profile == 'detail' else ()
+        expand_tree = _split_paths(expand)
+
+        def wanted(key):
+            return field_tree is None or key in field_tree
+
+        data = {key: getter(self) for key, getter in self.serialize_fields.items() if wanted(key)}
+
+        for key, getter in self.serialize_computed.items():
+            if (field_tree is None and profile == 'detail') or (field_tree is not None and key in field_tree):
+                data[key] = getter(self)
+
+        for key, attr in self.serialize_relations.items():
+            named = field_tree is not None and key in field_tree
+            if key not in expand_tree and not named:
+                continue
+            nested_kwargs = {
+                'profile': 'shallow',
+                'fields': field_tree[key] or None if named else None,
+                'expand': expand_tree.get(key, []),
+            }
+            value = getattr(self, attr)
+            if value is None:
+                data[key] = None
+            elif isinstance(value, list):
+                data[key] = [item.to_dict(**nested_kwargs) for item in value]
+            else:
+                data[key] = value.to_dict(**nested_kwargs)
+
+        return data
+
+# ==============================
+# BRANCH MODEL
+# ==============================
+# Every salon branch shares one deployment. Services, staff, appointments,
+# bookings and payments carry a branch_id; tenancy.py picks the branch per
+# request and scopes ORM queries to it. Users are shared by all branches.
+
+DEFAULT_BRANCH_ID = 1  # created by the migration / initialize_database()
+
+
+class Branch(SerializerMixin, db.Model):
+    __tablename__ = 'branches'
+
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(30), unique=True, nullable=False)  # X-Branch header / ?branch= value
+    name = db.Column(db.String(100), nullable=False)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    serialize_fields = {
+        'id': lambda b: b.id,
+        'code': lambda b: b.code,
+        'name': lambda b: b.name,
+        'isActive': lambda b: b.is_active,
+    }
+
+
+def _current_branch_id():
+    # Set per request by tenancy.py; scripts and workers fall back to the default branch
+    return (g.get('branch_id') if has_app_context() else None) or DEFAULT_BRANCH_ID
+
+
+class BranchScoped:
+    """Adds branch_id to a model and opts it into per-request branch scoping."""
+
+    @declared_attr
+    def branch_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=False, default=_current_branch_id)
+
+
 # ==============================
 # USER MODEL
 # ==============================
 
-class User(db.Model):
+class User(SerializerMixin, db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -31,12 +185,21 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     loyalty_points = db.Column(db.Integer, default=0)
     membership_tier = db.Column(db.String(20), default='standard')
+    # Set whenever loyalty_points changes; cleared by loyalty.recalculate_tiers()
+    tier_stale = db.Column(db.Boolean, default=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Tier job: only the users whose balance moved since its last run
+        db.Index('ix_users_tier_stale_id', 'tier_stale', 'id'),
+    )
     
     # Relationships
     appointments = db.relationship('Appointment', back_populates='user', cascade='all, delete-orphan')
     bookings = db.relationship('Booking', back_populates='user', cascade='all, delete-orphan')
     payments = db.relationship('Payment', back_populates='user', cascade='all, delete-orphan')
+    loyalty_entries = db.relationship('LoyaltyEntry', back_populates='user', cascade='all, delete-orphan',
+                                      lazy='dynamic')
 
     def set_password(self, password):
         self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
@@ -44,29 +207,36 @@ class User(db.Model):
     def check_password(self, password):
         return bcrypt.check_password_hash(self.password_hash, password)
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'firstName': self.first_name,
-            'lastName': self.last_name,
-            'email': self.email,
-            'phone': self.phone,
-            'role': self.role,
-            'isActive': self.is_active,
-            'loyaltyPoints': self.loyalty_points,
-            'membershipTier': self.membership_tier,
-            'createdAt': self.created_at.isoformat() if self.created_at else None,
-            'updatedAt': self.updated_at.isoformat() if self.updated_at else None,
-            # Include counts for frontend
-            'appointmentCount': len(self.appointments),
-            'bookingCount': len(self.bookings)
-        }
+    serialize_fields = {
+        'id': lambda u: u.id,
+        'firstName': lambda u: u.first_name,
+        'lastName': lambda u: u.last_name,
+        'email': lambda u: u.email,
+        'phone': lambda u: u.phone,
+        'role': lambda u: u.role,
+        'isActive': lambda u: u.is_active,
+        'loyaltyPoints': lambda u: u.loyalty_points,
+        'membershipTier': lambda u: u.membership_tier,
+        'createdAt': lambda u: _iso(u.created_at),
+        'updatedAt': lambda u: _iso(u.updated_at),
+    }
+    # Include counts for frontend
+    serialize_computed = {
+        'appointmentCount': lambda u: u.appointment_count,
+        'bookingCount': lambda u: u.booking_count,
+    }
+    serialize_relations = {
+        'appointments': 'appointments',
+        'bookings': 'bookings',
+        'payments': 'payments',
+    }
+
 
 # ==============================
 # SERVICE MODEL
 # ==============================
 
-class Service(db.Model):
+class Service(BranchScoped, SerializerMixin, db.Model):
     __tablename__ = 'services'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -79,33 +249,43 @@ class Service(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     image = db.Column(db.String(255))
     staff_required = db.Column(db.Boolean, default=True)
+
+    __table_args__ = (
+        # Catalog listing: a branch's active services by id
+        db.Index('ix_services_branch_active_id', 'branch_id', 'is_active', 'id'),
+    )
     
     # Relationships
     appointments = db.relationship('Appointment', back_populates='service', cascade='all, delete-orphan')
     staff_members = db.relationship('Staff', secondary=staff_services, back_populates='services')
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'price': float(self.price),
-            'duration': self.duration,
-            'category': self.category,
-            'isActive': self.is_active,
-            'image': self.image,
-            'staffRequired': self.staff_required,
-            'createdAt': self.created_at.isoformat() if self.created_at else None,
-            # Include related data
-            'staffCount': len(self.staff_members),
-            'appointmentCount': len(self.appointments)
-        }
+    serialize_fields = {
+        'id': lambda s: s.id,
+        'branchId': lambda s: s.branch_id,
+        'name': lambda s: s.name,
+        'description': lambda s: s.description,
+        'price': lambda s: float(s.price),
+        'duration': lambda s: s.duration,
+        'category': lambda s: s.category,
+        'isActive': lambda s: s.is_active,
+        'image': lambda s: s.image,
+        'staffRequired': lambda s: s.staff_required,
+        'createdAt': lambda s: _iso(s.created_at),
+    }
+    # Include related data
+    serialize_computed = {
+        'staffCount': lambda s: s.staff_count,
+    }
+    serialize_relations = {
+        'staff': 'staff_members',
+    }
+
 
 # ==============================
 # STAFF MODEL
 # ==============================
 
-class Staff(db.Model):
+class Staff(BranchScoped, SerializerMixin, db.Model):
     __tablename__ = 'staff'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -123,43 +303,55 @@ class Staff(db.Model):
     working_hours_start = db.Column(db.String(5), default='09:00')
     working_hours_end = db.Column(db.String(5), default='18:00')
     experience_years = db.Column(db.Integer, default=0)
+    # Typed copies of working_hours_*, kept in sync on flush
+    work_start_minute = db.Column(db.SmallInteger)
+    work_end_minute = db.Column(db.SmallInteger)
+
+    __table_args__ = (
+        db.Index('ix_staff_branch_active_id', 'branch_id', 'is_active', 'id'),
+    )
 
     # Relationships
     appointments = db.relationship('Appointment', back_populates='staff', cascade='all, delete-orphan')
     services = db.relationship('Service', secondary=staff_services, back_populates='staff_members')
     availability = db.relationship('StaffAvailability', back_populates='staff', cascade='all, delete-orphan')
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'firstName': self.first_name,
-            'lastName': self.last_name,
-            'name': f"{self.first_name} {self.last_name}",
-            'email': self.email,
-            'phone': self.phone,
-            'specialty': self.specialty,
-            'experience': self.experience,
-            'bio': self.bio,
-            'rating': float(self.rating),
-            'image': self.image,
-            'isActive': self.is_active,
-            'workingHours': {
-                'start': self.working_hours_start,
-                'end': self.working_hours_end
-            },
-            'experienceYears': self.experience_years,
-            'createdAt': self.created_at.isoformat() if self.created_at else None,
-            # Include related data
-            'serviceCount': len(self.services),
-            'appointmentCount': len(self.appointments),
-            'availability': [avail.to_dict() for avail in self.availability]
-        }
+    serialize_fields = {
+        'id': lambda s: s.id,
+        'branchId': lambda s: s.branch_id,
+        'firstName': lambda s: s.first_name,
+        'lastName': lambda s: s.last_name,
+        'name': lambda s: f"{s.first_name} {s.last_name}",
+        'email': lambda s: s.email,
+        'phone': lambda s: s.phone,
+        'specialty': lambda s: s.specialty,
+        'experience': lambda s: s.experience,
+        'bio': lambda s: s.bio,
+        'rating': lambda s: float(s.rating or 0),
+        'image': lambda s: s.image,
+        'isActive': lambda s: s.is_active,
+        'workingHours': lambda s: {
+            'start': s.working_hours_start,
+            'end': s.working_hours_end
+        },
+        'experienceYears': lambda s: s.experience_years,
+        'createdAt': lambda s: _iso(s.created_at),
+    }
+    # Include related data
+    serialize_computed = {
+        'serviceCount': lambda s: s.service_count,
+    }
+    serialize_relations = {
+        'services': 'services',
+        'availability': 'availability',
+    }
+
 
 # ==============================
 # APPOINTMENT MODEL
 # ==============================
 
-class Appointment(db.Model):
+class Appointment(BranchScoped, SerializerMixin, db.Model):
     __tablename__ = 'appointments'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -173,6 +365,26 @@ class Appointment(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Typed copies of date/time kept in sync on flush; ends_at = starts_at + service duration
+    start_minute = db.Column(db.SmallInteger)
+    starts_at = db.Column(db.DateTime)
+    ends_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Slot engine: one staff member's appointments on one day
+        db.Index('ix_appointments_staff_date', 'staff_id', 'date'),
+        # Range/overlap queries: appointments of staff S between T1 and T2
+        db.Index('ix_appointments_staff_starts', 'staff_id', 'starts_at', 'ends_at'),
+        db.Index('ix_appointments_starts_at', 'starts_at'),
+        # Keyset pages ordered by (date, id), per user and across everyone
+        db.Index('ix_appointments_user_date_id', 'user_id', 'date', 'id'),
+        # Reminder scheduler: date ranges across every branch
+        db.Index('ix_appointments_date_id', 'date', 'id'),
+        # Branch-wide date ranges (admin lists, exports) stay within one branch's entries
+        db.Index('ix_appointments_branch_date_id', 'branch_id', 'date', 'id'),
+        # Reminder scheduler picks up reschedules/cancellations by updated_at
+        db.Index('ix_appointments_updated_at', 'updated_at'),
+    )
 
     # Relationships
     user = db.relationship('User', back_populates='appointments')
@@ -181,32 +393,42 @@ class Appointment(db.Model):
     bookings = db.relationship('Booking', back_populates='appointment', cascade='all, delete-orphan')
     payments = db.relationship('Payment', back_populates='appointment', cascade='all, delete-orphan')
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'userId': self.user_id,
-            'serviceId': self.service_id,
-            'staffId': self.staff_id,
-            'date': self.date.isoformat() if self.date else None,
-            'time': self.time,
-            'price': float(self.price),
-            'status': self.status,
-            'notes': self.notes,
-            'createdAt': self.created_at.isoformat() if self.created_at else None,
-            'updatedAt': self.updated_at.isoformat() if self.updated_at else None,
-            # Include related objects
-            'user': self.user.to_dict() if self.user else None,
-            'service': self.service.to_dict() if self.service else None,
-            'staff': self.staff.to_dict() if self.staff else None,
-            'hasBooking': len(self.bookings) > 0,
-            'hasPayment': len(self.payments) > 0
-        }
+    serialize_fields = {
+        'id': lambda a: a.id,
+        'branchId': lambda a: a.branch_id,
+        'userId': lambda a: a.user_id,
+        'serviceId': lambda a: a.service_id,
+        'staffId': lambda a: a.staff_id,
+        'date': lambda a: _iso(a.date),
+        'time': lambda a: a.time,
+        'price': lambda a: float(a.price),
+        'status': lambda a: a.status,
+        'notes': lambda a: a.notes,
+        'createdAt': lambda a: _iso(a.created_at),
+        'updatedAt': lambda a: _iso(a.updated_at),
+        'startsAt': lambda a: _iso(a.starts_at),
+        'endsAt': lambda a: _iso(a.ends_at),
+    }
+    serialize_computed = {
+        'hasBooking': lambda a: a.has_booking,
+        'hasPayment': lambda a: a.has_payment,
+    }
+    # Include related objects
+    serialize_relations = {
+        'user': 'user',
+        'service': 'service',
+        'staff': 'staff',
+        'bookings': 'bookings',
+        'payments': 'payments',
+    }
+    default_expand = ('user', 'service', 'staff')
+
 
 # ==============================
 # BOOKING MODEL
 # ==============================
 
-class Booking(db.Model):
+class Booking(BranchScoped, SerializerMixin, db.Model):
     __tablename__ = 'bookings'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -218,32 +440,45 @@ class Booking(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # Bookings of an appointment, and per-user booking counts
+        db.Index('ix_bookings_appointment_id', 'appointment_id'),
+        db.Index('ix_bookings_user_id', 'user_id'),
+    )
+
     # Relationships
     user = db.relationship('User', back_populates='bookings')
     appointment = db.relationship('Appointment', back_populates='bookings')
     payments = db.relationship('Payment', back_populates='booking', cascade='all, delete-orphan')
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'userId': self.user_id,
-            'appointmentId': self.appointment_id,
-            'status': self.status,
-            'bookingReference': self.booking_reference,
-            'specialRequests': self.special_requests,
-            'createdAt': self.created_at.isoformat() if self.created_at else None,
-            'updatedAt': self.updated_at.isoformat() if self.updated_at else None,
-            # Include related objects
-            'user': self.user.to_dict() if self.user else None,
-            'appointment': self.appointment.to_dict() if self.appointment else None,
-            'hasPayment': len(self.payments) > 0
-        }
+    serialize_fields = {
+        'id': lambda b: b.id,
+        'branchId': lambda b: b.branch_id,
+        'userId': lambda b: b.user_id,
+        'appointmentId': lambda b: b.appointment_id,
+        'status': lambda b: b.status,
+        'bookingReference': lambda b: b.booking_reference,
+        'specialRequests': lambda b: b.special_requests,
+        'createdAt': lambda b: _iso(b.created_at),
+        'updatedAt': lambda b: _iso(b.updated_at),
+    }
+    serialize_computed = {
+        'hasPayment': lambda b: b.has_payment,
+    }
+    # Include related objects
+    serialize_relations = {
+        'user': 'user',
+        'appointment': 'appointment',
+        'payments': 'payments',
+    }
+    default_expand = ('appointment',)
+
 
 # ==============================
 # PAYMENT MODEL
 # ==============================
 
-class Payment(db.Model):
+class Payment(BranchScoped, SerializerMixin, db.Model):
     __tablename__ = 'payments'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -254,43 +489,59 @@ class Payment(db.Model):
     currency = db.Column(db.String(3), default='KES')
     payment_method = db.Column(db.String(50), default='mpesa')  # mpesa, card, cash
     status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed, refunded
-    transaction_id = db.Column(db.String(100), unique=True)
+    transaction_id = db.Column(db.String(100), unique=True, index=True)
     phone_number = db.Column(db.String(20))  # For M-Pesa payments
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
 
+    __table_args__ = (
+        # Keyset pages of a user's payments ordered by (created_at, id)
+        db.Index('ix_payments_user_created_id', 'user_id', 'created_at', 'id'),
+        # A branch's payments by (created_at, id): admin lists and exports
+        db.Index('ix_payments_branch_created_id', 'branch_id', 'created_at', 'id'),
+        # has_payment lookups from appointments and bookings
+        db.Index('ix_payments_appointment_id', 'appointment_id'),
+        db.Index('ix_payments_booking_id', 'booking_id'),
+        # Reconciliation's amount + phone + time window fallback
+        db.Index('ix_payments_created_at', 'created_at'),
+    )
+
     # Relationships
     user = db.relationship('User', back_populates='payments')
     appointment = db.relationship('Appointment', back_populates='payments')
     booking = db.relationship('Booking', back_populates='payments')
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'userId': self.user_id,
-            'appointmentId': self.appointment_id,
-            'bookingId': self.booking_id,
-            'amount': float(self.amount),
-            'currency': self.currency,
-            'paymentMethod': self.payment_method,
-            'status': self.status,
-            'transactionId': self.transaction_id,
-            'phoneNumber': self.phone_number,
-            'description': self.description,
-            'createdAt': self.created_at.isoformat() if self.created_at else None,
-            'completedAt': self.completed_at.isoformat() if self.completed_at else None,
-            # Include related objects
-            'user': self.user.to_dict() if self.user else None,
-            'appointment': self.appointment.to_dict() if self.appointment else None,
-            'booking': self.booking.to_dict() if self.booking else None
-        }
+    serialize_fields = {
+        'id': lambda p: p.id,
+        'branchId': lambda p: p.branch_id,
+        'userId': lambda p: p.user_id,
+        'appointmentId': lambda p: p.appointment_id,
+        'bookingId': lambda p: p.booking_id,
+        'amount': lambda p: float(p.amount),
+        'currency': lambda p: p.currency,
+        'paymentMethod': lambda p: p.payment_method,
+        'status': lambda p: p.status,
+        # transaction_id (the CheckoutRequestID) stays server-side: it names the payment in callbacks
+        'phoneNumber': lambda p: p.phone_number,
+        'description': lambda p: p.description,
+        'createdAt': lambda p: _iso(p.created_at),
+        'completedAt': lambda p: _iso(p.completed_at),
+    }
+    # Include related objects
+    serialize_relations = {
+        'user': 'user',
+        'appointment': 'appointment',
+        'booking': 'booking',
+    }
+    default_expand = ('appointment',)
+
 
 # ==============================
 # STAFF AVAILABILITY MODEL
 # ==============================
 
-class StaffAvailability(db.Model):
+class StaffAvailability(SerializerMixin, db.Model):
     __tablename__ = 'staff_availability'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -301,30 +552,503 @@ class StaffAvailability(db.Model):
     is_available = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Typed copies of day_of_week/start_time/end_time, kept in sync on flush
+    weekday = db.Column(db.SmallInteger)  # 0 = monday
+    start_minute = db.Column(db.SmallInteger)
+    end_minute = db.Column(db.SmallInteger)
+
+    __table_args__ = (
+        # Slot engine: one staff member's hours on one weekday
+        db.Index('ix_staff_availability_staff_day', 'staff_id', 'day_of_week'),
+        db.Index('ix_staff_availability_staff_weekday', 'staff_id', 'weekday', 'start_minute'),
+    )
 
     # Relationships
     staff = db.relationship('Staff', back_populates='availability')
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'staffId': self.staff_id,
-            'dayOfWeek': self.day_of_week,
-            'startTime': self.start_time,
-            'endTime': self.end_time,
-            'isAvailable': self.is_available,
-            'createdAt': self.created_at.isoformat() if self.created_at else None,
-            'updatedAt': self.updated_at.isoformat() if self.updated_at else None
-        }
+    serialize_fields = {
+        'id': lambda a: a.id,
+        'staffId': lambda a: a.staff_id,
+        'dayOfWeek': lambda a: a.day_of_week,
+        'startTime': lambda a: a.start_time,
+        'endTime': lambda a: a.end_time,
+        'isAvailable': lambda a: a.is_available,
+        'createdAt': lambda a: _iso(a.created_at),
+        'updatedAt': lambda a: _iso(a.updated_at),
+    }
+    serialize_relations = {
+        'staff': 'staff',
+    }
+
+
+# ==============================
+# DASHBOARD SUMMARY MODELS
+# ==============================
+# Maintained incrementally by stats.py; rebuild with `flask rebuild-stats`.
+# Every summary row is split over STATS_COUNTER_SHARDS `shard` rows, and
+# each transaction adds its deltas to one shard picked at random, so
+# concurrent bookings rarely wait on the same row lock. Readers sum the
+# shards.
+
+class DailyRevenue(SerializerMixin, db.Model):
+    __tablename__ = 'stats_daily_revenue'
+
+    day = db.Column(db.Date, primary_key=True)  # Payment.created_at date
+    status = db.Column(db.String(20), primary_key=True)
+    payment_method = db.Column(db.String(50), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+
+    serialize_fields = {
+        'day': lambda r: _iso(r.day),
+        'status': lambda r: r.status,
+        'paymentMethod': lambda r: r.payment_method,
+        'totalAmount': lambda r: float(r.total_amount),
+        'paymentCount': lambda r: r.payment_count,
+    }
+
+
+class DailyAppointmentCount(SerializerMixin, db.Model):
+    __tablename__ = 'stats_daily_appointments'
+
+    day = db.Column(db.Date, primary_key=True)  # Appointment.date
+    status = db.Column(db.String(20), primary_key=True)
+    staff_id = db.Column(db.Integer, primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    appointment_count = db.Column(db.Integer, nullable=False, default=0)
+
+    serialize_fields = {
+        'day': lambda r: _iso(r.day),
+        'status': lambda r: r.status,
+        'staffId': lambda r: r.staff_id,
+        'appointmentCount': lambda r: r.appointment_count,
+    }
+
+
+class DailyActivity(SerializerMixin, db.Model):
+    __tablename__ = 'stats_daily_activity'
+
+    day = db.Column(db.Date, primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    new_users = db.Column(db.Integer, nullable=False, default=0)
+    new_bookings = db.Column(db.Integer, nullable=False, default=0)
+
+    serialize_fields = {
+        'day': lambda r: _iso(r.day),
+        'newUsers': lambda r: r.new_users,
+        'newBookings': lambda r: r.new_bookings,
+    }
+
+
+class StatsTotal(db.Model):
+    __tablename__ = 'stats_totals'
+
+    metric = db.Column(db.String(50), primary_key=True)  # e.g. 'users', 'revenue:completed'
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    value = db.Column(db.Float, nullable=False, default=0)
+
+# ==============================
+# CACHE VERSION MODEL
+# ==============================
+# A counter per cache, bumped in the transaction that changes the cached
+# data, so every worker process can tell its in-memory copy is stale
+# (see catalog_cache.py).
+
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(50), primary_key=True)  # e.g. 'catalog'
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# ==============================
+# NOTIFICATION OUTBOX MODEL
+# ==============================
+# Written in the same transaction as the appointment/booking it describes
+# and drained by the worker pool in appointments/worker.py.
+
+class NotificationOutbox(SerializerMixin, db.Model):
+    __tablename__ = 'notification_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(10), nullable=False)  # email, sms, push
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200))
+    body = db.Column(db.Text, nullable=False)
+    payload = db.Column(db.JSON)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'))
+    dedupe_key = db.Column(db.String(120), unique=True)  # e.g. 'confirm:email:42'
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Worker claim query: due pending rows of one channel, oldest first
+        db.Index('ix_outbox_channel_status_due', 'channel', 'status', 'next_attempt_at'),
+    )
+
+    serialize_fields = {
+        'id': lambda n: n.id,
+        'channel': lambda n: n.channel,
+        'recipient': lambda n: n.recipient,
+        'subject': lambda n: n.subject,
+        'body': lambda n: n.body,
+        'payload': lambda n: n.payload,
+        'appointmentId': lambda n: n.appointment_id,
+        'status': lambda n: n.status,
+        'attempts': lambda n: n.attempts,
+        'nextAttemptAt': lambda n: _iso(n.next_attempt_at),
+        'lastError': lambda n: n.last_error,
+        'createdAt': lambda n: _iso(n.created_at),
+        'sentAt': lambda n: _iso(n.sent_at),
+    }
+
+# ==============================
+# SLOT CLAIM MODEL
+# ==============================
+# One row per slot-grid cell an active appointment occupies. The unique
+# (staff_id, slot_start) key makes the database arbitrate concurrent
+# bookings; see appointments/reservations.py.
+
+class SlotClaim(db.Model):
+    __tablename__ = 'slot_claims'
+
+    id = db.Column(db.Integer, primary_key=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
+    slot_start = db.Column(db.DateTime, nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('staff_id', 'slot_start', name='uq_slot_claims_staff_slot'),
+        db.Index('ix_slot_claims_appointment_id', 'appointment_id'),
+    )
+
+# ==============================
+# PAYMENT CALLBACK INBOX MODEL
+# ==============================
+# One row per gateway transaction: the unique transaction_id makes
+# redelivered callbacks no-ops at insert time. The callback endpoint only
+# inserts; payments/consumer.py applies the status changes in batches.
+
+class PaymentCallback(SerializerMixin, db.Model):
+    __tablename__ = 'payment_callbacks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.String(100), nullable=False, unique=True)  # Payment.transaction_id
+    result_code = db.Column(db.Integer, nullable=False)  # 0 = paid
+    result_desc = db.Column(db.String(255))
+    receipt_number = db.Column(db.String(50))
+    amount = db.Column(db.Float)
+    phone_number = db.Column(db.String(20))
+    payload = db.Column(db.JSON)
+    status = db.Column(db.String(20), default='received')  # received, applying, applied, ignored, orphaned
+    note = db.Column(db.String(255))
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Consumer claim query: due received rows, oldest first
+        db.Index('ix_payment_callbacks_status_due', 'status', 'next_attempt_at'),
+        # Reconciliation looks statement receipt numbers up here
+        db.Index('ix_payment_callbacks_receipt_number', 'receipt_number'),
+    )
+
+    serialize_fields = {
+        'id': lambda c: c.id,
+        'transactionId': lambda c: c.transaction_id,
+        'resultCode': lambda c: c.result_code,
+        'resultDesc': lambda c: c.result_desc,
+        'receiptNumber': lambda c: c.receipt_number,
+        'amount': lambda c: c.amount,
+        'phoneNumber': lambda c: c.phone_number,
+        'status': lambda c: c.status,
+        'note': lambda c: c.note,
+        'attempts': lambda c: c.attempts,
+        'receivedAt': lambda c: _iso(c.received_at),
+        'processedAt': lambda c: _iso(c.processed_at),
+    }
+
+# ==============================
+# RECONCILIATION MODELS
+# ==============================
+# One run per statement file processed by reconciliation.py. Items are
+# only written for lines that need attention (and for fallback matches,
+# which are worth a second look); clean matches are just counted.
+
+class ReconciliationRun(SerializerMixin, db.Model):
+    __tablename__ = 'reconciliation_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(255), nullable=False)
+    applied = db.Column(db.Boolean, default=False)  # payment statuses were updated
+    status = db.Column(db.String(20), default='running')  # running, finished, failed
+    counts = db.Column(db.JSON)  # outcome -> number of statement lines
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    items = db.relationship('ReconciliationItem', back_populates='run', cascade='all, delete-orphan',
+                            lazy='dynamic')
+
+    serialize_fields = {
+        'id': lambda r: r.id,
+        'source': lambda r: r.source,
+        'applied': lambda r: r.applied,
+        'status': lambda r: r.status,
+        'counts': lambda r: r.counts or {},
+        'startedAt': lambda r: _iso(r.started_at),
+        'finishedAt': lambda r: _iso(r.finished_at),
+    }
+
+
+class ReconciliationItem(SerializerMixin, db.Model):
+    __tablename__ = 'reconciliation_items'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('reconciliation_runs.id', ondelete='CASCADE'), nullable=False)
+    line_number = db.Column(db.Integer)  # None for payments missing from the statement
+    outcome = db.Column(db.String(30), nullable=False)
+    match_method = db.Column(db.String(20))  # transaction_id, receipt, fallback
+    transaction_id = db.Column(db.String(100))
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id', ondelete='SET NULL'))
+    statement_amount = db.Column(db.Float)
+    payment_amount = db.Column(db.Float)
+    statement_status = db.Column(db.String(20))
+    payment_status = db.Column(db.String(20))
+    detail = db.Column(db.String(255))
+
+    __table_args__ = (
+        db.Index('ix_reconciliation_items_run_outcome', 'run_id', 'outcome', 'id'),
+    )
+
+    run = db.relationship('ReconciliationRun', back_populates='items')
+
+    serialize_fields = {
+        'id': lambda i: i.id,
+        'runId': lambda i: i.run_id,
+        'lineNumber': lambda i: i.line_number,
+        'outcome': lambda i: i.outcome,
+        'matchMethod': lambda i: i.match_method,
+        'transactionId': lambda i: i.transaction_id,
+        'paymentId': lambda i: i.payment_id,
+        'statementAmount': lambda i: i.statement_amount,
+        'paymentAmount': lambda i: i.payment_amount,
+        'statementStatus': lambda i: i.statement_status,
+        'paymentStatus': lambda i: i.payment_status,
+        'detail': lambda i: i.detail,
+    }
+
+# ==============================
+# LOYALTY LEDGER MODEL
+# ==============================
+# Append-only: loyalty.py writes an entry when an appointment completes or
+# a payment settles (and a negative one when either is undone), and adds
+# the same points to users.loyalty_points in that flush. The balance is
+# always the sum of a user's entries; `flask rebuild-loyalty` re-derives it.
+
+class LoyaltyEntry(SerializerMixin, db.Model):
+    __tablename__ = 'loyalty_ledger'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    points = db.Column(db.Integer, nullable=False)  # negative for reversals
+    reason = db.Column(db.String(30), nullable=False)  # appointment_completed, payment_settled, *_reversed, adjustment
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id', ondelete='SET NULL'))
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id', ondelete='SET NULL'))
+    note = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # A user's history, newest first, in keyset pages
+        db.Index('ix_loyalty_ledger_user_id_id', 'user_id', 'id'),
+        # Backfill's "already credited?" checks
+        db.Index('ix_loyalty_ledger_appointment_id', 'appointment_id'),
+        db.Index('ix_loyalty_ledger_payment_id', 'payment_id'),
+    )
+
+    user = db.relationship('User', back_populates='loyalty_entries')
+
+    serialize_fields = {
+        'id': lambda e: e.id,
+        'userId': lambda e: e.user_id,
+        'points': lambda e: e.points,
+        'reason': lambda e: e.reason,
+        'appointmentId': lambda e: e.appointment_id,
+        'paymentId': lambda e: e.payment_id,
+        'note': lambda e: e.note,
+        'createdAt': lambda e: _iso(e.created_at),
+    }
+
+# ==============================
+# RELATIONSHIP COUNTS
+# ==============================
+# Counts and "has any" flags are correlated subqueries rather than
+# len(relationship), so they never load child rows. They are deferred in
+# the 'counts' group: a single object loads each one on first access, and
+# list queries pull them for the whole page in the same SELECT with
+# `.options(with_counts())`.
+
+def _count(model, fk, parent):
+    return select(func.count(model.id)).where(fk == parent.id).correlate_except(model).scalar_subquery()
+
+
+def _has_any(model, fk, parent):
+    return exists().where(fk == parent.id).correlate_except(model)
+
+
+def _counts_property(expression):
+    return db.column_property(expression, deferred=True, group='counts')
+
+
+def with_counts():
+    """Loader option that fetches every count column along with the rows."""
+    return undefer_group('counts')
+
+
+def expand_options(model, expand=None):
+    """selectinload() options for the relations a to_dict() call will expand.
+
+    `expand` follows to_dict(): None means the model's default_expand, and
+    dotted paths such as 'appointment.service' are loaded level by level.
+    """
+    if expand is None:
+        expand = model.default_expand
+    options = []
+    for path in expand:
+        loader, current = None, model
+        for key in path.split('.'):
+            attr_name = current.serialize_relations.get(key)
+            if attr_name is None:
+                break
+            attr = getattr(current, attr_name)
+            loader = selectinload(attr) if loader is None else loader.selectinload(attr)
+            current = attr.property.mapper.class_
+        if loader is not None:
+            options.append(loader)
+    return options
+
+
+User.appointment_count = _counts_property(_count(Appointment, Appointment.user_id, User))
+User.booking_count = _counts_property(_count(Booking, Booking.user_id, User))
+
+Service.staff_count = _counts_property(
+    select(func.count()).select_from(staff_services)
+    .where(staff_services.c.service_id == Service.id).scalar_subquery()
+)
+
+Staff.service_count = _counts_property(
+    select(func.count()).select_from(staff_services)
+    .where(staff_services.c.staff_id == Staff.id).scalar_subquery()
+)
+
+Appointment.has_booking = _counts_property(_has_any(Booking, Booking.appointment_id, Appointment))
+Appointment.has_payment = _counts_property(_has_any(Payment, Payment.appointment_id, Appointment))
+
+Booking.has_payment = _counts_property(_has_any(Payment, Payment.booking_id, Booking))
+
+# ==============================
+# TYPED TIME COLUMNS
+# ==============================
+# The 'HH:MM' / weekday-name strings remain what clients read and write;
+# the typed columns are derived from them on every insert and on updates
+# that touch the source fields, so SQL can compare and index times.
+# Existing rows are filled by the c7d2e5a1f9b3 migration.
+
+def _changed(target, *keys):
+    state = inspect(target)
+    return any(state.attrs[key].history.has_changes() for key in keys)
+
+
+def _service_duration(connection, target):
+    service = target.__dict__.get('service')
+    if service is not None and service.id == target.service_id and service.duration:
+        return service.duration
+    duration = connection.scalar(select(Service.duration).where(Service.id == target.service_id))
+    return duration or 60
+
+
+@event.listens_for(Appointment, 'before_insert')
+@event.listens_for(Appointment, 'before_update')
+def _sync_appointment_times(mapper, connection, target):
+    if target.starts_at is not None and not _changed(target, 'date', 'time', 'service_id'):
+        return
+    target.start_minute = minute_of_day(target.time)
+    if target.start_minute is None or target.date is None:
+        target.starts_at = target.ends_at = None
+        return
+    target.starts_at = start_datetime(target.date, target.start_minute)
+    target.ends_at = target.starts_at + timedelta(minutes=_service_duration(connection, target))
+
+
+@event.listens_for(StaffAvailability, 'before_insert')
+@event.listens_for(StaffAvailability, 'before_update')
+def _sync_availability_times(mapper, connection, target):
+    target.weekday = weekday_number(target.day_of_week)
+    target.start_minute = minute_of_day(target.start_time)
+    target.end_minute = minute_of_day(target.end_time)
+
+
+@event.listens_for(Staff, 'before_insert')
+@event.listens_for(Staff, 'before_update')
+def _sync_working_hours(mapper, connection, target):
+    # Column defaults are applied by the INSERT itself, after this hook
+    columns = Staff.__table__.c
+    start = target.working_hours_start or columns.working_hours_start.default.arg
+    end = target.working_hours_end or columns.working_hours_end.default.arg
+    target.work_start_minute = minute_of_day(start)
+    target.work_end_minute = minute_of_day(end)
+
+# ==============================
+# BRANCH INHERITANCE
+# ==============================
+# A row created without a branch is filed under its parent's: appointments
+# under their staff member's branch, bookings and payments under their
+# appointment's. Rows without a parent get BranchScoped's column default.
+
+# model -> (parent relationship, parent model, foreign key attribute)
+BRANCH_PARENTS = {
+    Appointment: ('staff', Staff, 'staff_id'),
+    Booking: ('appointment', Appointment, 'appointment_id'),
+    Payment: ('appointment', Appointment, 'appointment_id'),
+}
+
+
+def _inherit_branch(mapper, connection, target):
+    if target.branch_id is not None:
+        return
+    relation, parent, key = BRANCH_PARENTS[type(target)]
+    loaded = target.__dict__.get(relation)
+    if loaded is not None and loaded.branch_id is not None:
+        target.branch_id = loaded.branch_id
+    elif getattr(target, key) is not None:
+        target.branch_id = connection.scalar(select(parent.branch_id).where(parent.id == getattr(target, key)))
+
+
+for _model in BRANCH_PARENTS:
+    event.listen(_model, 'before_insert', _inherit_branch)
 
 # ==============================
 # DATABASE RELATIONSHIP SUMMARY:
 # ==============================
 """
+BRANCH PARTITIONING:
+- Service, Staff, Appointment, Booking and Payment each belong to one Branch
+  (branch_id); Users are shared by all branches
+
 USER RELATIONSHIPS:
 - One-to-Many: User → Appointments
 - One-to-Many: User → Bookings  
 - One-to-Many: User → Payments
+- One-to-Many: User → LoyaltyEntries (append-only points ledger)
 
 SERVICE RELATIONSHIPS:
 - One-to-Many: Service → Appointments
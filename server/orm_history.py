@@ -0,0 +1,37 @@
+# Pre-/post-flush attribute values for flush-time bookkeeping (stats.py, loyalty.py)
+from sqlalchemy import event, inspect
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+def track_previous_values(model, attrs):
+    """Make the ORM load the old value when one of `attrs` is set on an expired instance.
+
+    Without this, history on an expired attribute has no deleted value and
+    a flush cannot tell what the row counted for before.
+    """
+    for attr in attrs:
+        attribute = getattr(model, attr)
+        if not event.contains(attribute, 'set', _keep_previous_value):
+            event.listen(attribute, 'set', _keep_previous_value, active_history=True, retval=True)
+
+
+def attribute_values(obj, attrs, previous=False):
+    """Current attribute values, or the pre-flush ones when `previous` is set."""
+    state = inspect(obj)
+    values = {}
+    for attr in attrs:
+        value = getattr(obj, attr)
+        if previous:
+            history = state.attrs[attr].history
+            if history.deleted:
+                value = history.deleted[0]
+        values[attr] = value
+    return values
+
+
+def attributes_changed(obj, attrs):
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
@@ -0,0 +1,140 @@
+# Keyset (cursor) pagination and list filters
+import base64
+import json
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidPageRequest(ValueError):
+    """Raised for a malformed cursor, limit or filter value."""
+
+
+# ==============================
+# CURSORS
+# ==============================
+
+def _encode_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _decode_value(column, value):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """Turn an `after` token back into typed key values.
+
+    A bare integer is accepted for lists ordered by id alone.
+    """
+    if len(columns) == 1 and token.isdigit():
+        return [int(token)]
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_decode_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise InvalidPageRequest('Invalid cursor')
+
+
+# ==============================
+# PAGES
+# ==============================
+
+def page_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidPageRequest('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_page(query, columns, args, descending=False):
+    """Fetch one page of `query` ordered by `columns` (the last must be unique).
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Rows are fetched with `limit + 1` so no COUNT query is needed.
+    """
+    limit = page_limit(args)
+    after = args.get('after')
+
+    if after:
+        values = decode_cursor(after, columns)
+        key = tuple_(*columns) if len(columns) > 1 else columns[0]
+        bound = tuple_(*values) if len(columns) > 1 else values[0]
+        query = query.filter(key < bound if descending else key > bound)
+
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return rows, next_cursor
+
+
+# ==============================
+# FILTERS
+# ==============================
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidPageRequest(f'{name} must be in YYYY-MM-DD format')
+
+
+def _parse_int(value, name):
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidPageRequest(f'{name} must be an integer')
+
+
+def apply_filters(query, args, status=None, date_column=None, staff=None, user=None):
+    """Apply the standard list filters supported by a model.
+
+    `?status=`, `?date_from=`/`?date_to=` (inclusive, against
+    `date_column`), `?staff_id=` and `?user_id=`; pass None for any
+    column the endpoint does not filter on.
+    """
+    if status is not None and args.get('status'):
+        query = query.filter(status == args['status'])
+    if staff is not None and args.get('staff_id'):
+        query = query.filter(staff == _parse_int(args['staff_id'], 'staff_id'))
+    if user is not None and args.get('user_id'):
+        query = query.filter(user == _parse_int(args['user_id'], 'user_id'))
+
+    if date_column is not None:
+        is_datetime = date_column.type.python_type is datetime
+        if args.get('date_from'):
+            start = _parse_date(args['date_from'], 'date_from')
+            if is_datetime:
+                start = datetime.combine(start, time.min)
+            query = query.filter(date_column >= start)
+        if args.get('date_to'):
+            end = _parse_date(args['date_to'], 'date_to')
+            if is_datetime:
+                query = query.filter(date_column < datetime.combine(end + timedelta(days=1), time.min))
+            else:
+                query = query.filter(date_column <= end)
+    return query
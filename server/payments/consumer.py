@@ -0,0 +1,173 @@
+# Payment callback consumer (applies inbox callbacks to payments in batches)
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from extensions import db
+from models import Payment, PaymentCallback
+from payments.inbox import inbox_ready
+
+logger = logging.getLogger(__name__)
+
+# Payment statuses a callback may still settle
+SETTLEABLE_STATUSES = ('pending', 'processing')
+AMOUNT_TOLERANCE = 0.5
+
+
+class PaymentCallbackConsumer:
+    """Background thread that settles payments from stored callbacks.
+
+    Each pass claims up to `batch_size` due callbacks in one UPDATE, loads
+    their payments in one SELECT and applies every transition in a single
+    transaction, so a month-end storm turns into a few large commits rather
+    than one write per callback. Payment changes go through the ORM so the
+    dashboard summaries (stats.py) stay in step.
+
+    A callback can beat the commit of the payment it settles (the gateway
+    answers the STK push before /api/payments/initiate commits); such
+    callbacks are retried until `orphan_seconds` after arrival and then
+    marked 'orphaned'. Claims left by a crashed consumer become claimable
+    again after `lease_seconds`.
+    """
+
+    def __init__(self, app):
+        config = app.config
+        self.app = app
+        self.batch_size = config.get('PAYMENT_CALLBACK_BATCH_SIZE', 200)
+        self.poll_interval = config.get('PAYMENT_CALLBACK_POLL_SECONDS', 1.0)
+        self.retry_seconds = config.get('PAYMENT_CALLBACK_RETRY_SECONDS', 5)
+        self.orphan_after = timedelta(seconds=config.get('PAYMENT_CALLBACK_ORPHAN_SECONDS', 600))
+        self.lease = timedelta(seconds=config.get('PAYMENT_CALLBACK_LEASE_SECONDS', 300))
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ==============================
+    # CLAIM / APPLY
+    # ==============================
+
+    def _claimable(self, now):
+        return or_(
+            and_(PaymentCallback.status == 'received', PaymentCallback.next_attempt_at <= now),
+            and_(PaymentCallback.status == 'applying', PaymentCallback.claimed_at < now - self.lease),
+        )
+
+    def claim_batch(self):
+        """Claim due callbacks; returns the claimed PaymentCallback rows."""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        candidates = select(PaymentCallback.id).where(self._claimable(now)) \
+            .order_by(PaymentCallback.next_attempt_at, PaymentCallback.id).limit(self.batch_size)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            candidates = candidates.with_for_update(skip_locked=True)
+
+        ids = db.session.execute(candidates).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return []
+        db.session.execute(
+            update(PaymentCallback)
+            .where(PaymentCallback.id.in_(ids), self._claimable(now))
+            .values(status='applying', claim_token=token, claimed_at=now, attempts=PaymentCallback.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return PaymentCallback.query.filter_by(claim_token=token).order_by(PaymentCallback.id).all()
+
+    def apply_batch(self, callbacks):
+        """Apply claimed callbacks to their payments in one transaction; returns how many settled."""
+        now = datetime.utcnow()
+        payments = {
+            payment.transaction_id: payment
+            for payment in Payment.query.filter(Payment.transaction_id.in_([c.transaction_id for c in callbacks]))
+        }
+        applied = 0
+        for callback in callbacks:
+            callback.claim_token = None
+            payment = payments.get(callback.transaction_id)
+            if payment is None:
+                if callback.received_at and callback.received_at < now - self.orphan_after:
+                    self._finish(callback, 'orphaned', now, 'No payment with this transaction id')
+                else:
+                    callback.status = 'received'
+                    callback.next_attempt_at = now + timedelta(seconds=self.retry_seconds)
+                continue
+            if payment.status not in SETTLEABLE_STATUSES:
+                self._finish(callback, 'ignored', now, f'Payment already {payment.status}')
+                continue
+            if callback.result_code == 0 and (callback.amount is None or not callback.receipt_number):
+                # Stored before parse_stk_callback required them; never settle on an unverifiable success
+                self._finish(callback, 'ignored', now, 'Success callback without Amount or MpesaReceiptNumber')
+                continue
+            if callback.result_code == 0 and abs(callback.amount - payment.amount) > AMOUNT_TOLERANCE:
+                # Left for reconciliation rather than settled for the wrong amount
+                self._finish(callback, 'ignored', now,
+                             f'Paid {callback.amount:g} but payment expects {payment.amount:g}')
+                continue
+
+            if callback.result_code == 0:
+                payment.status = 'completed'
+                payment.completed_at = now
+            else:
+                payment.status = 'failed'
+            if callback.phone_number and not payment.phone_number:
+                payment.phone_number = callback.phone_number
+            self._finish(callback, 'applied', now)
+            applied += 1
+        db.session.commit()
+        return applied
+
+    @staticmethod
+    def _finish(callback, status, now, note=None):
+        callback.status = status
+        callback.processed_at = now
+        callback.note = note
+
+    def run_once(self):
+        """Claim and apply a single batch; returns how many were claimed."""
+        callbacks = self.claim_batch()
+        if callbacks:
+            self.apply_batch(callbacks)
+        return len(callbacks)
+
+    def drain(self):
+        """Apply everything currently due (tests, CLI)."""
+        total = 0
+        with self.app.app_context():
+            while True:
+                claimed = self.run_once()
+                total += claimed
+                if claimed < self.batch_size:
+                    break
+        return total
+
+    # ==============================
+    # THREAD
+    # ==============================
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    claimed = self.run_once()
+                    db.session.remove()
+            except Exception:
+                logger.exception("Payment callback consumer crashed; retrying")
+                claimed = 0
+            if claimed < self.batch_size:
+                inbox_ready.wait(self.poll_interval)
+                inbox_ready.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='payment-callbacks', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        inbox_ready.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
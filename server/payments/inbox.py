@@ -0,0 +1,53 @@
+# Payment callback inbox (insert-only ingestion, deduplicated by transaction_id)
+import threading
+
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import PaymentCallback
+
+# Set after a new callback commits, so an idle consumer wakes immediately
+inbox_ready = threading.Event()
+
+
+class CallbackIngestBusy(Exception):
+    """Too many callbacks are being written right now; the gateway should retry."""
+
+
+def init_app(app):
+    """Cap the request threads writing callbacks at PAYMENT_CALLBACK_CONCURRENCY.
+
+    During a callback storm the surplus is refused with a 503 straight away
+    (the gateway redelivers) instead of queueing on the database and tying
+    up the threads that serve customers.
+    """
+    app.extensions['payment_callback_slots'] = threading.BoundedSemaphore(
+        app.config.get('PAYMENT_CALLBACK_CONCURRENCY', 8))
+
+
+def record_callback(values):
+    """Store a parsed callback and commit; False if its transaction_id was already stored.
+
+    A single INSERT .. ON CONFLICT DO NOTHING, so redeliveries cost one
+    index probe and never touch the payment itself.
+    """
+    slots = current_app.extensions['payment_callback_slots']
+    if not slots.acquire(blocking=False):
+        raise CallbackIngestBusy('Payment callback ingestion is saturated')
+    try:
+        dialect = db.session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        result = db.session.execute(
+            insert(PaymentCallback.__table__).values(**values)
+            .on_conflict_do_nothing(index_elements=['transaction_id'])
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        slots.release()
+    if result.rowcount:
+        inbox_ready.set()
+    return bool(result.rowcount)
@@ -0,0 +1,289 @@
+"""Local stand-in for the M-Pesa STK push gateway (tests and load runs).
+
+serve: answers STK push requests like Daraja and, after --delay seconds,
+posts the result to the request's CallBackURL, redelivering it
+--redeliveries extra times the way the real gateway does.
+
+    python payments/mock_gateway.py serve --port 5099 --failure-rate 0.1
+    MPESA_GATEWAY_URL=http://127.0.0.1:5099 MPESA_CALLBACK_TOKEN=local-secret \\
+    MPESA_CALLBACK_URL=http://127.0.0.1:5001/api/payments/mpesa/callback python app.py
+
+storm: fires --count callbacks (each sent 1 + --duplicates times, in
+shuffled order) at a callback URL from --clients threads, while timing
+--probe-url to show what customers see meanwhile.
+
+    python payments/mock_gateway.py storm --callback-url 'http://127.0.0.1:5001/api/payments/mpesa/callback?token=local-secret' \\
+        --count 20000 --duplicates 2 --clients 32 --probe-url http://127.0.0.1:5001/api/services
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STK_PUSH_PATH = '/mpesa/stkpush/v1/processrequest'
+
+
+def stk_callback(checkout_request_id, amount=None, phone=None, result_code=0, receipt=None,
+                 merchant_request_id=None):
+    """A Daraja-shaped STK callback body."""
+    callback = {
+        'MerchantRequestID': merchant_request_id or f'mr-{uuid.uuid4().hex[:12]}',
+        'CheckoutRequestID': checkout_request_id,
+        'ResultCode': result_code,
+        'ResultDesc': 'The service request is processed successfully.' if result_code == 0
+        else 'Request cancelled by user',
+    }
+    if result_code == 0:
+        callback['CallbackMetadata'] = {'Item': [
+            {'Name': 'Amount', 'Value': amount},
+            {'Name': 'MpesaReceiptNumber', 'Value': receipt or uuid.uuid4().hex[:10].upper()},
+            {'Name': 'TransactionDate', 'Value': int(datetime.now().strftime('%Y%m%d%H%M%S'))},
+            {'Name': 'PhoneNumber', 'Value': int(phone) if phone else None},
+        ]}
+    return {'Body': {'stkCallback': callback}}
+
+
+def post(url, body, timeout=10):
+    """POST JSON; returns the HTTP status (0 for a connection error)."""
+    request = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'), method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return 0
+
+
+# ==============================
+# GATEWAY
+# ==============================
+
+class MockMpesaGateway:
+    """Threaded HTTP server that accepts STK pushes and calls back later.
+
+    `failure_rate` of the pushes end with ResultCode 1032 (cancelled by the
+    user). Every request is kept in `requests` and every callback attempt in
+    `deliveries` as (checkout id, HTTP status) for assertions.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.2, redeliveries=1, failure_rate=0.0, seed=None):
+        self.delay = delay
+        self.redeliveries = redeliveries
+        self.failure_rate = failure_rate
+        self.requests = []
+        self.deliveries = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handler(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return self._reply(400, {'errorMessage': 'Invalid JSON'})
+                if self.path.split('?')[0] != STK_PUSH_PATH:
+                    return self._reply(404, {'errorMessage': 'Not found'})
+                missing = [key for key in ('BusinessShortCode', 'Password', 'Timestamp', 'Amount',
+                                           'PhoneNumber', 'CallBackURL') if not body.get(key)]
+                if missing:
+                    return self._reply(400, {'errorMessage': f"Missing {', '.join(missing)}"})
+                self._reply(200, gateway.accept(body))
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def accept(self, body):
+        checkout_id = f'ws_CO_{datetime.now():%d%m%Y%H%M%S}{uuid.uuid4().hex[:12]}'
+        merchant_id = f'mr-{uuid.uuid4().hex[:12]}'
+        with self._lock:
+            self.requests.append({**body, 'CheckoutRequestID': checkout_id})
+            failed = self._random.random() < self.failure_rate
+        callback = stk_callback(checkout_id, amount=body['Amount'], phone=body['PhoneNumber'],
+                                result_code=1032 if failed else 0, merchant_request_id=merchant_id)
+        threading.Thread(target=self._deliver, args=(body['CallBackURL'], checkout_id, callback),
+                         daemon=True).start()
+        return {
+            'MerchantRequestID': merchant_id,
+            'CheckoutRequestID': checkout_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        }
+
+    def _deliver(self, url, checkout_id, callback):
+        time.sleep(self.delay)
+        for attempt in range(1 + self.redeliveries):
+            status = post(url, callback)
+            with self._lock:
+                self.deliveries.append((checkout_id, status))
+            time.sleep(self.delay / 2)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-mpesa', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ==============================
+# STORM
+# ==============================
+
+def _percentiles(samples):
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    ordered = sorted(samples)
+    pick = lambda pct: round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000, 2)  # noqa: E731
+    return {'p50_ms': pick(50), 'p95_ms': pick(95), 'p99_ms': pick(99)}
+
+
+def callback_storm(callback_url, count, duplicates=2, clients=32, amount=1500, failure_rate=0.05,
+                   prefix='ws_CO_storm', probe_url=None, seed=42):
+    """Send `count` callbacks, each 1 + `duplicates` times, as fast as `clients` threads can.
+
+    Returns a summary: callback throughput, status counts and latency
+    percentiles, plus the latency of `probe_url` sampled during the storm.
+    """
+    rng = random.Random(seed)
+    bodies = [
+        stk_callback(f'{prefix}_{index:08d}', amount=amount, phone=f'2547{index % 10 ** 8:08d}',
+                     result_code=1032 if rng.random() < failure_rate else 0)
+        for index in range(count)
+    ]
+    queue = [body for body in bodies for _ in range(1 + duplicates)]
+    rng.shuffle(queue)
+
+    lock = threading.Lock()
+    position = [0]
+    statuses, latencies, probe_latencies = {}, [], []
+    done = threading.Event()
+
+    def worker():
+        while True:
+            with lock:
+                if position[0] >= len(queue):
+                    return
+                body = queue[position[0]]
+                position[0] += 1
+            started = time.perf_counter()
+            status = post(callback_url, body)
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                latencies.append(elapsed)
+
+    def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            request = urllib.request.Request(probe_url)
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError):
+                pass
+            probe_latencies.append(time.perf_counter() - started)
+            time.sleep(0.05)
+
+    prober = threading.Thread(target=probe, daemon=True) if probe_url else None
+    if prober:
+        prober.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    if prober:
+        prober.join()
+
+    return {
+        'callbacks': len(queue),
+        'unique': count,
+        'seconds': round(elapsed, 2),
+        'throughput': round(len(queue) / elapsed, 1),
+        'statuses': {str(status): total for status, total in sorted(statuses.items())},
+        'callback': _percentiles(latencies),
+        'probe': {'requests': len(probe_latencies), **_percentiles(probe_latencies)} if probe_url else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='run the mock STK push gateway')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=5099)
+    serve.add_argument('--delay', type=float, default=1.0, help='seconds before the first callback')
+    serve.add_argument('--redeliveries', type=int, default=1, help='extra copies of every callback')
+    serve.add_argument('--failure-rate', type=float, default=0.0)
+    serve.add_argument('--seed', type=int)
+
+    storm = commands.add_parser('storm', help='flood a callback URL with (duplicated) callbacks')
+    storm.add_argument('--callback-url', required=True)
+    storm.add_argument('--count', type=int, default=10000)
+    storm.add_argument('--duplicates', type=int, default=2)
+    storm.add_argument('--clients', type=int, default=32)
+    storm.add_argument('--amount', type=float, default=1500)
+    storm.add_argument('--failure-rate', type=float, default=0.05)
+    storm.add_argument('--prefix', default='ws_CO_storm', help='CheckoutRequestID prefix')
+    storm.add_argument('--probe-url', help='user-facing URL to time during the storm')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        gateway = MockMpesaGateway(args.host, args.port, delay=args.delay, redeliveries=args.redeliveries,
+                                   failure_rate=args.failure_rate, seed=args.seed).start()
+        print(f"📲 Mock M-Pesa gateway on {gateway.url} (STK push at {STK_PUSH_PATH})")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            gateway.stop()
+    else:
+        summary = callback_storm(args.callback_url, args.count, duplicates=args.duplicates, clients=args.clients,
+                                 amount=args.amount, failure_rate=args.failure_rate, prefix=args.prefix,
+                                 probe_url=args.probe_url)
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# M-Pesa (Daraja STK push) request and callback formats
+import base64
+import re
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from appointments.transports import TransportError, post_json
+
+STK_PUSH_PATH = '/mpesa/stkpush/v1/processrequest'
+
+
+class InvalidCallback(ValueError):
+    """A callback body that is not an STK push result."""
+
+
+def normalize_phone(phone):
+    """'0712 345 678', '+254712345678' or '712345678' -> '254712345678'; None if not a Kenyan mobile."""
+    digits = re.sub(r'\D', '', str(phone or ''))
+    if digits.startswith('0'):
+        digits = '254' + digits[1:]
+    elif len(digits) == 9:
+        digits = '254' + digits
+    return digits if re.fullmatch(r'254[17]\d{8}', digits) else None
+
+
+def parse_stk_callback(body):
+    """Flatten a Daraja STK callback into PaymentCallback column values.
+
+    The body looks like {"Body": {"stkCallback": {"CheckoutRequestID": ...,
+    "ResultCode": 0, "ResultDesc": ..., "CallbackMetadata": {"Item": [{"Name":
+    "Amount", "Value": 1500}, {"Name": "MpesaReceiptNumber", ...}, ...]}}}};
+    the metadata is only present for successful payments.
+    """
+    try:
+        callback = body['Body']['stkCallback']
+        transaction_id = str(callback['CheckoutRequestID'])
+        result_code = int(callback['ResultCode'])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidCallback('Expected Body.stkCallback with CheckoutRequestID and ResultCode')
+    if not transaction_id or len(transaction_id) > 100:
+        raise InvalidCallback('Invalid CheckoutRequestID')
+
+    metadata = callback.get('CallbackMetadata') or {}
+    items = {item.get('Name'): item.get('Value') for item in metadata.get('Item') or () if isinstance(item, dict)}
+    try:
+        amount = float(items['Amount']) if items.get('Amount') is not None else None
+    except (TypeError, ValueError):
+        raise InvalidCallback('Invalid Amount')
+    # A success without the amount and receipt cannot be checked against the payment
+    if result_code == 0 and (amount is None or not items.get('MpesaReceiptNumber')):
+        raise InvalidCallback('Successful callbacks need Amount and MpesaReceiptNumber')
+    phone = items.get('PhoneNumber')
+    return {
+        'transaction_id': transaction_id,
+        'result_code': result_code,
+        'result_desc': str(callback.get('ResultDesc') or '')[:255],
+        'receipt_number': str(items['MpesaReceiptNumber'])[:50] if items.get('MpesaReceiptNumber') else None,
+        'amount': amount,
+        'phone_number': str(phone)[:20] if phone is not None else None,
+        'payload': body,
+    }
+
+
+class StkPushClient:
+    """Starts STK push (Lipa na M-Pesa Online) payments on the gateway."""
+
+    def __init__(self, gateway_url, shortcode, passkey, callback_url, api_key=None, timeout=10):
+        self.gateway_url = gateway_url.rstrip('/')
+        self.shortcode = str(shortcode)
+        self.passkey = passkey
+        self.callback_url = callback_url
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def initiate(self, phone, amount, reference, description):
+        """Ask the gateway to prompt `phone`; returns its response (with CheckoutRequestID)."""
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        password = base64.b64encode(f'{self.shortcode}{self.passkey}{timestamp}'.encode()).decode()
+        response = post_json(self.gateway_url + STK_PUSH_PATH, {
+            'BusinessShortCode': self.shortcode,
+            'Password': password,
+            'Timestamp': timestamp,
+            'TransactionType': 'CustomerPayBillOnline',
+            'Amount': int(round(amount)),
+            'PartyA': phone,
+            'PartyB': self.shortcode,
+            'PhoneNumber': phone,
+            'CallBackURL': self.callback_url,
+            'AccountReference': reference[:12],
+            'TransactionDesc': description[:13],
+        }, api_key=self.api_key, timeout=self.timeout)
+        if str(response.get('ResponseCode')) != '0' or not response.get('CheckoutRequestID'):
+            raise TransportError(response.get('errorMessage') or response.get('ResponseDescription')
+                                 or 'STK push rejected')
+        return response
+
+
+def callback_url_with_token(url, token):
+    """MPESA_CALLBACK_URL with ?token=<MPESA_CALLBACK_TOKEN>, which the callback endpoint requires."""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != 'token'] + [('token', token)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def build_stk_client(config):
+    """StkPushClient from MPESA_* config, or None when no gateway or callback token is configured."""
+    if not all(config.get(key) for key in ('MPESA_GATEWAY_URL', 'MPESA_CALLBACK_URL', 'MPESA_CALLBACK_TOKEN')):
+        return None
+    return StkPushClient(
+        config['MPESA_GATEWAY_URL'],
+        config.get('MPESA_SHORTCODE', '174379'),
+        config.get('MPESA_PASSKEY', ''),
+        callback_url_with_token(config['MPESA_CALLBACK_URL'], config['MPESA_CALLBACK_TOKEN']),
+        api_key=config.get('MPESA_API_KEY'),
+        timeout=config.get('MPESA_TIMEOUT', 10),
+    )
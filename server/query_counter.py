@@ -0,0 +1,226 @@
+# N+1 query detection for development and tests
+"""Opt-in detector for repeated lazy loads.
+
+Every SQL statement issued inside a scope (one HTTP request, or one test
+using the `n_plus_one` fixture) is fingerprinted. When the same lazy load
+(a relationship such as Appointment.user, or a deferred column such as
+Appointment.has_booking) runs more than the threshold number of times in
+one scope, the detector reports the model, the attribute, the statement
+shape and the application call site that triggered it.
+
+App: set N_PLUS_ONE_DETECTION to 'warn' (log) or 'raise' (the request
+fails with NPlusOneDetected); N_PLUS_ONE_THRESHOLD defaults to 5.
+
+Tests: add `pytest_plugins = ['query_counter']` to a conftest.py and request
+the `n_plus_one` fixture; the test fails if its code triggers an N+1.
+"""
+import contextvars
+import logging
+import os
+import re
+import traceback
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+try:
+    import pytest
+except ImportError:  # pytest is only needed for the fixture
+    pytest = None
+
+logger = logging.getLogger(__name__)
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_THRESHOLD = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+class NPlusOneDetected(Exception):
+    """A lazy load repeated past the threshold inside one scope."""
+
+
+def fingerprint(statement):
+    """Statement shape: literals and IN-lists collapsed, whitespace normalized."""
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def _call_site(limit=3):
+    """Innermost application frames (outside this module and libraries)."""
+    frames = []
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if not filename.startswith(SERVER_DIR) or filename == os.path.abspath(__file__) \
+                or 'site-packages' in filename:
+            continue
+        frames.append(f'{os.path.relpath(filename, SERVER_DIR)}:{frame.lineno} in {frame.name}')
+        if len(frames) == limit:
+            break
+    return frames
+
+
+class QueryScope:
+    """Statement counts for one request or test."""
+
+    def __init__(self, label, threshold=DEFAULT_THRESHOLD):
+        self.label = label
+        self.threshold = threshold
+        self.statements = 0
+        self.fingerprints = {}  # statement shape -> times seen
+        self.lazy_loads = {}  # (model, attribute, shape) -> times seen
+        self.violations = []
+        self._pending_load = None
+
+    def note_lazy_load(self, model, attribute):
+        self._pending_load = (model, attribute)
+
+    def record(self, statement):
+        self.statements += 1
+        shape = fingerprint(statement)
+        self.fingerprints[shape] = self.fingerprints.get(shape, 0) + 1
+        pending, self._pending_load = self._pending_load, None
+        if pending is None:
+            return
+        key = (*pending, shape)
+        count = self.lazy_loads[key] = self.lazy_loads.get(key, 0) + 1
+        if count == self.threshold + 1:
+            self.violations.append({
+                'model': pending[0], 'attribute': pending[1], 'statement': shape, 'callSite': _call_site(),
+            })
+
+    def report(self):
+        lines = []
+        for violation in self.violations:
+            count = self.lazy_loads[(violation['model'], violation['attribute'], violation['statement'])]
+            lines.append(
+                f"N+1 in {self.label}: {violation['model']}.{violation['attribute']} loaded lazily "
+                f"{count} times (threshold {self.threshold})\n"
+                f"    statement: {violation['statement'][:300]}\n"
+                f"    from: {' <- '.join(violation['callSite']) or 'unknown'}"
+            )
+        return '\n'.join(lines)
+
+
+_current_scope = contextvars.ContextVar('n_plus_one_scope', default=None)
+
+
+def current_scope():
+    return _current_scope.get()
+
+
+def open_scope(label, threshold=DEFAULT_THRESHOLD):
+    """Start tracking in this context; returns (scope, token for close_scope)."""
+    install()
+    scope = QueryScope(label, threshold)
+    return scope, _current_scope.set(scope)
+
+
+def close_scope(token):
+    _current_scope.reset(token)
+
+
+# ==============================
+# EVENT HOOKS
+# ==============================
+
+def _describe_load(orm_execute_state):
+    """(model, attribute) for a lazy relationship or deferred column load, else None."""
+    if orm_execute_state.lazy_loaded_from is not None:
+        path = orm_execute_state.loader_strategy_path
+        parent = orm_execute_state.lazy_loaded_from.class_.__name__
+        relationship = path[-1] if path is not None and len(path) else None
+        return parent, getattr(relationship, 'key', '?')
+    if orm_execute_state.is_column_load:
+        refresh_state = getattr(orm_execute_state.load_options, '_refresh_state', None)
+        compile_options = getattr(orm_execute_state.statement, '_compile_options', None)
+        attributes = getattr(compile_options, '_only_load_props', None)
+        model = refresh_state.class_.__name__ if refresh_state is not None else '?'
+        return model, ','.join(sorted(attributes)) if attributes else '(expired row refresh)'
+    return None
+
+
+def _on_orm_execute(orm_execute_state):
+    scope = _current_scope.get()
+    if scope is not None:
+        load = _describe_load(orm_execute_state)
+        if load is not None:
+            scope.note_lazy_load(*load)
+
+
+def _on_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.record(statement)
+
+
+def install():
+    """Register the Session/Engine listeners once; they are idle outside a scope."""
+    if not event.contains(Session, 'do_orm_execute', _on_orm_execute):
+        event.listen(Session, 'do_orm_execute', _on_orm_execute)
+    if not event.contains(Engine, 'before_cursor_execute', _on_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _on_cursor_execute)
+
+
+def init_app(app):
+    """Check every request when N_PLUS_ONE_DETECTION is 'warn' or 'raise'."""
+    mode = (app.config.get('N_PLUS_ONE_DETECTION') or 'off').lower()
+    if mode not in ('warn', 'raise'):
+        return
+    threshold = app.config.get('N_PLUS_ONE_THRESHOLD', DEFAULT_THRESHOLD)
+    install()
+
+    @app.before_request
+    def start_n_plus_one_scope():
+        # A test's fixture scope already covers requests made inside it
+        if _current_scope.get() is None:
+            g.n_plus_one_scope, g.n_plus_one_token = open_scope(f'{request.method} {request.path}', threshold)
+
+    @app.after_request
+    def check_n_plus_one(response):
+        # Popped so a second pass (Flask's error response) does not re-raise
+        scope = g.pop('n_plus_one_scope', None)
+        if scope is not None and scope.violations:
+            if mode == 'raise':
+                raise NPlusOneDetected(scope.report())
+            logger.warning(scope.report())
+        return response
+
+    @app.teardown_request
+    def close_n_plus_one_scope(exception=None):
+        token = g.pop('n_plus_one_token', None)
+        if token is not None:
+            close_scope(token)
+
+
+# ==============================
+# PYTEST FIXTURE
+# ==============================
+
+if pytest is not None:
+    def pytest_configure(config):
+        config.addinivalue_line('markers', 'n_plus_one_threshold(n): allowed repeats of one lazy load')
+
+    @pytest.fixture
+    def n_plus_one(request):
+        """Fail the test if the code it runs repeats a lazy load past the threshold.
+
+        The threshold is N_PLUS_ONE_THRESHOLD from the environment, or 5;
+        mark a test with @pytest.mark.n_plus_one_threshold(n) to change it.
+        """
+        marker = request.node.get_closest_marker('n_plus_one_threshold')
+        threshold = marker.args[0] if marker else int(os.environ.get('N_PLUS_ONE_THRESHOLD', DEFAULT_THRESHOLD))
+        scope, token = open_scope(request.node.nodeid, threshold)
+        try:
+            yield scope
+        finally:
+            close_scope(token)
+        if scope.violations:
+            pytest.fail(scope.report(), pytrace=False)
@@ -0,0 +1,116 @@
+# Query-plan regression checks for the hot queries (SQLite EXPLAIN QUERY PLAN)
+import re
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from appointments.ranges import availability_query, busy_intervals_query
+from appointments.reminders import reminder_range_query
+from extensions import db
+from models import Appointment, Booking, Payment
+
+# A plan line like "SCAN appointments" (or "SCAN TABLE appointments" on older
+# SQLite) reads the whole table; "SEARCH ... USING INDEX" does not.
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+_DAY = date(2025, 1, 6)
+
+
+def _slot_appointments():
+    return busy_intervals_query(1, datetime(2025, 1, 6), datetime(2025, 1, 7))
+
+
+def _slot_availability():
+    return availability_query(1, _DAY.weekday())
+
+
+def _user_appointments_page():
+    return select(Appointment.id).where(Appointment.user_id == 1) \
+        .order_by(Appointment.date.desc(), Appointment.id.desc()).limit(50)
+
+
+def _appointments_in_range():
+    # Admin listings run scoped to a branch (tenancy.py adds the branch_id filter)
+    return select(Appointment.id).where(
+        Appointment.branch_id == 1, Appointment.date >= _DAY, Appointment.date <= date(2025, 2, 6)
+    ).order_by(Appointment.date, Appointment.id).limit(50)
+
+
+def _reminder_range():
+    return reminder_range_query(_DAY, date(2025, 1, 7))
+
+
+def _changed_appointments():
+    return select(Appointment.id).where(Appointment.updated_at >= datetime(2025, 1, 6))
+
+
+def _staff_appointments_overlap():
+    return select(Appointment.id).where(
+        Appointment.staff_id == 1,
+        Appointment.starts_at < datetime(2025, 1, 6, 12), Appointment.ends_at > datetime(2025, 1, 6, 11),
+    )
+
+
+def _appointment_bookings():
+    return select(Booking.id).where(Booking.appointment_id == 1)
+
+
+def _user_payments_page():
+    return select(Payment.id).where(Payment.user_id == 1) \
+        .order_by(Payment.created_at.desc(), Payment.id.desc()).limit(50)
+
+
+def _branch_payments_page():
+    return select(Payment.id).where(Payment.branch_id == 1, Payment.created_at >= datetime(2025, 1, 6)) \
+        .order_by(Payment.created_at, Payment.id).limit(50)
+
+
+def _payment_by_transaction():
+    return select(Payment.id).where(Payment.transaction_id == 'QK12ABC345')
+
+
+# name -> (statement builder, index the plan must use)
+HOT_QUERIES = {
+    'slot_appointments': (_slot_appointments, 'ix_appointments_staff_starts'),
+    'slot_availability': (_slot_availability, 'ix_staff_availability_staff_weekday'),
+    'user_appointments_page': (_user_appointments_page, 'ix_appointments_user_date_id'),
+    'appointments_in_range': (_appointments_in_range, 'ix_appointments_branch_date_id'),
+    'reminder_range': (_reminder_range, 'ix_appointments_date_id'),
+    'changed_appointments': (_changed_appointments, 'ix_appointments_updated_at'),
+    'staff_appointments_overlap': (_staff_appointments_overlap, 'ix_appointments_staff_starts'),
+    'appointment_bookings': (_appointment_bookings, 'ix_bookings_appointment_id'),
+    'user_payments_page': (_user_payments_page, 'ix_payments_user_created_id'),
+    'branch_payments_page': (_branch_payments_page, 'ix_payments_branch_created_id'),
+    'payment_by_transaction': (_payment_by_transaction, None),
+}
+
+
+def explain(connection, statement):
+    """EXPLAIN QUERY PLAN detail lines for `statement`."""
+    sql = statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+
+
+def plan_problems(plan, expected_index=None):
+    problems = [f'full table scan: {line}' for line in plan if FULL_SCAN.match(line)]
+    if expected_index and not any(expected_index in line for line in plan):
+        problems.append(f'does not use {expected_index}')
+    return problems
+
+
+def check_query_plans(engine=None):
+    """Return {query name: [problems]} for hot queries whose plan regressed.
+
+    An empty dict means every hot query is served by an index. Only SQLite
+    is supported; on other dialects a ValueError is raised.
+    """
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        raise ValueError('Query plan checks need SQLite (EXPLAIN QUERY PLAN)')
+    failures = {}
+    with engine.connect() as connection:
+        for name, (build, expected_index) in HOT_QUERIES.items():
+            problems = plan_problems(explain(connection, build()), expected_index)
+            if problems:
+                failures[name] = problems
+    return failures
@@ -0,0 +1,376 @@
+# Payment reconciliation against gateway statement exports (streamed, chunked)
+import csv
+import logging
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Integer, MetaData, Table, and_, exists, insert, literal, select, text
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Payment, PaymentCallback, ReconciliationItem, ReconciliationRun
+from payments.mpesa import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 20000
+LOOKUP_BATCH = 500  # keys per IN (...) lookup, well under SQLite's bound-parameter limit
+
+# Statement column -> accepted header names (case-insensitive). The M-Pesa
+# portal export uses 'Receipt No.', 'Completion Time', 'Paid In', ...
+STATEMENT_COLUMNS = {
+    'transaction_id': ('transaction_id', 'transaction id', 'receipt no.', 'receipt no', 'receipt',
+                       'checkoutrequestid', 'reference'),
+    'amount': ('amount', 'paid in', 'paid_in'),
+    'phone': ('phone', 'phone_number', 'phone number', 'msisdn', 'other party info'),
+    'completed_at': ('completed_at', 'completion time', 'transaction time', 'date', 'timestamp'),
+    'status': ('status', 'transaction status'),
+}
+STATEMENT_STATUSES = {
+    'completed': 'completed', 'complete': 'completed', 'success': 'completed', 'successful': 'completed',
+    'paid': 'completed', 'failed': 'failed', 'cancelled': 'failed', 'declined': 'failed',
+    'reversed': 'refunded', 'refunded': 'refunded',
+}
+TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d-%m-%Y %H:%M:%S',
+                '%Y-%m-%d %H:%M', '%d/%m/%Y %H:%M', '%Y%m%d%H%M%S')
+# Payment statuses a statement line may still settle
+SETTLEABLE_STATUSES = ('pending', 'processing')
+
+
+class StatementError(ValueError):
+    """The statement file cannot be read (missing columns, bad header)."""
+
+
+# ==============================
+# STATEMENT PARSING
+# ==============================
+
+def _parse_time(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f'unrecognised time {value!r}')
+
+
+def _parse_amount(value):
+    value = (value or '').replace(',', '').replace('KES', '').replace('Ksh', '').strip()
+    return round(float(value), 2) if value else None
+
+
+def statement_lines(handle):
+    """Yield (line number, row dict or None, error) for each data line of a statement CSV.
+
+    Rows carry transaction_id, amount, phone (normalized), completed_at and
+    status (mapped to Payment statuses, 'completed' when the column is absent).
+    """
+    reader = csv.reader(handle)
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise StatementError('The statement file is empty')
+    names = [name.strip().lower() for name in header]
+    positions = {}
+    for column, aliases in STATEMENT_COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                positions[column] = names.index(alias)
+                break
+    if 'transaction_id' not in positions and not {'amount', 'completed_at'} <= set(positions):
+        raise StatementError('The statement needs a transaction id column, or amount and time columns')
+
+    for line_number, fields in enumerate(reader, start=2):
+        if not any(field.strip() for field in fields):
+            continue
+        raw = {column: fields[index] if index < len(fields) else '' for column, index in positions.items()}
+        try:
+            status = (raw.get('status') or 'completed').strip().lower()
+            row = {
+                'transaction_id': (raw.get('transaction_id') or '').strip() or None,
+                'amount': _parse_amount(raw.get('amount')),
+                'phone': normalize_phone(raw.get('phone')),
+                'completed_at': _parse_time(raw.get('completed_at')),
+                'status': STATEMENT_STATUSES.get(status, status),
+            }
+        except ValueError as e:
+            yield line_number, None, str(e)
+            continue
+        yield line_number, row, None
+
+
+def _chunks(lines, size):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _batches(values, size=LOOKUP_BATCH):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# ==============================
+# RECONCILER
+# ==============================
+
+# Ids of payments already matched in the current run (a temp table on the run's connection)
+SEEN = Table('reconciliation_seen', MetaData(), Column('payment_id', Integer, primary_key=True))
+
+PAYMENT_COLUMNS = (Payment.id, Payment.transaction_id, Payment.amount, Payment.status, Payment.phone_number,
+                   Payment.created_at)
+
+
+class PaymentReconciler:
+    """Match a statement file against payments, one chunk of lines at a time.
+
+    Per chunk the statement rows are hashed by transaction id and joined to
+    the payments fetched for exactly those keys (directly, or through the
+    M-Pesa receipt numbers stored with payment callbacks). Lines still
+    unmatched fall back to amount + phone within `window` of the payment
+    time. Outcomes that need attention are inserted in bulk, status updates
+    are flushed once per chunk, and the ids of payments already matched
+    live in a temporary table, so memory depends on `chunk_size` and not on
+    the file.
+
+    With `apply` set, pending/processing payments are settled to the
+    statement's status; otherwise those lines are reported as
+    'would_update'.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, window=timedelta(minutes=15), apply=False,
+                 amount_tolerance=0.01, payment_method=None):
+        self.chunk_size = chunk_size
+        self.window = window
+        self.apply = apply
+        self.amount_tolerance = amount_tolerance
+        self.payment_method = payment_method
+
+    def run(self, path, source=None):
+        """Reconcile the CSV at `path`; returns the finished ReconciliationRun's dict."""
+        # One connection for the whole run: the temp table lives on it
+        with db.engine.connect() as connection, Session(bind=connection) as session:
+            self.session = session
+            run = ReconciliationRun(source=source or os.path.basename(path), applied=self.apply)
+            session.add(run)
+            session.commit()
+            self.run_id = run.id
+            self._create_seen_table()
+            counts, span = Counter(), [None, None]
+            try:
+                with open(path, newline='', encoding='utf-8-sig') as handle:
+                    for chunk in _chunks(statement_lines(handle), self.chunk_size):
+                        self._reconcile_chunk(chunk, counts, span)
+                        session.commit()
+                        logger.info("Reconciled through statement line %d", chunk[-1][0])
+                counts['missing_from_statement'] += self._record_missing(*span)
+                run.status = 'finished'
+            except Exception:
+                session.rollback()
+                run.status = 'failed'
+                raise
+            finally:
+                run.counts = dict(counts)
+                run.finished_at = datetime.utcnow()
+                session.commit()
+                session.execute(text('DROP TABLE IF EXISTS reconciliation_seen'))
+                session.commit()
+            return run.to_dict()
+
+    def _create_seen_table(self):
+        self.session.execute(text('DROP TABLE IF EXISTS reconciliation_seen'))
+        self.session.execute(text('CREATE TEMPORARY TABLE reconciliation_seen (payment_id INTEGER PRIMARY KEY)'))
+
+    # ==============================
+    # MATCHING
+    # ==============================
+
+    def _lookup_exact(self, keys):
+        """transaction id or receipt -> (payment row, method) for the keys that exist."""
+        found = {}
+        for batch in _batches(keys):
+            query = select(*PAYMENT_COLUMNS).where(Payment.transaction_id.in_(batch))
+            for row in self.session.execute(query):
+                found[row.transaction_id] = (row, 'transaction_id')
+            missing = [key for key in batch if key not in found]
+            if missing:
+                query = select(PaymentCallback.receipt_number, *PAYMENT_COLUMNS) \
+                    .join(Payment, Payment.transaction_id == PaymentCallback.transaction_id) \
+                    .where(PaymentCallback.receipt_number.in_(missing))
+                for row in self.session.execute(query):
+                    found[row.receipt_number] = (row, 'receipt')
+        return found
+
+    def _lookup_fallback(self, rows, taken):
+        """Pair rows with unmatched payments of the same amount and phone, nearest in time."""
+        rows = [(line, row) for line, row in rows if row['amount'] is not None and row['completed_at']]
+        if not rows:
+            return {}
+        earliest = min(row['completed_at'] for _, row in rows) - self.window
+        latest = max(row['completed_at'] for _, row in rows) + self.window
+        amounts = sorted({row['amount'] for _, row in rows})
+
+        candidates = defaultdict(list)
+        for batch in _batches(amounts):
+            query = select(*PAYMENT_COLUMNS).where(
+                Payment.created_at.between(earliest, latest),
+                Payment.amount.in_(batch),
+                ~exists().where(SEEN.c.payment_id == Payment.id),
+            )
+            if self.payment_method:
+                query = query.where(Payment.payment_method == self.payment_method)
+            for payment in self.session.execute(query):
+                if payment.id not in taken:
+                    candidates[(round(payment.amount, 2), normalize_phone(payment.phone_number))].append(payment)
+
+        matches = {}
+        for line, row in rows:
+            pool = candidates.get((row['amount'], row['phone']))
+            if not pool:
+                continue
+            best = min(pool, key=lambda payment: abs(payment.created_at - row['completed_at']))
+            if abs(best.created_at - row['completed_at']) <= self.window:
+                pool.remove(best)
+                matches[line] = best
+        return matches
+
+    def _already_seen(self, payment_ids):
+        seen = set()
+        for batch in _batches(payment_ids):
+            seen.update(self.session.execute(
+                select(SEEN.c.payment_id).where(SEEN.c.payment_id.in_(batch))).scalars())
+        return seen
+
+    def _reconcile_chunk(self, chunk, counts, span):
+        items, updates, matched_ids = [], {}, []
+        parsed = []
+        for line, row, error in chunk:
+            if row is None:
+                counts['invalid'] += 1
+                items.append(self._item(line, 'invalid', detail=error[:255]))
+                continue
+            parsed.append((line, row))
+            when = row['completed_at']
+            if when is not None:
+                span[0] = when if span[0] is None else min(span[0], when)
+                span[1] = when if span[1] is None else max(span[1], when)
+
+        exact = self._lookup_exact({row['transaction_id'] for _, row in parsed if row['transaction_id']})
+        matched = {}
+        for line, row in parsed:
+            hit = exact.get(row['transaction_id'])
+            if hit is not None:
+                matched[line] = hit
+        taken = {payment.id for payment, _ in matched.values()}
+        fallback = self._lookup_fallback([(line, row) for line, row in parsed if line not in matched], taken)
+        matched.update((line, (payment, 'fallback')) for line, payment in fallback.items())
+
+        seen_before = self._already_seen({payment.id for payment, _ in matched.values()})
+        in_chunk = set()
+        for line, row in parsed:
+            if line not in matched:
+                counts['unmatched'] += 1
+                items.append(self._item(line, 'unmatched', row=row))
+                continue
+            payment, method = matched[line]
+            if payment.id in seen_before or payment.id in in_chunk:
+                counts['duplicate'] += 1
+                items.append(self._item(line, 'duplicate', row=row, payment=payment, method=method,
+                                        detail='Payment already matched by an earlier line'))
+                continue
+            in_chunk.add(payment.id)
+            matched_ids.append(payment.id)
+            outcome, detail = self._compare(row, payment)
+            if outcome in ('updated', 'would_update'):
+                updates[payment.id] = row
+            counts[outcome] += 1
+            if outcome != 'matched' or method == 'fallback':
+                items.append(self._item(line, outcome, row=row, payment=payment, method=method, detail=detail))
+
+        if matched_ids:
+            self.session.execute(insert(SEEN), [{'payment_id': payment_id} for payment_id in matched_ids])
+        if items:
+            self.session.execute(insert(ReconciliationItem), items)
+        if updates and self.apply:
+            self._apply_updates(updates)
+
+    def _compare(self, row, payment):
+        if row['amount'] is not None and abs(row['amount'] - payment.amount) > self.amount_tolerance:
+            return 'amount_mismatch', f"Statement {row['amount']:g}, payment {payment.amount:g}"
+        if row['status'] == payment.status:
+            return 'matched', None
+        if payment.status in SETTLEABLE_STATUSES and row['status'] in ('completed', 'failed'):
+            return ('updated' if self.apply else 'would_update'), f"{payment.status} -> {row['status']}"
+        return 'status_mismatch', f"Statement {row['status']}, payment {payment.status}"
+
+    def _apply_updates(self, updates):
+        # Through the ORM so the dashboard summaries follow the status change
+        for batch in _batches(updates):
+            for payment in self.session.query(Payment).filter(Payment.id.in_(batch),
+                                                              Payment.status.in_(SETTLEABLE_STATUSES)):
+                row = updates[payment.id]
+                payment.status = row['status']
+                if row['status'] == 'completed':
+                    payment.completed_at = row['completed_at'] or datetime.utcnow()
+        self.session.flush()
+
+    def _record_missing(self, start, end):
+        """Completed payments inside the statement's time span that no line matched."""
+        if start is None:
+            return 0
+        where = [Payment.status == 'completed', Payment.completed_at.between(start, end),
+                 ~exists().where(SEEN.c.payment_id == Payment.id)]
+        if self.payment_method:
+            where.append(Payment.payment_method == self.payment_method)
+        query = select(
+            literal(self.run_id), literal('missing_from_statement'), Payment.transaction_id, Payment.id,
+            Payment.amount, Payment.status,
+        ).where(and_(*where))
+        result = self.session.execute(insert(ReconciliationItem).from_select(
+            ['run_id', 'outcome', 'transaction_id', 'payment_id', 'payment_amount', 'payment_status'], query))
+        return result.rowcount or 0
+
+    def _item(self, line, outcome, row=None, payment=None, method=None, detail=None):
+        return {
+            'run_id': self.run_id,
+            'line_number': line,
+            'outcome': outcome,
+            'match_method': method,
+            'transaction_id': (row or {}).get('transaction_id') or (payment.transaction_id if payment else None),
+            'payment_id': payment.id if payment else None,
+            'statement_amount': (row or {}).get('amount'),
+            'payment_amount': payment.amount if payment else None,
+            'statement_status': (row or {}).get('status'),
+            'payment_status': payment.status if payment else None,
+            'detail': detail,
+        }
+
+
+def write_report(run_id, path):
+    """Write a run's items (everything that needs attention) to a CSV file."""
+    columns = ('line_number', 'outcome', 'match_method', 'transaction_id', 'payment_id', 'statement_amount',
+               'payment_amount', 'statement_status', 'payment_status', 'detail')
+    query = select(*(getattr(ReconciliationItem, column) for column in columns)) \
+        .where(ReconciliationItem.run_id == run_id).order_by(ReconciliationItem.id)
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(columns)
+        for row in db.session.execute(query.execution_options(yield_per=DEFAULT_CHUNK_SIZE)):
+            writer.writerow(row)
+            written += 1
+    return written
@@ -0,0 +1,265 @@
+# Read replica routing (GET and reporting reads on a replica, writes on the primary) and lag checks
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+READ_FROM_HEADER = 'X-Read-From'  # 'primary' or 'replica', per request
+PRIMARY_COOKIE = 'read_primary_until'
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def configure_binds(app):
+    """Add the replica bind when DATABASE_REPLICA_URL is set (call before db.init_app)."""
+    url = app.config.get('DATABASE_REPLICA_URL')
+    if url:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = url
+
+
+def replica_configured():
+    return REPLICA_BIND in (current_app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+# ==============================
+# LAG
+# ==============================
+# A PostgreSQL standby (locally: pg_basebackup -R into a second instance)
+# reports how far its replay is behind. Other stand-ins carry a
+# replica_sync stamp (a SQLite copy refreshed by sync_replica()); their
+# lag is the snapshot's age. Unknown lag counts as too much.
+
+PG_REPLAY_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN NULL "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+SYNC_STAMP = text("SELECT max(synced_at) FROM replica_sync")
+
+
+def measure_lag(connection):
+    """Seconds the replica behind `connection` trails the primary, or None if unknown."""
+    if connection.dialect.name == 'postgresql':
+        lag = connection.execute(PG_REPLAY_LAG).scalar()
+        if lag is not None:
+            return max(0.0, float(lag))
+    try:
+        synced_at = connection.execute(SYNC_STAMP).scalar()
+    except DBAPIError:
+        return None
+    return max(0.0, time.time() - synced_at) if synced_at is not None else None
+
+
+class ReplicaMonitor:
+    """Replica lag, measured at most once every `interval` seconds, plus routing counters.
+
+    Measured on a plain connection to the replica engine, so it never
+    touches the request's session. One caller measures, outside the lock;
+    everyone else reads the last value meanwhile, so a slow or unreachable
+    replica never queues requests behind the check.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._lag = None
+            self._error = None
+            self._checked_at = None  # time.monotonic()
+            self._checked_wall = None  # time.time() the check started, for data_as_of()
+            self._measuring = False
+            self.routed = Counter()
+
+    def _measure(self):
+        """(lag, error) for the replica right now; opens a connection, so never call it under the lock."""
+        try:
+            with db.engines[REPLICA_BIND].connect() as connection:
+                return measure_lag(connection), None
+        except DBAPIError as e:
+            logger.warning('Replica lag check failed: %s', e.orig)
+            return None, str(e.orig)
+
+    def lag(self):
+        with self._lock:
+            due = self._checked_at is None or time.monotonic() - self._checked_at > self.interval
+            if not due or self._measuring:
+                return self._lag
+            self._measuring = True
+        started_wall = time.time()
+        lag, error = None, 'Lag check did not finish'
+        try:
+            lag, error = self._measure()
+        finally:
+            with self._lock:
+                self._lag, self._error = lag, error
+                self._checked_at, self._checked_wall = time.monotonic(), started_wall
+                self._measuring = False
+        return lag
+
+    def data_as_of(self):
+        """Wall-clock time the replica had caught up to at the last check (None if unknown)."""
+        with self._lock:
+            if self._lag is None:
+                return None
+            return self._checked_wall - self._lag
+
+    def count(self, outcome):
+        with self._lock:
+            self.routed[outcome] += 1
+
+    def status(self):
+        with self._lock:
+            return {
+                'lagSeconds': None if self._lag is None else round(self._lag, 3),
+                'error': self._error,
+                'checkedSecondsAgo': None if self._checked_at is None
+                else round(time.monotonic() - self._checked_at, 3),
+                'routed': dict(self.routed),
+            }
+
+
+replica_monitor = ReplicaMonitor()
+
+
+def replica_usable():
+    """True when the replica is configured and within REPLICA_MAX_LAG_SECONDS."""
+    if not replica_configured():
+        return False
+    lag = replica_monitor.lag()
+    return lag is not None and lag <= current_app.config.get('REPLICA_MAX_LAG_SECONDS', 5)
+
+
+def data_as_of():
+    """Wall-clock time the current context's reads are at least as fresh as.
+
+    The present for primary reads; for replica reads, the point the replica
+    had replayed up to. Caches use it to avoid storing stale reads.
+    """
+    if g.get('read_bind') == REPLICA_BIND:
+        return replica_monitor.data_as_of() or 0.0
+    return time.time()
+
+
+# ==============================
+# REQUEST ROUTING
+# ==============================
+
+def _in_write_window():
+    until = request.cookies.get(PRIMARY_COOKIE, type=float)
+    return until is not None and until > time.time()
+
+
+def choose_read_bind():
+    """Replica bind for this request's reads, or None for the primary.
+
+    GET/HEAD requests read the replica unless the client wrote within
+    READ_YOUR_WRITES_SECONDS (cookie), asked for the primary with
+    X-Read-From: primary, or the replica is lagging or unreachable.
+    X-Read-From: replica skips the read-your-writes window, not the lag check.
+    """
+    if request.method not in SAFE_METHODS or not replica_configured():
+        return None
+    override = request.headers.get(READ_FROM_HEADER, '').lower()
+    if override == 'primary':
+        replica_monitor.count('override')
+        return None
+    if override != 'replica' and _in_write_window():
+        replica_monitor.count('read_your_writes')
+        return None
+    if not replica_usable():
+        replica_monitor.count('lag_fallback')
+        return None
+    replica_monitor.count('replica')
+    return REPLICA_BIND
+
+
+def _select_read_bind():
+    g.read_bind = choose_read_bind()
+
+
+def _open_write_window(response):
+    # Any successful write request keeps this client's reads on the primary
+    # until the replica has had time to catch up
+    if request.method not in SAFE_METHODS and response.status_code < 400 and replica_configured():
+        window = current_app.config.get('READ_YOUR_WRITES_SECONDS', 10)
+        response.set_cookie(PRIMARY_COOKIE, f'{time.time() + window:.3f}', max_age=int(window) + 1, httponly=True,
+                            samesite='Lax', secure=current_app.config.get('JWT_COOKIE_SECURE', False))
+    return response
+
+
+def init_app(app):
+    replica_monitor.interval = app.config.get('REPLICA_LAG_CHECK_SECONDS', 1.0)
+    app.before_request(_select_read_bind)
+    app.after_request(_open_write_window)
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, whatever the request chose."""
+    saved = g.pop('read_bind', None)
+    try:
+        yield
+    finally:
+        g.read_bind = saved
+
+
+@contextmanager
+def replica_reads():
+    """Run a reporting job's reads on the replica (scripts, CLI; needs an app context).
+
+    Falls back to the primary when the replica is lagging or unreachable.
+    Writes still go to the primary.
+    """
+    if has_request_context():
+        raise RuntimeError('replica_reads() is for jobs; requests are routed by choose_read_bind()')
+    saved = g.pop('read_bind', None)
+    db.session.remove()
+    try:
+        g.read_bind = REPLICA_BIND if replica_usable() else None
+        yield g.read_bind is not None
+    finally:
+        db.session.remove()
+        g.read_bind = saved
+
+
+# ==============================
+# SQLITE STAND-IN
+# ==============================
+
+def sync_replica():
+    """Refresh a SQLite stand-in replica with an online backup of the primary.
+
+    Stamps replica_sync with the time the copy started, which is what the
+    lag check reads. Returns the number of seconds the copy took.
+    """
+    primary, replica = db.engines[None], db.engines[REPLICA_BIND]
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise ValueError('sync_replica() copies SQLite databases; use streaming replication for PostgreSQL')
+    started = time.time()
+    source, target = primary.raw_connection(), replica.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+        target.driver_connection.execute('CREATE TABLE IF NOT EXISTS replica_sync (synced_at REAL NOT NULL)')
+        target.driver_connection.execute('DELETE FROM replica_sync')
+        target.driver_connection.execute('INSERT INTO replica_sync (synced_at) VALUES (?)', (started,))
+        target.driver_connection.commit()
+    except sqlite3.Error:
+        target.driver_connection.rollback()
+        raise
+    finally:
+        source.close()
+        target.close()
+    return time.time() - started
@@ -0,0 +1,211 @@
+# Catalog search (SQLite FTS5 / PostgreSQL tsvector index over services and staff)
+import re
+
+from sqlalchemy import event, inspect, text
+
+from extensions import db
+from models import Service, Staff
+
+MAX_TERMS = 8
+SEARCH_KINDS = ('service', 'staff')
+
+# kind -> (table, rowid offset, name, category, body); {row} is the row alias
+# (NEW inside triggers, the table itself when rebuilding). Inactive rows are
+# left out of the index. Every entry also carries its row's branch_id.
+SOURCES = {
+    'service': ('services', 0, "{row}.name", "{row}.category", "{row}.description"),
+    'staff': ('staff', 1, "{row}.first_name || ' ' || {row}.last_name", "{row}.specialty", "{row}.bio"),
+}
+MODELS = {'service': Service, 'staff': Staff}
+
+# bm25 weights per FTS5 column (kind, ref_id and branch_id are unindexed)
+SQLITE_WEIGHTS = (0.0, 0.0, 0.0, 10.0, 4.0, 1.0)
+
+
+class InvalidSearch(ValueError):
+    """A search request without usable terms or with an unknown type."""
+
+
+def search_terms(query):
+    """Word tokens of a user query; anything else (FTS operators, quotes) is dropped."""
+    terms = re.findall(r'\w+', query or '')
+    if not terms:
+        raise InvalidSearch('q must contain at least one letter or digit')
+    return [term.lower() for term in terms[:MAX_TERMS]]
+
+
+# ==============================
+# SQLITE (FTS5)
+# ==============================
+# One FTS5 table for both kinds. rowid = id * 2 + offset, so triggers
+# replace a row's entry with a rowid lookup.
+
+def _sqlite_ddl():
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_search USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, branch_id UNINDEXED, name, category, body, "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+    ]
+    for kind, (table, offset, name, category, body) in SOURCES.items():
+        def insert(row):
+            return (f"INSERT INTO catalog_search (rowid, kind, ref_id, branch_id, name, category, body) "
+                    f"SELECT {row}.id * 2 + {offset}, '{kind}', {row}.id, {row}.branch_id, "
+                    f"{name.format(row=row)}, {category.format(row=row)}, {body.format(row=row)} ")
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN "
+            f"{insert('new')}WHERE coalesce(new.is_active, 1); END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table} BEGIN "
+            f"DELETE FROM catalog_search WHERE rowid = old.id * 2 + {offset}; "
+            f"{insert('new')}WHERE coalesce(new.is_active, 1); END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM catalog_search WHERE rowid = old.id * 2 + {offset}; END",
+        ]
+    return statements
+
+
+def _sqlite_rebuild():
+    statements = ["DELETE FROM catalog_search"]
+    for kind, (table, offset, name, category, body) in SOURCES.items():
+        statements.append(
+            f"INSERT INTO catalog_search (rowid, kind, ref_id, branch_id, name, category, body) "
+            f"SELECT id * 2 + {offset}, '{kind}', id, branch_id, {name.format(row=table)}, "
+            f"{category.format(row=table)}, {body.format(row=table)} FROM {table} WHERE coalesce(is_active, 1)"
+        )
+    return statements
+
+
+def _filters(kind, branch_id):
+    return ('AND kind = :kind ' if kind else '') + ('AND branch_id = :branch_id ' if branch_id is not None else '')
+
+
+def _sqlite_search(connection, terms, kind, branch_id, limit):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+    return connection.execute(text(
+        f"SELECT kind, ref_id, -bm25(catalog_search, {weights}) AS score FROM catalog_search "
+        f"WHERE catalog_search MATCH :match {_filters(kind, branch_id)}"
+        f"ORDER BY bm25(catalog_search, {weights}) LIMIT :limit"
+    ), {'match': match, 'kind': kind, 'branch_id': branch_id, 'limit': limit}).all()
+
+
+# ==============================
+# POSTGRESQL (tsvector)
+# ==============================
+# The 'simple' configuration (no stemming) so prefix queries match names
+# as typed; weights A/B/C rank name over category over description.
+
+def _pg_document(name, category, body):
+    return (f"setweight(to_tsvector('simple', coalesce({name}, '')), 'A') || "
+            f"setweight(to_tsvector('simple', coalesce({category}, '')), 'B') || "
+            f"setweight(to_tsvector('simple', coalesce({body}, '')), 'C')")
+
+
+def _pg_ddl():
+    statements = [
+        "CREATE TABLE IF NOT EXISTS catalog_search ("
+        "kind VARCHAR(10) NOT NULL, ref_id INTEGER NOT NULL, branch_id INTEGER, document TSVECTOR NOT NULL, "
+        "PRIMARY KEY (kind, ref_id))",
+        "CREATE INDEX IF NOT EXISTS ix_catalog_search_document ON catalog_search USING GIN (document)",
+    ]
+    for kind, (table, _, name, category, body) in SOURCES.items():
+        document = _pg_document(*(expr.format(row='NEW') for expr in (name, category, body)))
+        statements += [
+            f"CREATE OR REPLACE FUNCTION {table}_search_sync() RETURNS trigger AS $$ BEGIN "
+            f"IF TG_OP <> 'INSERT' THEN DELETE FROM catalog_search WHERE kind = '{kind}' AND ref_id = OLD.id; "
+            f"END IF; "
+            f"IF TG_OP <> 'DELETE' AND coalesce(NEW.is_active, true) THEN "
+            f"INSERT INTO catalog_search (kind, ref_id, branch_id, document) "
+            f"VALUES ('{kind}', NEW.id, NEW.branch_id, {document}); "
+            f"END IF; RETURN NULL; END $$ LANGUAGE plpgsql",
+            f"DROP TRIGGER IF EXISTS {table}_search_sync ON {table}",
+            f"CREATE TRIGGER {table}_search_sync AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {table}_search_sync()",
+        ]
+    return statements
+
+
+def _pg_rebuild():
+    statements = ["DELETE FROM catalog_search"]
+    for kind, (table, _, name, category, body) in SOURCES.items():
+        document = _pg_document(*(expr.format(row=table) for expr in (name, category, body)))
+        statements.append(f"INSERT INTO catalog_search (kind, ref_id, branch_id, document) "
+                          f"SELECT '{kind}', id, branch_id, {document} FROM {table} WHERE coalesce(is_active, true)")
+    return statements
+
+
+def _pg_search(connection, terms, kind, branch_id, limit):
+    return connection.execute(text(
+        f"SELECT kind, ref_id, ts_rank_cd(document, query) AS score "
+        f"FROM catalog_search, to_tsquery('simple', :query) AS query "
+        f"WHERE document @@ query {_filters(kind, branch_id)}ORDER BY score DESC, kind, ref_id LIMIT :limit"
+    ), {'query': ' & '.join(f'{term}:*' for term in terms), 'kind': kind, 'branch_id': branch_id,
+        'limit': limit}).all()
+
+
+# ==============================
+# INDEX MANAGEMENT
+# ==============================
+
+def _is_postgres(connection):
+    return connection.dialect.name == 'postgresql'
+
+
+def index_exists(connection):
+    return 'catalog_search' in inspect(connection).get_table_names()
+
+
+def create_search_index(connection):
+    """Create the index table and its sync triggers (idempotent); fill it when new."""
+    fill = not index_exists(connection)
+    for statement in (_pg_ddl() if _is_postgres(connection) else _sqlite_ddl()):
+        connection.exec_driver_sql(statement)
+    if fill:
+        rebuild_search_index(connection)
+
+
+def rebuild_search_index(connection):
+    """Re-index every active service and staff member from scratch."""
+    for statement in (_pg_rebuild() if _is_postgres(connection) else _sqlite_rebuild()):
+        connection.exec_driver_sql(statement)
+
+
+def drop_search_index(connection):
+    connection.exec_driver_sql('DROP TABLE IF EXISTS catalog_search')
+
+
+# db.create_all()/drop_all() manage the index along with the model tables
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    create_search_index(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    drop_search_index(connection)
+
+
+# ==============================
+# QUERY
+# ==============================
+
+def search_catalog(query, kind=None, limit=20, branch_id=None):
+    """Ranked matches for `query`: [(kind, object, score)], best first.
+
+    Every term is a prefix ('bra' matches 'braids') and all terms must
+    match. With `branch_id`, only that branch's services and staff are
+    returned. Objects are loaded with one query per kind.
+    """
+    if kind is not None and kind not in SEARCH_KINDS:
+        raise InvalidSearch(f"type must be one of {', '.join(SEARCH_KINDS)}")
+    terms = search_terms(query)
+    connection = db.session.connection()
+    search = _pg_search if _is_postgres(connection) else _sqlite_search
+    hits = search(connection, terms, kind, branch_id, limit)
+
+    objects = {}
+    for hit_kind in {hit.kind for hit in hits}:
+        model = MODELS[hit_kind]
+        ids = [hit.ref_id for hit in hits if hit.kind == hit_kind]
+        objects.update(((hit_kind, obj.id), obj) for obj in model.query.filter(model.id.in_(ids)))
+    return [(hit.kind, objects[(hit.kind, hit.ref_id)], round(float(hit.score), 4))
+            for hit in hits if (hit.kind, hit.ref_id) in objects]
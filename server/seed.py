@@ -1,275 +1,530 @@
 # seed.py
-from app import app, db
-from models import User, Service, Staff, Appointment
-from datetime import date, time
+"""Synthetic dataset generator.
+
+Drops and recreates every table, then fills it with deterministic,
+production-shaped data: customers that sign up faster over time and book
+repeatedly, a skewed service popularity, weekly and seasonal demand, staff
+schedules without double bookings, bookings, payments and slot claims.
+
+    python seed.py                                   # small dev dataset
+    python seed.py --users 1e6 --appointments 1e7 --years 3 --seed 7
+    python seed.py --database-url sqlite:////tmp/big.db --users 1e5 --appointments 1e6
+    python seed.py --branches 3                      # three salons sharing one customer base
+
+Rows go in with chunked Core INSERTs (no ORM objects, no identity map), so
+memory stays flat however large the dataset is. Every account shares one
+precomputed bcrypt hash of SEED_PASSWORD. Summary tables are rebuilt at
+the end because the bulk load bypasses the ORM flush hooks.
+"""
+import argparse
+import math
+import os
+import random
+import string
+import time as clock
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import text
+
+from extensions import db, bcrypt
+from models import (
+    Branch, User, Service, Staff, StaffAvailability, Appointment, Booking, Payment, SlotClaim,
+    DEFAULT_BRANCH_ID, WEEKDAYS, staff_services
+)
+from appointments.slots import RELEASED_STATUSES, format_hhmm
+from appointments.reservations import slot_cells
+
+SEED_PASSWORD = 'password123'
+ADMIN_EMAIL = 'admin@salon.com'
+
+FIRST_NAMES = (
+    'Amina', 'Wanjiru', 'Achieng', 'Njeri', 'Fatuma', 'Grace', 'Mercy', 'Faith', 'Joy', 'Akinyi',
+    'Sarah', 'Emma', 'Sophia', 'Lisa', 'Olivia', 'Mary', 'Ann', 'Esther', 'Ruth', 'Zawadi',
+    'Brian', 'Kevin', 'Otieno', 'Kamau', 'Mwangi', 'Kiprop', 'David', 'James', 'Mike', 'Daniel',
+    'Peter', 'John', 'Samuel', 'Joseph', 'Hassan', 'Omondi', 'Kibet', 'Mutua', 'Collins', 'Dennis',
+)
+LAST_NAMES = (
+    'Wanjiku', 'Otieno', 'Kamau', 'Mwangi', 'Ochieng', 'Njoroge', 'Kariuki', 'Wambui', 'Odhiambo',
+    'Kiplagat', 'Mutua', 'Akinyi', 'Chebet', 'Muthoni', 'Kiprono', 'Omondi', 'Were', 'Barasa',
+    'Johnson', 'Brown', 'Wilson', 'Davis', 'Garcia', 'Miller', 'Lee', 'Smith', 'Ali', 'Hassan',
+)
+
+# category -> (staff specialty, share of demand, [(name, duration minutes, price KES)])
+CATALOG = {
+    'hair': ('hair-stylist', 0.40, [
+        ("Women's Haircut & Style", 60, 1500), ('Blowout & Style', 45, 1200),
+        ('Box Braids', 180, 4500), ('Hair Coloring', 120, 4000),
+        ('Keratin Treatment', 120, 6000), ('Deep Conditioning', 30, 900),
+    ]),
+    'barber': ('barber', 0.20, [
+        ("Men's Haircut", 30, 800), ('Beard Trim', 15, 400), ('Hot Towel Shave', 30, 700),
+    ]),
+    'nails': ('nail-technician', 0.20, [
+        ('Spa Manicure', 45, 1200), ('Pedicure', 60, 1300), ('Gel Nails', 60, 2000),
+        ('Acrylic Full Set', 90, 3000),
+    ]),
+    'skincare': ('skincare-specialist', 0.12, [
+        ('Classic Facial', 60, 2000), ('Deep Cleansing Facial', 90, 3000), ('Brow Shaping', 15, 500),
+    ]),
+    'massage': ('massage-therapist', 0.08, [
+        ('Swedish Massage', 60, 3500), ('Hot Stone Massage', 90, 5000),
+    ]),
+}
+# Extra catalog entries beyond the templates become priced variants
+VARIANTS = (('Express', 0.8), ('Deluxe', 1.3), ('Signature', 1.6), ('Bridal', 2.2))
+
+# Demand shape: Sunday closed, busy weekends, December peak, slow January
+WEEKDAY_WEIGHTS = (1.0, 0.9, 1.0, 1.1, 1.3, 1.6, 0.0)
+MONTH_WEIGHTS = (0.8, 0.9, 1.0, 1.0, 0.95, 0.9, 0.95, 1.0, 1.0, 1.0, 1.1, 1.35)
+WORK_START, WORK_END = 9 * 60, 18 * 60
+GAPS = (0, 0, 0, 15, 15, 30, 45)  # minutes between a staff member's appointments
+APPOINTMENTS_PER_STAFF_DAY = 5  # sizing target for --staff auto
+
+PAST_STATUSES = (('completed', 0.85), ('cancelled', 0.10), ('no-show', 0.05))
+FUTURE_STATUSES = (('confirmed', 0.55), ('pending', 0.35), ('cancelled', 0.10))
+BOOKING_STATUS = {'completed': 'completed', 'no-show': 'cancelled', 'cancelled': 'cancelled',
+                  'pending': 'pending', 'confirmed': 'confirmed'}
+PAYMENT_METHODS = (('mpesa', 0.7), ('card', 0.2), ('cash', 0.1))
+BOOKING_RATE = 0.35
+EXISTING_CUSTOMER_SHARE = 0.2  # customers already on the books when the period starts
+
+# Parents before children within each chunk
+INSERT_ORDER = (
+    Branch.__table__, User.__table__, Service.__table__, Staff.__table__, staff_services, StaffAvailability.__table__,
+    Appointment.__table__, SlotClaim.__table__, Booking.__table__, Payment.__table__,
+)
+
+
+def parse_count(value):
+    """argparse type accepting '1e6' as well as '1000000'."""
+    try:
+        count = int(float(value))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value!r} is not a number')
+    if count < 0:
+        raise argparse.ArgumentTypeError('counts must not be negative')
+    return count
+
+
+def _weighted(rng, choices):
+    roll, total = rng.random(), 0.0
+    for value, weight in choices:
+        total += weight
+        if roll < total:
+            return value
+    return choices[-1][0]
+
+
+def customer_phone(user_id):
+    return f'+2547{user_id * 7919 % 10 ** 8:08d}'
+
+
+def _base36(number, width):
+    digits = string.digits + string.ascii_uppercase
+    out = ''
+    while number:
+        number, remainder = divmod(number, 36)
+        out = digits[remainder] + out
+    return out.rjust(width, '0')
+
+
+class DatasetGenerator:
+    """Streams a synthetic dataset into `engine` in `chunk_size` row batches.
+
+    Users are ids 1 (admin) and 2..users+1 (customers); staff, services
+    and appointments are numbered from 1 in generation order, so the same
+    seed and anchor date always produce the same rows. Branch 1 is 'main';
+    each branch gets its own copy of the service catalog, staff are dealt
+    round-robin over the branches and customers book at any of them.
+    """
+
+    def __init__(self, engine, users=200, appointments=2000, years=1.0, seed=42, staff=None,
+                 services=24, days_ahead=30, anchor=None, chunk_size=5000,
+                 slot_interval=15, password_hash=None, branches=1):
+        self.engine = engine
+        self.user_count = users
+        self.appointment_target = appointments
+        self.service_count = max(1, services)
+        self.branch_count = max(1, branches)
+        self.seed = seed
+        self.anchor = anchor or date.today()
+        self.start = self.anchor - timedelta(days=max(1, round(years * 365)))
+        self.end = self.anchor + timedelta(days=days_ahead)
+        self.now = datetime.combine(self.anchor, time.min)
+        self.chunk_size = chunk_size
+        self.slot_interval = slot_interval
+        self.password_hash = password_hash
+        self.daily_counts = self._daily_counts()
+        busiest = max((count for _, count in self.daily_counts), default=0)
+        self.staff_count = staff or max(3, math.ceil(busiest / APPOINTMENTS_PER_STAFF_DAY))
+        self.counts = {}
+        self._buffers = {}
+
+    def _branch_of(self, staff_index):
+        return DEFAULT_BRANCH_ID + staff_index % self.branch_count
+
+    def _rng(self, stream):
+        # Independent streams, so e.g. changing --users leaves the catalog as it was
+        return random.Random(f'{self.seed}:{stream}')
+
+    # ==============================
+    # DEMAND
+    # ==============================
+
+    def _day_weight(self, day):
+        span = (self.end - self.start).days or 1
+        trend = 0.6 + 0.8 * (day - self.start).days / span
+        return trend * WEEKDAY_WEIGHTS[day.weekday()] * MONTH_WEIGHTS[day.month - 1]
+
+    def _daily_counts(self):
+        """[(day, appointments)] summing exactly to the target."""
+        days = [self.start + timedelta(days=offset) for offset in range((self.end - self.start).days)]
+        weights = [self._day_weight(day) for day in days]
+        total = sum(weights) or 1
+        counts, running, placed = [], 0.0, 0
+        for day, weight in zip(days, weights):
+            running += weight
+            target = round(self.appointment_target * running / total)
+            counts.append((day, target - placed))
+            placed = target
+        return counts
+
+    def _signup_fraction(self, index):
+        """Where in the period customer `index` signs up (0 = before it starts)."""
+        existing = self.user_count * EXISTING_CUSTOMER_SHARE
+        if index < existing:
+            return 0.0
+        return math.sqrt((index - existing) / max(self.user_count - existing, 1))
+
+    def _customers_by(self, day):
+        """How many customers have signed up by `day` (inverse of _signup_fraction)."""
+        span = (self.anchor - self.start).days or 1
+        fraction = min(1.0, max(0.0, (day - self.start).days / span))
+        existing = self.user_count * EXISTING_CUSTOMER_SHARE
+        return max(1, min(self.user_count, int(existing + (self.user_count - existing) * fraction ** 2)))
+
+    # ==============================
+    # BUFFERED INSERTS
+    # ==============================
+
+    def _add(self, table, row):
+        self._buffers.setdefault(table, []).append(row)
+        self.counts[table.name] = self.counts.get(table.name, 0) + 1
+
+    def _flush(self, force=False):
+        if not force and sum(len(rows) for rows in self._buffers.values()) < self.chunk_size:
+            return
+        with self.engine.begin() as connection:
+            for table in INSERT_ORDER:
+                rows = self._buffers.get(table)
+                if rows:
+                    connection.execute(table.insert(), rows)
+        self._buffers = {}
+
+    # ==============================
+    # GENERATORS
+    # ==============================
+
+    def generate_branches(self):
+        created = datetime.combine(self.start, time.min) - timedelta(days=365)
+        for index in range(self.branch_count):
+            branch_id = DEFAULT_BRANCH_ID + index
+            self._add(Branch.__table__, {
+                'id': branch_id, 'code': 'main' if index == 0 else f'branch-{branch_id}',
+                'name': 'Main branch' if index == 0 else f'Branch {branch_id}', 'is_active': True,
+                'created_at': created,
+            })
+        self._flush(force=True)
+
+    def generate_users(self):
+        rng = self._rng('users')
+        span = self.now - datetime.combine(self.start, time.min)
+        first_day = datetime.combine(self.start, time.min) - timedelta(days=365)
+        self._add(User.__table__, self._user_row(1, 'Admin', 'User', ADMIN_EMAIL, 'admin', first_day))
+        for index in range(self.user_count):
+            user_id = index + 2
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            fraction = self._signup_fraction(index)
+            if fraction == 0.0:
+                created = first_day + timedelta(seconds=rng.randrange(365 * 86400))
+            else:
+                created = datetime.combine(self.start, time.min) + span * fraction \
+                    + timedelta(seconds=rng.randrange(3600))
+            email = f'{first}.{last}.{user_id}@example.com'.lower()
+            self._add(User.__table__, self._user_row(user_id, first, last, email, 'user', created))
+            self._flush()
+        self._flush(force=True)
+
+    def _user_row(self, user_id, first, last, email, role, created):
+        return {
+            'id': user_id, 'first_name': first, 'last_name': last, 'email': email,
+            'phone': customer_phone(user_id), 'password_hash': self.password_hash, 'role': role,
+            'is_active': True, 'created_at': created, 'updated_at': created,
+            'loyalty_points': 0, 'membership_tier': 'standard',
+        }
+
+    def generate_catalog(self):
+        """Services, staff, staff_services and weekly availability."""
+        rng = self._rng('catalog')
+        created = datetime.combine(self.start, time.min) - timedelta(days=30)
+        categories = list(CATALOG)
+
+        # branch id -> category -> [(service id, duration, price)]
+        self.services_by_category = {}
+        self.service_names = {}
+        # Round-robin over categories so every one is represented
+        templates = [(category, template) for round_ in range(max(len(t) for _, _, t in CATALOG.values()))
+                     for category in categories
+                     for template in CATALOG[category][2][round_:round_ + 1]]
+        for branch in range(self.branch_count):
+            branch_id = DEFAULT_BRANCH_ID + branch
+            by_category = self.services_by_category[branch_id] = {category: [] for category in categories}
+            for index in range(self.service_count):
+                category, (name, duration, price) = templates[index % len(templates)]
+                if index >= len(templates):
+                    label, factor = VARIANTS[(index // len(templates) - 1) % len(VARIANTS)]
+                    name, price = f'{name} ({label})', round(price * factor, -1)
+                service_id = branch * self.service_count + index + 1
+                by_category[category].append((service_id, duration, price))
+                self.service_names[service_id] = name
+                self._add(Service.__table__, {
+                    'id': service_id, 'branch_id': branch_id, 'name': name,
+                    'description': f'{name} by our {category} team', 'price': float(price),
+                    'duration': duration, 'category': category, 'is_active': True,
+                    'created_at': created, 'image': None, 'staff_required': True,
+                })
+        offered = self.services_by_category[DEFAULT_BRANCH_ID]
+        categories = [category for category in categories if offered[category]]
+        # Earlier services in a category are the popular ones (Zipf-like)
+        self.service_weights = {
+            category: [1 / (rank + 1) ** 0.8 for rank in range(len(offered[category]))]
+            for category in categories
+        }
+
+        share = {category: CATALOG[category][1] for category in categories}
+        total_share = sum(share.values())
+        self.staff_categories = []
+        for index in range(self.staff_count):
+            staff_id = index + 1
+            category = _weighted(rng, [(c, s / total_share) for c, s in share.items()])
+            self.staff_categories.append(category)
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            years = rng.randint(1, 15)
+            branch_id = self._branch_of(index)
+            self._add(Staff.__table__, {
+                'id': staff_id, 'branch_id': branch_id, 'first_name': first, 'last_name': last,
+                'email': f'{first}.{last}.{staff_id}@salon.example'.lower(),
+                'phone': f'+2547{(staff_id * 104729) % 10 ** 8:08d}', 'specialty': CATALOG[category][0],
+                'experience': f'{years} years', 'bio': f'{CATALOG[category][0].replace("-", " ").title()} '
+                                                      f'with {years} years of experience',
+                'rating': round(rng.uniform(3.5, 5.0), 1), 'image': '/api/placeholder/300/300',
+                'is_active': True, 'created_at': created, 'working_hours_start': format_hhmm(WORK_START),
+                'working_hours_end': format_hhmm(WORK_END), 'experience_years': years,
+                'work_start_minute': WORK_START, 'work_end_minute': WORK_END,
+            })
+            for service_id, _, _ in self.services_by_category[branch_id][category]:
+                self._add(staff_services, {'staff_id': staff_id, 'service_id': service_id, 'created_at': created})
+            for weekday, name in enumerate(WEEKDAYS):
+                if WEEKDAY_WEIGHTS[weekday]:
+                    self._add(StaffAvailability.__table__, {
+                        'staff_id': staff_id, 'day_of_week': name,
+                        'start_time': format_hhmm(WORK_START), 'end_time': format_hhmm(WORK_END),
+                        'is_available': True, 'created_at': created, 'updated_at': created,
+                        'weekday': weekday, 'start_minute': WORK_START, 'end_minute': WORK_END,
+                    })
+            self._flush()
+        self._flush(force=True)
+
+    def generate_appointments(self):
+        """Appointments with their bookings, payments and slot claims.
+
+        Each day's appointments are dealt round-robin over the staff, each
+        one placed after the previous on that staff member's timeline, so
+        schedules never overlap. Days busier than the staff can absorb are
+        truncated; the shortfall is reported in counts['skipped'].
+        """
+        rng = self._rng('appointments')
+        ids = {'appointment': 0, 'booking': 0, 'payment': 0}
+        skipped = 0
+        for day, count in self.daily_counts:
+            if not count:
+                continue
+            open_staff = list(range(self.staff_count))
+            rng.shuffle(open_staff)
+            cursor = {}
+            customers = self._customers_by(day)
+            placed = position = 0
+            while placed < count and open_staff:
+                position %= len(open_staff)
+                staff_index = open_staff[position]
+                category = self.staff_categories[staff_index]
+                branch_id = self._branch_of(staff_index)
+                service_id, duration, price = rng.choices(
+                    self.services_by_category[branch_id][category], weights=self.service_weights[category])[0]
+                start = cursor.get(staff_index, WORK_START) + rng.choice(GAPS)
+                if start + duration > WORK_END:
+                    open_staff.pop(position)
+                    continue
+                cursor[staff_index] = start + duration
+                # Long-standing customers book more often
+                user_id = 2 + int(customers * rng.random() ** 1.5)
+                ids['appointment'] += 1
+                self._appointment(rng, ids, day, start, branch_id, staff_index + 1, service_id, duration, price,
+                                  user_id)
+                placed += 1
+                position += 1
+                self._flush()
+            skipped += count - placed
+        self._flush(force=True)
+        self.counts['skipped'] = skipped
+
+    def _appointment(self, rng, ids, day, start, branch_id, staff_id, service_id, duration, price, user_id):
+        appointment_id = ids['appointment']
+        starts_at = datetime.combine(day, time.min) + timedelta(minutes=start)
+        ends_at = starts_at + timedelta(minutes=duration)
+        future = starts_at >= self.now
+        status = _weighted(rng, FUTURE_STATUSES if future else PAST_STATUSES)
+        created = starts_at - timedelta(days=min(int(rng.expovariate(1 / 4)), 30),
+                                        minutes=rng.randrange(60, 600))
+        updated = ends_at if status in ('completed', 'no-show') else created
+        self._add(Appointment.__table__, {
+            'id': appointment_id, 'branch_id': branch_id, 'user_id': user_id, 'service_id': service_id,
+            'staff_id': staff_id, 'date': day, 'time': format_hhmm(start), 'price': float(price), 'status': status, 'notes': None,
+            'created_at': created, 'updated_at': updated,
+            'start_minute': start, 'starts_at': starts_at, 'ends_at': ends_at,
+        })
+
+        if future and status not in RELEASED_STATUSES:
+            for cell in slot_cells(starts_at, ends_at, self.slot_interval):
+                self._add(SlotClaim.__table__, {'staff_id': staff_id, 'slot_start': cell,
+                                                'appointment_id': appointment_id, 'created_at': created})
+
+        booking_id = None
+        if rng.random() < BOOKING_RATE:
+            ids['booking'] += 1
+            booking_id = ids['booking']
+            self._add(Booking.__table__, {
+                'id': booking_id, 'branch_id': branch_id, 'user_id': user_id, 'appointment_id': appointment_id,
+                'status': BOOKING_STATUS[status], 'booking_reference': f'BK{booking_id:09d}',
+                'special_requests': None, 'created_at': created, 'updated_at': updated,
+            })
+
+        if status == 'completed':
+            payment_status, paid_at = ('failed' if rng.random() < 0.03 else 'completed'), ends_at
+        elif status == 'confirmed' and rng.random() < 0.25:
+            payment_status, paid_at = 'pending', created
+        else:
+            return
+        ids['payment'] += 1
+        payment_id = ids['payment']
+        method = _weighted(rng, PAYMENT_METHODS)
+        if method == 'mpesa':
+            transaction_id = rng.choice(string.ascii_uppercase) + rng.choice(string.ascii_uppercase) \
+                + _base36(payment_id, 8)
+        elif method == 'card':
+            transaction_id = f'ch_{payment_id:012d}'
+        else:
+            transaction_id = None
+        self._add(Payment.__table__, {
+            'id': payment_id, 'branch_id': branch_id, 'user_id': user_id, 'appointment_id': appointment_id,
+            'booking_id': booking_id,
+            'amount': float(price), 'currency': 'KES', 'payment_method': method, 'status': payment_status,
+            'transaction_id': transaction_id,
+            'phone_number': customer_phone(user_id) if method == 'mpesa' else None,
+            'description': f'Payment for {self.service_names[service_id]}',
+            'created_at': paid_at, 'completed_at': paid_at if payment_status == 'completed' else None,
+        })
+
+    def reset_sequences(self):
+        """Move PostgreSQL id sequences past the explicit ids we inserted."""
+        if self.engine.dialect.name != 'postgresql':
+            return
+        with self.engine.begin() as connection:
+            for table in (Branch.__table__, User.__table__, Service.__table__, Staff.__table__, StaffAvailability.__table__,
+                          Appointment.__table__, Booking.__table__, Payment.__table__, SlotClaim.__table__):
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+                ))
+
+    def run(self, log=print):
+        for label, step in (('🏢 Generating branches', self.generate_branches),
+                            ('👥 Generating users', self.generate_users),
+                            ('💇 Generating services, staff and availability', self.generate_catalog),
+                            ('📅 Generating appointments, bookings, payments', self.generate_appointments)):
+            started = clock.perf_counter()
+            log(f'{label}...')
+            step()
+            log(f'   done in {clock.perf_counter() - started:.1f}s')
+        self.reset_sequences()
+        return self.counts
+
+
+def seed_database(users=200, appointments=2000, years=1.0, seed=42, staff=None, services=24,
+                  days_ahead=30, anchor=None, chunk_size=5000, bcrypt_rounds=None, branches=1):
+    """Recreate the schema and load a synthetic dataset (needs an app context)."""
+    from flask import current_app
+    from loyalty import rebuild_loyalty, recalculate_tiers
+    from stats import rebuild_summaries
+    from tenancy import branch_registry
 
-def seed_database():
-    """Seed the database with initial data"""
-    
     print("🗑️ Dropping and recreating all tables...")
-    # This will recreate all tables with the current schema
     db.drop_all()
     db.create_all()
-    
-    print("👥 Creating users...")
-    # Create users
-    users = [
-        # Admin users
-        User(
-            first_name="Admin",
-            last_name="User",
-            email="admin@salon.com",
-            phone="555-0001",
-            role="admin"
-        ),
-        # Staff users
-        User(
-            first_name="Emma",
-            last_name="Wilson",
-            email="emma@salon.com",
-            phone="555-0002",
-            role="staff"
-        ),
-        User(
-            first_name="James",
-            last_name="Brown",
-            email="james@salon.com",
-            phone="555-0003",
-            role="staff"
-        ),
-        User(
-            first_name="Sophia",
-            last_name="Lee",
-            email="sophia@salon.com",
-            phone="555-0004",
-            role="staff"
-        ),
-        # Regular customers
-        User(
-            first_name="Sarah",
-            last_name="Johnson",
-            email="sarah@email.com",
-            phone="555-1001",
-            role="user"
-        ),
-        User(
-            first_name="Mike",
-            last_name="Davis",
-            email="mike@email.com",
-            phone="555-1002",
-            role="user"
-        ),
-        User(
-            first_name="Lisa",
-            last_name="Garcia",
-            email="lisa@email.com",
-            phone="555-1003",
-            role="user"
-        ),
-        User(
-            first_name="David",
-            last_name="Miller",
-            email="david@email.com",
-            phone="555-1004",
-            role="user"
-        )
-    ]
-    
-    # Set passwords for all users
-    for user in users:
-        user.set_password("password123")
-    
-    db.session.add_all(users)
-    db.session.flush()
-    
-    print("💇 Creating services...")
-    # Create services
-    services = [
-        Service(
-            name="Women's Haircut",
-            description="Professional haircut and styling for women",
-            price=45.00,
-            duration=60,
-            category="Haircut",
-            is_active=True
-        ),
-        Service(
-            name="Men's Haircut",
-            description="Professional haircut and styling for men",
-            price=30.00,
-            duration=30,
-            category="Haircut",
-            is_active=True
-        ),
-        Service(
-            name="Hair Coloring",
-            description="Full hair coloring service with premium products",
-            price=85.00,
-            duration=120,
-            category="Color",
-            is_active=True
-        ),
-        Service(
-            name="Highlights",
-            description="Partial or full highlights with foiling technique",
-            price=75.00,
-            duration=90,
-            category="Color",
-            is_active=True
-        ),
-        Service(
-            name="Blowout & Style",
-            description="Hair wash, blow dry, and professional styling",
-            price=40.00,
-            duration=45,
-            category="Styling",
-            is_active=True
-        ),
-        Service(
-            name="Keratin Treatment",
-            description="Smoothing keratin treatment for frizzy hair",
-            price=150.00,
-            duration=180,
-            category="Treatment",
-            is_active=True
-        ),
-        Service(
-            name="Manicure",
-            description="Classic manicure with shaping and polish",
-            price=25.00,
-            duration=45,
-            category="Nails",
-            is_active=True
-        ),
-        Service(
-            name="Pedicure",
-            description="Relaxing pedicure with foot massage",
-            price=35.00,
-            duration=60,
-            category="Nails",
-            is_active=True
-        ),
-        Service(
-            name="Hair Treatment",
-            description="Deep conditioning hair treatment",
-            price=35.00,
-            duration=30,
-            category="Treatment",
-            is_active=True
-        )
-    ]
-    
-    db.session.add_all(services)
-    db.session.flush()
-    
-    print("👨‍💼 Creating staff members...")
-    # Create staff members
-    staff_members = [
-        Staff(
-            first_name="Emma",
-            last_name="Wilson",
-            email="emma@salon.com",
-            phone="555-0002",
-            specialty="Senior Stylist",
-            bio="With over 10 years of experience, Emma specializes in color correction and precision cutting.",
-            experience=10,
-            is_active=True
-        ),
-        Staff(
-            first_name="James",
-            last_name="Brown",
-            email="james@salon.com",
-            phone="555-0003",
-            specialty="Master Barber",
-            bio="James is our expert in men's grooming and classic barbering techniques.",
-            experience=8,
-            is_active=True
-        ),
-        Staff(
-            first_name="Sophia",
-            last_name="Lee",
-            email="sophia@salon.com",
-            phone="555-0004",
-            specialty="Color Specialist",
-            bio="Sophia is passionate about creative coloring and balayage techniques.",
-            experience=6,
-            is_active=True
-        )
-    ]
-    
-    db.session.add_all(staff_members)
-    db.session.flush()
-    
-    print("📅 Creating appointments...")
-    # Create appointments
-    appointments = [
-        Appointment(
-            user_id=users[4].id,
-            service_id=services[0].id,
-            staff_id=staff_members[0].id,
-            date=date(2024, 1, 15),
-            time="10:00",
-            price=45.00,
-            status="completed",
-            notes="Regular trim and style"
-        ),
-        Appointment(
-            user_id=users[5].id,
-            service_id=services[1].id,
-            staff_id=staff_members[1].id,
-            date=date(2024, 1, 16),
-            time="14:30",
-            price=30.00,
-            status="completed",
-            notes="Fade cut preferred"
-        ),
-        Appointment(
-            user_id=users[4].id,
-            service_id=services[2].id,
-            staff_id=staff_members[2].id,
-            date=date(2024, 1, 20),
-            time="11:00",
-            price=85.00,
-            status="completed",
-            notes="Full color - dark brown"
-        ),
-        Appointment(
-            user_id=users[6].id,
-            service_id=services[0].id,
-            staff_id=staff_members[0].id,
-            date=date(2024, 2, 1),
-            time="09:00",
-            price=45.00,
-            status="scheduled",
-            notes="First time client"
-        ),
-        Appointment(
-            user_id=users[5].id,
-            service_id=services[1].id,
-            staff_id=staff_members[1].id,
-            date=date(2024, 2, 2),
-            time="15:00",
-            price=30.00,
-            status="scheduled",
-            notes="Regular maintenance"
-        )
-    ]
-    
-    db.session.add_all(appointments)
-    
-    print("💾 Committing changes to database...")
-    db.session.commit()
-    
+
+    rounds = bcrypt_rounds or current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+    generator = DatasetGenerator(
+        db.engine, users=users, appointments=appointments, years=years, seed=seed, staff=staff,
+        services=services, days_ahead=days_ahead, anchor=anchor, chunk_size=chunk_size, branches=branches,
+        slot_interval=current_app.config.get('SLOT_INTERVAL_MINUTES', 15),
+        # One hash for every account, at the configured cost so logins never rehash
+        password_hash=bcrypt.generate_password_hash(SEED_PASSWORD, rounds).decode('utf-8'),
+    )
+    counts = generator.run()
+    branch_registry.clear()
+
+    print("📊 Rebuilding dashboard summaries...")
+    rebuild_summaries()
+    print("🎁 Crediting loyalty points and tiers...")
+    rebuild_loyalty()
+    recalculate_tiers()
+
     print("✅ Database seeded successfully!")
-    print(f"   👥 Users: {len(users)}")
-    print(f"   💇 Services: {len(services)}")
-    print(f"   👨‍💼 Staff Members: {len(staff_members)}")
-    print(f"   📅 Appointments: {len(appointments)}")
+    for table, count in counts.items():
+        print(f"   {table}: {count}")
     print("\n🔐 Test Login Credentials:")
-    print("   Admin: admin@salon.com / password123")
-    print("   Staff: emma@salon.com / password123")
-    print("   Customer: sarah@email.com / password123")
+    print(f"   Admin: {ADMIN_EMAIL} / {SEED_PASSWORD}")
+    print(f"   Customers: <first>.<last>.<id>@example.com / {SEED_PASSWORD}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=parse_count, default=200, help='customer accounts')
+    parser.add_argument('--appointments', type=parse_count, default=2000)
+    parser.add_argument('--years', type=float, default=1.0, help='history length before --anchor-date')
+    parser.add_argument('--days-ahead', type=int, default=30, help='future bookings after --anchor-date')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--staff', type=parse_count, default=0, help='0 = sized for the busiest day')
+    parser.add_argument('--services', type=parse_count, default=24, help='services per branch')
+    parser.add_argument('--branches', type=parse_count, default=1, help='branches (salons); 1 = main only')
+    parser.add_argument('--anchor-date', type=date.fromisoformat, default=None,
+                        help='"today" for the dataset (YYYY-MM-DD); fix it for byte-identical reruns')
+    parser.add_argument('--chunk-size', type=parse_count, default=5000, help='rows per INSERT transaction')
+    parser.add_argument('--bcrypt-rounds', type=int, default=0, help='0 = BCRYPT_LOG_ROUNDS')
+    parser.add_argument('--database-url', help='overrides DATABASE_URL')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    from app import app
 
-if __name__ == "__main__":
     with app.app_context():
-        seed_database()
\ No newline at end of file
+        seed_database(users=args.users, appointments=args.appointments, years=args.years, seed=args.seed,
+                      staff=args.staff or None, services=args.services, days_ahead=args.days_ahead,
+                      anchor=args.anchor_date, chunk_size=max(1, args.chunk_size),
+                      bcrypt_rounds=args.bcrypt_rounds or None, branches=max(1, args.branches))
+
+
+if __name__ == "__main__":
+    main()
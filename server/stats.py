@@ -0,0 +1,278 @@
+# Dashboard statistics (incrementally maintained summary tables)
+import random
+from collections import defaultdict
+from datetime import date, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from extensions import db
+from orm_history import attribute_values, attributes_changed, track_previous_values
+from models import (
+    User, Appointment, Booking, Payment, Service,
+    DailyRevenue, DailyAppointmentCount, DailyActivity, StatsTotal
+)
+
+# ==============================
+# CONTRIBUTIONS
+# ==============================
+# Each tracked model maps a row (as a dict of attribute values) to the
+# summary rows it counts towards: (summary model, key columns, measures).
+# StatsTotal rows use {'metric': ...} as the key and {'value': ...}.
+
+def _day(value):
+    return value.date() if hasattr(value, 'date') else value
+
+
+def _payment_rows(v):
+    day, amount = _day(v['created_at']), v['amount'] or 0
+    status, method = v['status'] or 'pending', v['payment_method'] or 'unknown'
+    return [
+        (DailyRevenue, {'day': day, 'status': status, 'payment_method': method},
+         {'total_amount': amount, 'payment_count': 1}),
+        (StatsTotal, {'metric': f'revenue:{status}'}, {'value': amount}),
+        (StatsTotal, {'metric': f'payments:{status}'}, {'value': 1}),
+    ]
+
+
+def _appointment_rows(v):
+    return [
+        (DailyAppointmentCount, {'day': v['date'], 'status': v['status'], 'staff_id': v['staff_id']},
+         {'appointment_count': 1}),
+        (StatsTotal, {'metric': f"appointments:{v['status']}"}, {'value': 1}),
+    ]
+
+
+def _user_rows(v):
+    return [
+        (DailyActivity, {'day': _day(v['created_at'])}, {'new_users': 1, 'new_bookings': 0}),
+        (StatsTotal, {'metric': 'users'}, {'value': 1}),
+    ]
+
+
+def _booking_rows(v):
+    return [
+        (DailyActivity, {'day': _day(v['created_at'])}, {'new_users': 0, 'new_bookings': 1}),
+        (StatsTotal, {'metric': 'bookings'}, {'value': 1}),
+    ]
+
+
+TRACKED = {
+    Payment: (('created_at', 'status', 'payment_method', 'amount'), _payment_rows),
+    Appointment: (('date', 'status', 'staff_id'), _appointment_rows),
+    User: (('created_at',), _user_rows),
+    Booking: (('created_at',), _booking_rows),
+}
+
+# Make the ORM load the old value when a tracked attribute is set on an
+# expired instance, so the delta can subtract what was counted before.
+for _model, (_attrs, _) in TRACKED.items():
+    track_previous_values(_model, _attrs)
+
+
+def _collect(deltas, model, values, sign):
+    for summary, key, measures in TRACKED[model][1](values):
+        bucket = deltas[(summary, tuple(sorted(key.items())))]
+        for column, amount in measures.items():
+            bucket[column] = bucket.get(column, 0) + sign * amount
+
+
+def collect_deltas(session):
+    """Net summary changes for everything pending in a flush."""
+    deltas = defaultdict(dict)
+    for obj in session.new:
+        if type(obj) in TRACKED:
+            _collect(deltas, type(obj), attribute_values(obj, TRACKED[type(obj)][0]), +1)
+    for obj in session.deleted:
+        if type(obj) in TRACKED:
+            _collect(deltas, type(obj), attribute_values(obj, TRACKED[type(obj)][0], previous=True), -1)
+    for obj in session.dirty:
+        if type(obj) not in TRACKED:
+            continue
+        attrs = TRACKED[type(obj)][0]
+        if not attributes_changed(obj, attrs):
+            continue
+        _collect(deltas, type(obj), attribute_values(obj, attrs, previous=True), -1)
+        _collect(deltas, type(obj), attribute_values(obj, attrs), +1)
+    return deltas
+
+
+# ==============================
+# APPLYING DELTAS
+# ==============================
+
+def _upsert(connection, summary, key, measures):
+    table = summary.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(**key, **measures)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={column: table.c[column] + stmt.excluded[column] for column in measures}
+        )
+        connection.execute(stmt)
+        return
+
+    where = [table.c[column] == value for column, value in key.items()]
+    result = connection.execute(
+        table.update().where(*where).values(
+            **{column: table.c[column] + amount for column, amount in measures.items()}
+        )
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(**key, **measures))
+
+
+def counter_shards():
+    return current_app.config.get('STATS_COUNTER_SHARDS', 8) if has_app_context() else 1
+
+
+def apply_deltas(connection, deltas, shard=0):
+    """Add `deltas` to the summary rows of one shard."""
+    # Stable order so concurrent flushes lock summary rows in the same sequence
+    ordered = sorted(deltas.items(), key=lambda item: (item[0][0].__tablename__, repr(item[0][1])))
+    for (summary, key), measures in ordered:
+        measures = {column: amount for column, amount in measures.items() if amount}
+        if measures:
+            _upsert(connection, summary, {**dict(key), 'shard': shard}, measures)
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_summaries(session, flush_context):
+    deltas = collect_deltas(session)
+    if deltas:
+        # One shard per transaction, so its flushes keep adding to rows it already locked
+        shard = session.info.setdefault('stats_shard', random.randrange(counter_shards()))
+        apply_deltas(session.connection(), deltas, shard)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_stats_shard(session):
+    session.info.pop('stats_shard', None)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_stats_shard_on_rollback(session, previous_transaction):
+    session.info.pop('stats_shard', None)
+
+
+# ==============================
+# REBUILD (BACKFILL)
+# ==============================
+
+REBUILD_CHUNK_SIZE = 5000
+
+
+def _grouped(*columns, where=()):
+    return db.session.query(*columns, func.count()).filter(*where).group_by(*columns) \
+        .yield_per(REBUILD_CHUNK_SIZE)
+
+
+def _insert_chunked(connection, summary, rows):
+    """INSERT `rows` (dicts) into an emptied summary table, chunk by chunk."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= REBUILD_CHUNK_SIZE:
+            connection.execute(summary.__table__.insert(), batch)
+            batch = []
+    if batch:
+        connection.execute(summary.__table__.insert(), batch)
+
+
+def rebuild_summaries():
+    """Recompute every summary table from the source tables.
+
+    Runs one GROUP BY per summary, so it scans history once; use it after
+    bulk loads that bypass the ORM or to repair drift. Groups are streamed
+    straight into chunked INSERTs, so memory does not grow with the number
+    of summary rows. Everything lands in shard 0.
+    """
+    connection = db.session.connection()
+    for summary in (DailyRevenue, DailyAppointmentCount, DailyActivity, StatsTotal):
+        connection.execute(summary.__table__.delete())
+
+    totals = defaultdict(float)
+
+    def revenue_rows():
+        payment_day = func.date(Payment.created_at)
+        payment_status = func.coalesce(Payment.status, 'pending')
+        payment_method = func.coalesce(Payment.payment_method, 'unknown')
+        for day, status, method, amount, count in db.session.query(
+            payment_day, payment_status, payment_method, func.sum(Payment.amount), func.count()
+        ).group_by(payment_day, payment_status, payment_method).yield_per(REBUILD_CHUNK_SIZE):
+            totals[f'revenue:{status}'] += amount or 0
+            totals[f'payments:{status}'] += count
+            yield {'day': date.fromisoformat(str(day)[:10]), 'status': status, 'payment_method': method,
+                   'total_amount': amount or 0, 'payment_count': count}
+
+    def appointment_rows():
+        for day, status, staff_id, count in _grouped(Appointment.date, Appointment.status, Appointment.staff_id):
+            totals[f'appointments:{status}'] += count
+            yield {'day': day, 'status': status, 'staff_id': staff_id, 'appointment_count': count}
+
+    _insert_chunked(connection, DailyRevenue, revenue_rows())
+    _insert_chunked(connection, DailyAppointmentCount, appointment_rows())
+
+    # One row per day, so this one is small enough to merge in memory
+    activity = defaultdict(lambda: {'new_users': 0, 'new_bookings': 0})
+    for model, column in ((User, 'new_users'), (Booking, 'new_bookings')):
+        created_day = func.date(model.created_at)
+        for day, count in _grouped(created_day):
+            activity[date.fromisoformat(str(day)[:10])][column] += count
+        totals['users' if model is User else 'bookings'] = db.session.query(func.count(model.id)).scalar()
+    _insert_chunked(connection, DailyActivity, ({'day': day, **counts} for day, counts in activity.items()))
+
+    _insert_chunked(connection, StatsTotal, ({'metric': metric, 'value': value} for metric, value in totals.items()))
+    db.session.commit()
+
+
+# ==============================
+# DASHBOARD
+# ==============================
+
+def dashboard_stats(today=None, days=30):
+    """Admin dashboard figures read from the summary tables only."""
+    today = today or date.today()
+    since = today - timedelta(days=days - 1)
+    totals = dict(db.session.query(StatsTotal.metric, func.sum(StatsTotal.value)).group_by(StatsTotal.metric))
+
+    by_status = {
+        metric.split(':', 1)[1]: int(value)
+        for metric, value in totals.items()
+        if metric.startswith('appointments:') and value
+    }
+
+    daily = {}
+    for offset in range(days):
+        day = since + timedelta(days=offset)
+        daily[day] = {
+            'date': day.isoformat(), 'revenue': 0.0, 'appointments': 0,
+            'newUsers': 0, 'newBookings': 0
+        }
+    for row in DailyRevenue.query.filter(DailyRevenue.day >= since, DailyRevenue.day <= today,
+                                         DailyRevenue.status == 'completed'):
+        daily[row.day]['revenue'] += row.total_amount
+    for day, count in db.session.query(DailyAppointmentCount.day, func.sum(DailyAppointmentCount.appointment_count)) \
+            .filter(DailyAppointmentCount.day >= since, DailyAppointmentCount.day <= today) \
+            .group_by(DailyAppointmentCount.day):
+        daily[day]['appointments'] = int(count)
+    for row in DailyActivity.query.filter(DailyActivity.day >= since, DailyActivity.day <= today):
+        daily[row.day]['newUsers'] += row.new_users
+        daily[row.day]['newBookings'] += row.new_bookings
+
+    return {
+        'totalUsers': int(totals.get('users', 0)),
+        'totalBookings': int(totals.get('bookings', 0)),
+        'totalAppointments': sum(by_status.values()),
+        'todayAppointments': daily[today]['appointments'],
+        'totalServices': Service.query.filter_by(is_active=True).count(),
+        'totalRevenue': float(totals.get('revenue:completed', 0)),
+        'appointmentsByStatus': by_status,
+        'daily': list(daily.values())
+    }
@@ -0,0 +1,172 @@
+# Branch (tenant) selection, per-request query scoping and per-branch database binds
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, jsonify, request
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from extensions import db
+from models import Branch, BranchScoped, DEFAULT_BRANCH_ID
+
+BRANCH_HEADER = 'X-Branch'
+
+
+def bind_key_for(code):
+    return f'branch:{code}'
+
+
+def parse_branch_databases(value):
+    """'westlands=sqlite:////data/westlands.db,cbd=postgresql://...' -> {code: url}."""
+    databases = {}
+    for part in (value or '').split(','):
+        code, _, url = part.strip().partition('=')
+        if code and url:
+            databases[code.strip()] = url.strip()
+    return databases
+
+
+def configure_binds(app):
+    """Add a bind per dedicated branch database (call before db.init_app)."""
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for code, url in app.config.get('BRANCH_DATABASES', {}).items():
+        binds[bind_key_for(code)] = url
+    # A worker or CLI process started with DATABASE_BRANCH=<code> works in that branch's database
+    pinned = app.config.get('DATABASE_BRANCH')
+    if pinned:
+        if pinned not in app.config.get('BRANCH_DATABASES', {}):
+            raise RuntimeError(f'DATABASE_BRANCH={pinned} has no entry in BRANCH_DATABASES')
+        app.config['SESSION_BIND_KEY'] = bind_key_for(pinned)
+
+
+# ==============================
+# REGISTRY
+# ==============================
+
+class BranchRegistry:
+    """code -> (id, code, is_active) for every branch, reloaded every `ttl` seconds.
+
+    Read from the default database with a plain connection, so resolving
+    the branch never opens the request's session on the wrong bind.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._branches = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        table = Branch.__table__
+        with db.engines[None].connect() as connection:
+            rows = connection.execute(select(table.c.id, table.c.code, table.c.is_active)).all()
+        self._branches = {row.code: row for row in rows}
+        self._loaded_at = time.monotonic()
+
+    def lookup(self, code):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._load()
+            return self._branches.get(code)
+
+    def clear(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+branch_registry = BranchRegistry()
+
+
+# ==============================
+# SELECTION
+# ==============================
+
+def current_branch_id():
+    """The branch this request is scoped to, or None (workers, CLI: all branches)."""
+    return g.get('branch_id') if has_app_context() else None
+
+
+def _use_branch(branch, databases):
+    g.branch_id, g.branch_code = branch.id, branch.code
+    g.bind_key = bind_key_for(branch.code) if branch.code in databases else None
+
+
+def select_request_branch():
+    """before_request hook: pick the branch from X-Branch, ?branch= or DEFAULT_BRANCH."""
+    code = (request.headers.get(BRANCH_HEADER) or request.args.get('branch')
+            or current_app.config['DEFAULT_BRANCH'])
+    branch = branch_registry.lookup(code)
+    if branch is None or not branch.is_active:
+        return jsonify({'message': f'Unknown branch: {code}'}), 404
+    _use_branch(branch, current_app.config.get('BRANCH_DATABASES', {}))
+
+
+@contextmanager
+def branch_context(code):
+    """Scope ORM work outside a request (scripts, tests) to one branch."""
+    branch = branch_registry.lookup(code)
+    if branch is None:
+        raise LookupError(f'Unknown branch: {code}')
+    saved = {key: g.pop(key) for key in ('branch_id', 'branch_code', 'bind_key') if key in g}
+    try:
+        db.session.remove()
+        _use_branch(branch, current_app.config.get('BRANCH_DATABASES', {}))
+        yield branch
+    finally:
+        db.session.remove()
+        for key in ('branch_id', 'branch_code', 'bind_key'):
+            g.pop(key, None)
+        for key, value in saved.items():
+            setattr(g, key, value)
+
+
+# ==============================
+# SCOPING
+# ==============================
+# Every ORM SELECT/UPDATE/DELETE issued while a branch is selected gets
+# "branch_id = :branch" on each BranchScoped entity it touches, including
+# joins, eager and lazy loads. Core statements on a plain connection are
+# not affected. `.execution_options(all_branches=True)` opts a query out.
+
+@event.listens_for(Session, 'do_orm_execute')
+def _scope_to_branch(state):
+    if state.is_column_load or state.execution_options.get('all_branches'):
+        return
+    branch_id = current_branch_id()
+    if branch_id is None:
+        return
+    if state.is_select or state.is_update or state.is_delete:
+        state.statement = state.statement.options(with_loader_criteria(
+            BranchScoped, lambda cls: cls.branch_id == branch_id, include_aliases=True
+        ))
+
+
+# ==============================
+# SETUP
+# ==============================
+
+def ensure_default_branch():
+    """Create the default branch (id DEFAULT_BRANCH_ID) if no branch exists yet."""
+    if db.session.query(Branch.id).first() is None:
+        db.session.add(Branch(id=DEFAULT_BRANCH_ID, code='main', name='Main branch'))
+        db.session.commit()
+        branch_registry.clear()
+
+
+def create_branch_database(code):
+    """Create the schema in a dedicated branch database and register the branch there.
+
+    The branch row keeps the same id in both databases, so ids in tokens,
+    logs and reports mean the same branch everywhere.
+    """
+    table = Branch.__table__
+    with db.engines[None].connect() as connection:
+        branch = connection.execute(select(table).where(table.c.code == code)).mappings().first()
+    if branch is None:
+        raise LookupError(f'Unknown branch: {code}')
+    engine = db.engines[bind_key_for(code)]
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        if connection.execute(select(table.c.id).where(table.c.id == branch['id'])).first() is None:
+            connection.execute(table.insert().values(**branch))
@@ -0,0 +1,23 @@
+# /api/admin/users must cost the same number of queries whatever the page size
+import pytest
+
+
+def _statements(n_plus_one, client, headers, url):
+    before = n_plus_one.statements
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return n_plus_one.statements - before, response.get_json()
+
+
+@pytest.mark.parametrize('expand', ['', 'appointments', 'appointments.service'])
+def test_admin_users_query_count_is_constant(client, admin_headers, n_plus_one, expand):
+    url = f'/api/admin/users?expand={expand}&limit=' if expand else '/api/admin/users?limit='
+    # Warm the identity cache so both measured requests do the same work
+    _statements(n_plus_one, client, admin_headers, url + '1')
+
+    small, small_page = _statements(n_plus_one, client, admin_headers, url + '2')
+    large, large_page = _statements(n_plus_one, client, admin_headers, url + '50')
+
+    assert len(small_page['users']) == 2
+    assert len(large_page['users']) == 50
+    assert small == large, f'{small} statements for 2 users but {large} for 50'
@@ -0,0 +1,41 @@
+# Settled payments earn the same (floored) points on the flush path and in rebuild_loyalty()
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from extensions import db
+from loyalty import rebuild_loyalty
+from models import LoyaltyEntry, Payment, User
+
+
+def _customer_id():
+    return db.session.execute(select(User.id).where(User.role == 'user').order_by(User.id)).scalar()
+
+
+@pytest.mark.parametrize('amount, points', [(150.0, 1), (199.99, 1), (250.0, 2)])
+def test_spend_points_agree_between_flush_and_rebuild(app, amount, points):
+    with app.app_context():
+        user_id = _customer_id()
+
+        payment = Payment(user_id=user_id, amount=amount, status='pending')
+        db.session.add(payment)
+        db.session.commit()
+        payment.status = 'completed'
+        db.session.commit()
+        flushed = db.session.execute(
+            select(func.sum(LoyaltyEntry.points)).where(LoyaltyEntry.payment_id == payment.id)
+        ).scalar()
+
+        # Written past the ORM, so only rebuild_loyalty() credits it
+        rebuilt_id = db.session.execute(Payment.__table__.insert().values(
+            user_id=user_id, amount=amount, status='completed', created_at=datetime.utcnow()
+        )).inserted_primary_key[0]
+        db.session.commit()
+        rebuild_loyalty()
+        rebuilt = db.session.execute(
+            select(func.sum(LoyaltyEntry.points)).where(LoyaltyEntry.payment_id == rebuilt_id)
+        ).scalar()
+
+    assert flushed == rebuilt == points
+
@@ -0,0 +1,19 @@
+# Every hot query must be served by its index, never a full table scan
+from sqlalchemy import select
+
+from extensions import db
+from models import Appointment
+from query_plans import check_query_plans, explain, plan_problems
+
+
+def test_hot_queries_use_their_indexes(app):
+    with app.app_context():
+        failures = check_query_plans(db.engine)
+    assert failures == {}, '\n'.join(f'{name}: {"; ".join(problems)}' for name, problems in failures.items())
+
+
+def test_full_scan_is_reported(app):
+    # appointments.notes has no index
+    with app.app_context(), db.engine.connect() as connection:
+        plan = explain(connection, select(Appointment.id).where(Appointment.notes == 'x'))
+    assert any(problem.startswith('full table scan') for problem in plan_problems(plan))